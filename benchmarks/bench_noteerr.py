@@ -0,0 +1,278 @@
+"""
+Benchmark suite for noteerr storage and CLI hot paths.
+
+Generates synthetic error stores, times the Storage methods and CLI commands
+that run on every shell capture, and writes the results to JSON so runs from
+different commits can be compared.
+
+Usage:
+    python benchmarks/bench_noteerr.py
+    python benchmarks/bench_noteerr.py --sizes 1000,100000,1000000 --repeat 3
+    python benchmarks/bench_noteerr.py --output before.json
+    python benchmarks/bench_noteerr.py --output after.json --compare before.json
+
+Runs fully offline and needs nothing beyond noteerr's own dependencies.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if (ROOT / "src" / "noteerr").is_dir():
+    sys.path.insert(0, str(ROOT / "src"))
+
+from noteerr.models import ErrorEntry  # noqa: E402
+from noteerr.recordfile import dump_store  # noqa: E402
+from noteerr.storage import Storage  # noqa: E402
+
+
+DEFAULT_SIZES = [1000, 100000]
+
+COMMANDS = [
+    "npm start", "npm install", "npm run build", "git push origin main",
+    "git pull --rebase", "docker compose up", "docker build -t api .",
+    "pytest -q", "make test", "cargo build --release", "kubectl apply -f deploy.yaml",
+    "pip install -r requirements.txt", "terraform apply", "go test ./...",
+]
+
+ERRORS = [
+    "Error: missing script: start",
+    "npm ERR! code ERESOLVE unable to resolve dependency tree",
+    "fatal: Authentication failed for 'https://github.com/org/repo.git/'",
+    "error: failed to push some refs to 'origin'",
+    "Got permission denied while trying to connect to the Docker daemon socket",
+    "ENOSPC: no space left on device, write",
+    "connect ECONNREFUSED 127.0.0.1:5432",
+    "ModuleNotFoundError: No module named 'requests'",
+    "Killed (exit code 137): container exceeded memory limit",
+    "error[E0382]: borrow of moved value: `config`",
+    "Error from server (Forbidden): deployments.apps is forbidden",
+]
+
+PROJECTS = ["", "api", "web", "payments", "infra", "cli", "mobile"]
+TAGS = ["npm", "git", "docker", "python", "rust", "k8s", "ci", "network", "disk", "auth"]
+NOTES = ["", "", "run npm install first", "restart the docker daemon",
+         "free disk space in /var/lib/docker", "refresh the GitHub token"]
+
+
+def generate_store(path: Path, size: int, seed: int = 42) -> None:
+    """Write a deterministic synthetic store with `size` entries."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    entries = []
+    for i in range(1, size + 1):
+        error = rng.choice(ERRORS)
+        # Append a traceback-like tail so error bodies vary in size
+        error += "\n" + "\n".join(
+            f"    at frame_{rng.randrange(1000)} (file_{rng.randrange(50)}.js:{rng.randrange(400)})"
+            for _ in range(rng.randrange(0, 6))
+        )
+        project = rng.choice(PROJECTS)
+        entries.append({
+            "id": i,
+            "timestamp": (start + timedelta(seconds=i * 37)).isoformat(),
+            "command": rng.choice(COMMANDS),
+            "error": error.strip(),
+            "exit_code": rng.choice([1, 1, 1, 2, 127, 137]),
+            "directory": f"/home/dev/src/{project or 'scratch'}/services/svc{rng.randrange(20)}",
+            "notes": rng.choice(NOTES),
+            "tags": rng.sample(TAGS, rng.randrange(0, 3)),
+            "project": project,
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        dump_store({"entries": entries, "next_id": size + 1}, f)
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """Run `func` `repeat` times and return timing statistics in seconds."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "runs": repeat,
+    }
+
+
+def bench_storage(data_file: Path, pristine: Path, size: int, repeat: int) -> dict:
+    """Time the Storage methods on a store of `size` entries."""
+    storage = Storage(data_file)
+    probe = ErrorEntry(id=0, timestamp=datetime.now().isoformat(), command="npm start",
+                       error=ERRORS[0], exit_code=1, directory="/tmp")
+
+    def restore():
+        shutil.copyfile(pristine, data_file)
+
+    results = {}
+    results["storage.add_entry"] = measure(
+        lambda: storage.add_entry(command="npm start", error=ERRORS[0], exit_code=1,
+                                  directory="/tmp", notes="", tags=["npm"], project="web"),
+        repeat, setup=restore)
+    restore()
+
+    queries = {
+        "storage.search_entries": lambda s: s.search_entries("permission"),
+        "storage.get_entry_by_id": lambda s: s.get_entry_by_id(size // 2),
+        "storage.find_similar_entries": lambda s: s.find_similar_entries(probe),
+        "storage.get_statistics": lambda s: s.get_statistics(),
+        "storage.similar_entries": lambda s: s.similar_entries(ERRORS[0]),
+    }
+    # Build the vector cache once, as the first `save` or `similar` would
+    storage.similar_entries(ERRORS[0])
+    for name, query in queries.items():
+        # Cold: a fresh Storage per run, as in a one-shot CLI process
+        results[name] = measure(lambda: query(Storage(data_file)), repeat)
+        # Warm: the same Storage reused, as in the server
+        query(storage)
+        results[name + "[warm]"] = measure(lambda: query(storage), repeat)
+    return results
+
+
+def bench_cli(data_file: Path, pristine: Path, repeat: int) -> dict:
+    """Time CLI commands in-process through click's CliRunner."""
+    from click.testing import CliRunner
+    from noteerr import cli as cli_module
+
+    cli_module.storage = Storage(data_file)
+    runner = CliRunner()
+
+    def invoke(args):
+        result = runner.invoke(cli_module.cli, args, catch_exceptions=False)
+        if result.exit_code != 0:
+            raise RuntimeError(f"noteerr {' '.join(args)} failed:\n{result.output}")
+
+    def restore():
+        shutil.copyfile(pristine, data_file)
+
+    results = {}
+    results["cli.save"] = measure(
+        lambda: invoke(["save", "bench note", "--command", "npm start", "--error", ERRORS[0],
+                        "--exit-code", "1", "--project", "web", "--force"]),
+        repeat, setup=restore)
+    restore()
+    results["cli.list"] = measure(lambda: invoke(["list"]), repeat)
+    results["cli.list[all,plain]"] = measure(lambda: invoke(["list", "--all", "--plain"]), repeat)
+    results["cli.list[all,jsonl]"] = measure(lambda: invoke(["list", "--all", "--output", "jsonl"]), repeat)
+    results["cli.search"] = measure(lambda: invoke(["search", "permission"]), repeat)
+    return results
+
+
+def bench_import(repeat: int) -> dict:
+    """Time a cold interpreter importing the CLI module."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT / "src"), env.get("PYTHONPATH")]))
+    cmd = [sys.executable, "-c", "import noteerr.cli"]
+    return {"cli.import": measure(lambda: subprocess.run(cmd, env=env, check=True), repeat)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: list, baseline_file: Path) -> None:
+    """Print the median ratio of each benchmark against a previous run."""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+
+    print(f"\nComparison against {baseline_file}:")
+    for r in results:
+        old = baseline.get((r["name"], r["size"]))
+        if not old:
+            continue
+        ratio = r["median"] / old["median"] if old["median"] else float("inf")
+        marker = "  <-- slower" if ratio > 1.10 else ""
+        print(f"  {r['name']:<32} {r['size']:>9}  {old['median'] * 1000:10.2f} ms -> "
+              f"{r['median'] * 1000:10.2f} ms  ({ratio:.2f}x){marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated store sizes (default: 1000,100000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark (default: 5)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthetic stores")
+    parser.add_argument("--output", "-o", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--no-cli", action="store_true", help="Skip the CLI benchmarks")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = []
+    workdir = Path(tempfile.mkdtemp(prefix="noteerr-bench-"))
+    # noteerr.cli opens the default store when it is imported (here and in the
+    # import benchmark's interpreter): keep that away from the real ~/.noteerr
+    home = workdir / "home"
+    home.mkdir()
+    os.environ["HOME"] = os.environ["USERPROFILE"] = str(home)
+
+    try:
+        if not args.no_cli:
+            for name, timing in bench_import(args.repeat).items():
+                results.append({"name": name, "size": 0, **timing})
+
+        for size in sizes:
+            # A directory per size: the caches beside a data file (vectors.bin,
+            # tags.bin, ...) have fixed names and must not carry over between sizes
+            store_dir = workdir / f"store-{size}"
+            store_dir.mkdir()
+            pristine = store_dir / "pristine.json"
+            data_file = store_dir / "errors.json"
+            print(f"Generating {size} entries...", file=sys.stderr)
+            generate_store(pristine, size, seed=args.seed)
+            shutil.copyfile(pristine, data_file)
+
+            timings = bench_storage(data_file, pristine, size, args.repeat)
+            if not args.no_cli:
+                timings.update(bench_cli(data_file, pristine, args.repeat))
+            for name, timing in timings.items():
+                results.append({"name": name, "size": size, **timing})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for r in results:
+        print(f"{r['name']:<32} {r['size']:>9}  median {r['median'] * 1000:10.2f} ms  "
+              f"min {r['min'] * 1000:10.2f} ms")
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, Path(args.compare))
+
+
+if __name__ == "__main__":
+    main()
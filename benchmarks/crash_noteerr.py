@@ -0,0 +1,260 @@
+"""
+Fault-injection harness for noteerr's store writes and crash recovery.
+
+Two kinds of rounds:
+
+    kill    Writer processes save, annotate and delete entries in a loop and
+            are killed (SIGKILL, or TerminateProcess on Windows) at a random
+            moment. The store must still load without needing recovery, and
+            every operation a writer reported as finished must have stuck.
+    damage  The data file is damaged directly, the way a crash in an older
+            version, a full disk or a bad edit would: truncated, overwritten
+            with random bytes, or given a garbage line. Loading it must
+            recover every record outside the damaged bytes.
+
+Usage:
+    python benchmarks/crash_noteerr.py
+    python benchmarks/crash_noteerr.py --rounds 200 --size 20000 --seed 7
+    python benchmarks/crash_noteerr.py --mode damage
+
+Exits with status 1 if any round loses data.
+"""
+import argparse
+import io
+import json
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if (ROOT / "src" / "noteerr").is_dir():
+    sys.path.insert(0, str(ROOT / "src"))
+
+from bench_noteerr import ERRORS, COMMANDS, generate_store  # noqa: E402
+from noteerr.recordfile import RecordReader, record_intact  # noqa: E402
+from noteerr.recovery import recover_store  # noqa: E402
+from noteerr.storage import Storage  # noqa: E402
+
+
+def writer(data_file: Path, seed: int) -> None:
+    """
+    Write forever. Each operation is announced on stdout before it starts
+    and confirmed with "done" (and the new ID, for adds) once it has returned.
+    """
+    rng = random.Random(seed)
+    storage = Storage(data_file)
+    ids = [entry.id for entry in storage.get_all_entries()]
+    while True:
+        roll = rng.random()
+        if roll < 0.7 or not ids:
+            print("add", flush=True)
+            entry = storage.add_entry(command=rng.choice(COMMANDS), error=rng.choice(ERRORS),
+                                      exit_code=1, directory="/tmp")
+            ids.append(entry.id)
+            print(f"done {entry.id}", flush=True)
+            continue
+        elif roll < 0.9:
+            entry_id = rng.choice(ids)
+            note = f"note {rng.randrange(1 << 30)}"
+            print(f"note {entry_id} {note}", flush=True)
+            storage.update_entry(entry_id, notes=note)
+        else:
+            entry_id = ids.pop(rng.randrange(len(ids)))
+            print(f"del {entry_id}", flush=True)
+            storage.delete_entry(entry_id)
+        print("done", flush=True)
+
+
+def check_store(data_file: Path) -> list:
+    """Problems that mean the store was left damaged."""
+    problems = []
+    try:
+        with open(data_file, "r", encoding="utf-8") as f:
+            json.load(f)
+    except ValueError as e:
+        return [f"data file does not parse: {e}"]
+    with RecordReader(data_file) as reader:
+        if not reader.is_record_layout:
+            return ["data file is not in the record layout"]
+        bad = sum(1 for line in reader.lines(checksums=True) if not record_intact(line))
+        if bad:
+            problems.append(f"{bad} records fail their checksum")
+    return problems
+
+
+def kill_round(data_file: Path, rng: random.Random, max_delay: float) -> dict:
+    """Kill a writer at a random moment and check what survived."""
+    before = {entry.id: entry.notes for entry in Storage(data_file).get_all_entries()}
+    proc = subprocess.Popen([sys.executable, __file__, "--writer", str(data_file),
+                             "--seed", str(rng.randrange(1 << 30))],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    time.sleep(rng.uniform(0.0, max_delay))
+    proc.kill()
+    output, _ = proc.communicate()
+    mid_write = any(data_file.parent.glob(data_file.name + ".*.tmp"))
+    for leftover in data_file.parent.glob(data_file.name + ".*.tmp"):
+        leftover.unlink()
+
+    # Replay the finished operations; the one in flight may or may not have landed
+    expected = dict(before)
+    finished = 0
+    pending = None
+    for line in output.splitlines():
+        if line.startswith("done"):
+            op, *rest = pending.split(" ", 2)
+            if op == "add":
+                expected[int(line.split()[1])] = ""
+            elif op == "note":
+                expected[int(rest[0])] = rest[1]
+            else:
+                expected.pop(int(rest[0]), None)
+            finished += 1
+            pending = None
+        else:
+            pending = line
+
+    problems = check_store(data_file)
+    stored = {entry.id: entry.notes for entry in Storage(data_file).get_all_entries()}
+    if pending == "add":
+        # An add in flight may have stored one entry nobody was told about
+        in_flight = max(set(stored) - set(expected), default=None)
+    else:
+        in_flight = int(pending.split(" ", 2)[1]) if pending else None
+    for entry_id in set(expected) | set(stored):
+        if entry_id == in_flight:
+            continue
+        if entry_id not in stored:
+            problems.append(f"finished write of #{entry_id} was lost")
+        elif entry_id not in expected:
+            problems.append(f"#{entry_id} appeared without being written")
+        elif stored[entry_id] != expected[entry_id]:
+            problems.append(f"notes of #{entry_id} are {stored[entry_id]!r}, "
+                            f"expected {expected[entry_id]!r}")
+    return {"ops": finished, "mid_write": mid_write, "problems": problems}
+
+
+def _line_spans(data: bytes) -> list:
+    """(start, end, id) of each record line, end including the newline."""
+    spans = []
+    pos = data.index(b"\n") + 1
+    while pos < len(data):
+        nl = data.find(b"\n", pos)
+        end = len(data) if nl < 0 else nl + 1
+        if data.startswith(b'{"id": ', pos):
+            entry_id = int(data[pos + 7:data.index(b",", pos)])
+            spans.append((pos, end, entry_id))
+        pos = end
+    return spans
+
+
+def damage_round(data_file: Path, pristine: bytes, rng: random.Random) -> dict:
+    """Damage the data file, load it, and check every undamaged record survived."""
+    spans = _line_spans(pristine)
+    data = bytearray(pristine)
+    kind = rng.choice(["truncate", "overwrite", "garbage"])
+    if kind == "truncate":
+        cut = rng.randrange(len(data))
+        damaged = (cut, len(data))
+        del data[cut:]
+    elif kind == "overwrite":
+        start = rng.randrange(len(data))
+        length = rng.randrange(1, 4096)
+        data[start:start + length] = bytes(rng.randrange(256) for _ in range(length))[:len(data) - start]
+        damaged = (start, start + length)
+    else:
+        # A garbage line between two records, as left by an interrupted append
+        garbage = b'{"id": 12, "tim\x00\x17garbage\n'
+        start, _, _ = rng.choice(spans)
+        data[start:start] = garbage
+        damaged = (start, start)
+        shift = len(garbage)
+        spans = [(s + shift, e + shift, i) if s >= start else (s, e, i) for s, e, i in spans]
+    data_file.write_bytes(bytes(data))
+    untouched = {i for s, e, i in spans if e <= damaged[0] or s >= damaged[1]}
+
+    start = time.perf_counter()
+    with redirect_stderr(io.StringIO()) as messages:
+        stored = {entry.id for entry in Storage(data_file).get_all_entries()}
+    elapsed = time.perf_counter() - start
+    recovered = bool(messages.getvalue())
+    if not recovered and check_store(data_file):
+        # Still valid JSON, so loading didn't notice; `doctor --fix` does this
+        start = time.perf_counter()
+        recover_store(data_file)
+        stored = {entry.id for entry in Storage(data_file).get_all_entries()}
+        elapsed, recovered = time.perf_counter() - start, True
+
+    problems = check_store(data_file)
+    lost = untouched - stored
+    if lost:
+        problems.append(f"{kind}: lost {len(lost)} undamaged records, e.g. #{min(lost)}")
+    if stored - {i for _, _, i in spans}:
+        problems.append(f"{kind}: records appeared that were never stored")
+    return {"kind": kind, "recovered": recovered, "seconds": elapsed,
+            "problems": problems}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["all", "kill", "damage"], default="all")
+    parser.add_argument("--rounds", type=int, default=50, help="Rounds per mode (default: 50)")
+    parser.add_argument("--size", type=int, default=5000,
+                        help="Entries in the starting store (default: 5000)")
+    parser.add_argument("--max-delay", type=float, default=1.0,
+                        help="Longest a writer runs before it is killed, in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--writer", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.writer:
+        writer(Path(args.writer), args.seed)
+        return
+
+    rng = random.Random(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="noteerr-crash-"))
+    failures = 0
+    try:
+        data_file = workdir / "errors.json"
+        print(f"Generating {args.size} entries...", file=sys.stderr)
+        generate_store(data_file, args.size, seed=args.seed)
+        pristine = data_file.read_bytes()
+
+        if args.mode in ("all", "kill"):
+            ops = mid_write = 0
+            for n in range(args.rounds):
+                result = kill_round(data_file, rng, args.max_delay)
+                ops += result["ops"]
+                mid_write += result["mid_write"]
+                for problem in result["problems"]:
+                    failures += 1
+                    print(f"kill round {n}: {problem}")
+            print(f"kill: {args.rounds} writers killed after {ops} finished operations, "
+                  f"{mid_write} of them mid-write")
+
+        if args.mode in ("all", "damage"):
+            timings = {}
+            for n in range(args.rounds):
+                result = damage_round(data_file, pristine, rng)
+                if result["recovered"]:
+                    timings.setdefault(result["kind"], []).append(result["seconds"])
+                for problem in result["problems"]:
+                    failures += 1
+                    print(f"damage round {n}: {problem}")
+            for kind, seconds in sorted(timings.items()):
+                print(f"damage[{kind}]: {len(seconds)} recoveries, "
+                      f"median {statistics.median(seconds) * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("FAILED" if failures else "OK: no data lost")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,42 @@
 # Noteerr - Bash Shell Integration
 # Add this to your ~/.bashrc or ~/.bash_profile
 
+# Print the fix noted for the same command earlier, if any.
+# Reads the index noteerr keeps in ~/.noteerr/solutions.tsv (no Python startup).
+noteerr_suggest_fix() {
+    local file="$HOME/.noteerr/solutions.tsv"
+    [[ -r "$file" ]] || return
+    local IFS=$' \t\n' words
+    read -ra words <<< "$1"
+    # Keys go through the environment: awk -v would interpret backslashes
+    NOTEERR_EXACT="=${words[*]}" NOTEERR_PREFIX="~${words[*]:0:2}" awk -F '\t' '
+        $1 == ENVIRON["NOTEERR_EXACT"] { print "💡 noteerr #" $2 ": " $3; found = 1; exit }
+        $1 == ENVIRON["NOTEERR_PREFIX"] && best == "" { best = "💡 noteerr #" $2 ": " $3 }
+        END { if (!found && best != "") print best }
+    ' "$file" >&2
+}
+
+# Log a failure in the background: write one event file to the spool with
+# builtins only and make sure an ingester is running to store it.
+noteerr_spool_failure() {
+    local spool="$HOME/.noteerr/spool"
+    [[ -d "$spool" ]] || mkdir -p "$spool" 2>/dev/null || return
+    local now="$EPOCHSECONDS"
+    [[ -n "$now" ]] || now=$(date +%s)  # bash < 5
+    # The final "." line tells the ingester the event is complete
+    printf 'noteerr-event v1\n%s\n%s\n%s\n%s\n%s\n.\n' \
+        "$1" "$now" "$PWD" "${NOTEERR_STDERR_FILE:-}" "$2" \
+        >| "$spool/$now.$$.$RANDOM.event" 2>/dev/null || return
+    # An ingester started in the last few seconds may not hold the lock yet
+    (( now - ${_noteerr_ingest_started:-0} < 2 )) && return
+    local pid=""
+    [[ -r "$spool/ingest.pid" ]] && read -r pid < "$spool/ingest.pid"
+    if [[ -z "$pid" ]] || ! kill -0 "$pid" 2>/dev/null; then
+        _noteerr_ingest_started=$now
+        (noteerr ingest --linger 2 --quiet >/dev/null 2>&1 &)
+    fi
+}
+
 # Function to capture command errors automatically
 noteerr_capture_error() {
     local exit_code=$?
@@ -12,14 +48,74 @@ noteerr_capture_error() {
         # Save exit code and command for noteerr
         export NOTEERR_EXIT_CODE=$exit_code
         export NOTEERR_COMMAND="$last_command"
+        
+        # Suggest a fix once per failed command (set NOTEERR_SUGGEST=0 to disable)
+        if [[ "$NOTEERR_SUGGEST" != 0 ]] && [[ "$HISTCMD" != "$_noteerr_suggested" ]]; then
+            _noteerr_suggested=$HISTCMD
+            noteerr_suggest_fix "$last_command"
+        fi
+        
+        # Log it without delaying the prompt (set NOTEERR_CAPTURE=1 to enable)
+        # Wrapped commands were already queued by `noteerr run`
+        if [[ "$NOTEERR_CAPTURE" == 1 ]] && [[ "$HISTCMD" != "$_noteerr_spooled" ]] \
+                && [[ " $NOTEERR_WRAP " != *" ${last_command%% *} "* ]]; then
+            _noteerr_spooled=$HISTCMD
+            noteerr_spool_failure "$exit_code" "$last_command"
+        fi
     fi
 }
 
+# Run the commands listed in NOTEERR_WRAP (e.g. "make npm cargo") through
+# `noteerr run`, which keeps the tail of their stderr and queues it as the
+# error text when they fail. Successful runs store nothing.
+for _noteerr_cmd in $NOTEERR_WRAP; do
+    if [[ "$_noteerr_cmd" =~ ^[A-Za-z0-9_.+-]+$ ]]; then
+        eval "$_noteerr_cmd() { noteerr run --background -- $_noteerr_cmd \"\$@\"; }"
+    fi
+done
+unset _noteerr_cmd
+
 # Hook into bash prompt
 if [[ ! "$PROMPT_COMMAND" =~ noteerr_capture_error ]]; then
     PROMPT_COMMAND="noteerr_capture_error;${PROMPT_COMMAND}"
 fi
 
+# Tab completion for subcommands, and for entry IDs, projects and tags from
+# the cache noteerr keeps in ~/.noteerr/completions.tsv (no Python startup).
+_noteerr_commands="annotate backup browse clear copy delete doctor exec flaky ingest install
+    list projects redact rerun run save search serve show similar snapshot stats tags"
+_noteerr_complete() {
+    local cur="${COMP_WORDS[COMP_CWORD]}" prev="${COMP_WORDS[COMP_CWORD-1]}"
+    local file="$HOME/.noteerr/completions.tsv" want="" prefix="" kind name rest quoted
+    COMPREPLY=()
+    if (( COMP_CWORD == 1 )); then
+        COMPREPLY=($(compgen -W "$_noteerr_commands" -- "$cur"))
+        return
+    fi
+    case "$prev" in
+        --project|-p) want=p ;;
+        --tags|--tag|-t|--merge|--into|--rename|--delete) want=t ;;
+        *)
+            case "${COMP_WORDS[1]}" in
+                show|copy|rerun|annotate) (( COMP_CWORD == 2 )) && want=i ;;
+                delete) [[ "$cur" != -* ]] && want=i ;;
+            esac ;;
+    esac
+    [[ -n "$want" && -r "$file" ]] || return
+    # Comma-separated tags: complete the last one
+    if [[ "$want" == t && "$cur" == *,* ]]; then
+        prefix="${cur%,*},"
+        cur="${cur##*,}"
+    fi
+    while IFS=$'\t' read -r kind name rest; do
+        if [[ "$kind" == "$want" && "$name" == "$cur"* ]]; then
+            printf -v quoted '%q' "$name"
+            COMPREPLY+=("$prefix$quoted")
+        fi
+    done < "$file"
+}
+complete -F _noteerr_complete noteerr
+
 # Quick save alias - use this after a command fails
 alias ne='noteerr save'
 alias nel='noteerr list'
@@ -1,10 +1,48 @@
 # Noteerr - PowerShell Integration
 # Add this to your PowerShell profile ($PROFILE)
 
+# Print the fix noted for the same command earlier, if any.
+# Reads the index noteerr keeps in ~/.noteerr/solutions.tsv (no Python startup).
+function Show-NoteerrSuggestion($command) {
+    $file = Join-Path $HOME '.noteerr\solutions.tsv'
+    if (-not (Test-Path $file)) { return }
+    $words = @($command -split '\s+' | Where-Object { $_ })
+    $exact = '=' + ($words -join ' ')
+    $prefix = '~' + (($words | Select-Object -First 2) -join ' ')
+    $best = $null
+    foreach ($line in [System.IO.File]::ReadLines($file)) {
+        $fields = $line.Split("`t", 3)
+        if ($fields[0] -ceq $exact) { $best = $fields; break }
+        if ($fields[0] -ceq $prefix -and -not $best) { $best = $fields }
+    }
+    if ($best) {
+        Write-Host "💡 noteerr #$($best[1]): $($best[2])" -ForegroundColor Yellow
+    }
+}
+
+# Log a failure in the background: write one event file to the spool and
+# make sure an ingester is running to store it.
+function Add-NoteerrSpoolEvent($exitCode, $command) {
+    $spool = Join-Path $HOME '.noteerr\spool'
+    if (-not (Test-Path $spool)) { New-Item -ItemType Directory -Path $spool -Force | Out-Null }
+    $now = [DateTimeOffset]::UtcNow.ToUnixTimeSeconds()
+    $stderrFile = if ($env:NOTEERR_STDERR_FILE) { $env:NOTEERR_STDERR_FILE } else { '' }
+    # The final "." line tells the ingester the event is complete
+    $text = "noteerr-event v1`n$exitCode`n$now`n$((Get-Location).Path)`n$stderrFile`n$command`n.`n"
+    $name = Join-Path $spool "$now.$PID.$(Get-Random).event"
+    [System.IO.File]::WriteAllText($name, $text, (New-Object System.Text.UTF8Encoding $false))
+    $lock = Join-Path $spool 'ingest.pid'
+    $ingesterPid = if (Test-Path $lock) { (Get-Content $lock -TotalCount 1) -as [int] } else { $null }
+    if (-not $ingesterPid -or -not (Get-Process -Id $ingesterPid -ErrorAction SilentlyContinue)) {
+        Start-Process noteerr -ArgumentList 'ingest', '--linger', '2', '--quiet' -WindowStyle Hidden
+    }
+}
+
 # Function to capture command errors automatically
 function Invoke-NoteerrCapture {
     if ($? -eq $false) {
-        $lastCommand = (Get-History -Count 1).CommandLine
+        $history = Get-History -Count 1
+        $lastCommand = $history.CommandLine
         
         # Don't capture noteerr commands
         if ($lastCommand -notmatch '^noteerr') {
@@ -15,6 +53,18 @@ function Invoke-NoteerrCapture {
             if ($Error.Count -gt 0) {
                 $env:NOTEERR_ERROR = $Error[0].Exception.Message
             }
+            
+            # Suggest a fix once per failed command (set NOTEERR_SUGGEST=0 to disable)
+            if ($env:NOTEERR_SUGGEST -ne '0' -and $history.Id -ne $Global:NoteerrSuggested) {
+                $Global:NoteerrSuggested = $history.Id
+                Show-NoteerrSuggestion $lastCommand
+            }
+            
+            # Log it without delaying the prompt (set NOTEERR_CAPTURE=1 to enable)
+            if ($env:NOTEERR_CAPTURE -eq '1' -and $history.Id -ne $Global:NoteerrSpooled) {
+                $Global:NoteerrSpooled = $history.Id
+                Add-NoteerrSpoolEvent $(if ($LASTEXITCODE) { $LASTEXITCODE } else { 1 }) $lastCommand
+            }
         }
     }
 }
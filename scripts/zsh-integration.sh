@@ -2,6 +2,42 @@
 # Noteerr - Zsh Shell Integration
 # Add this to your ~/.zshrc
 
+# Print the fix noted for the same command earlier, if any.
+# Reads the index noteerr keeps in ~/.noteerr/solutions.tsv (no Python startup).
+noteerr_suggest_fix() {
+    local file="$HOME/.noteerr/solutions.tsv"
+    [[ -r "$file" ]] || return
+    local -a words
+    words=(${=1})
+    # Keys go through the environment: awk -v would interpret backslashes
+    NOTEERR_EXACT="=${(j: :)words}" NOTEERR_PREFIX="~${(j: :)words[1,2]}" awk -F '\t' '
+        $1 == ENVIRON["NOTEERR_EXACT"] { print "💡 noteerr #" $2 ": " $3; found = 1; exit }
+        $1 == ENVIRON["NOTEERR_PREFIX"] && best == "" { best = "💡 noteerr #" $2 ": " $3 }
+        END { if (!found && best != "") print best }
+    ' "$file" >&2
+}
+
+# Log a failure in the background: write one event file to the spool with
+# builtins only and make sure an ingester is running to store it.
+zmodload -F zsh/datetime p:EPOCHSECONDS 2>/dev/null
+noteerr_spool_failure() {
+    local spool="$HOME/.noteerr/spool"
+    [[ -d "$spool" ]] || mkdir -p "$spool" 2>/dev/null || return
+    local now="${EPOCHSECONDS:-$(date +%s)}"
+    # The final "." line tells the ingester the event is complete
+    printf 'noteerr-event v1\n%s\n%s\n%s\n%s\n%s\n.\n' \
+        "$1" "$now" "$PWD" "${NOTEERR_STDERR_FILE:-}" "$2" \
+        >| "$spool/$now.$$.$RANDOM.event" 2>/dev/null || return
+    # An ingester started in the last few seconds may not hold the lock yet
+    (( now - ${_noteerr_ingest_started:-0} < 2 )) && return
+    local pid=""
+    [[ -r "$spool/ingest.pid" ]] && read -r pid < "$spool/ingest.pid"
+    if [[ -z "$pid" ]] || ! kill -0 "$pid" 2>/dev/null; then
+        _noteerr_ingest_started=$now
+        noteerr ingest --linger 2 --quiet &>/dev/null &!
+    fi
+}
+
 # Function to capture command errors automatically
 noteerr_capture_error() {
     local exit_code=$?
@@ -12,13 +48,75 @@ noteerr_capture_error() {
         # Save exit code and command for noteerr
         export NOTEERR_EXIT_CODE=$exit_code
         export NOTEERR_COMMAND="$last_command"
+        
+        # Suggest a fix once per failed command (set NOTEERR_SUGGEST=0 to disable)
+        if [[ "$NOTEERR_SUGGEST" != 0 ]] && [[ "$HISTCMD" != "$_noteerr_suggested" ]]; then
+            _noteerr_suggested=$HISTCMD
+            noteerr_suggest_fix "$last_command"
+        fi
+        
+        # Log it without delaying the prompt (set NOTEERR_CAPTURE=1 to enable)
+        # Wrapped commands were already queued by `noteerr run`
+        if [[ "$NOTEERR_CAPTURE" == 1 ]] && [[ "$HISTCMD" != "$_noteerr_spooled" ]] \
+                && [[ " $NOTEERR_WRAP " != *" ${last_command%% *} "* ]]; then
+            _noteerr_spooled=$HISTCMD
+            noteerr_spool_failure "$exit_code" "$last_command"
+        fi
     fi
 }
 
+# Run the commands listed in NOTEERR_WRAP (e.g. "make npm cargo") through
+# `noteerr run`, which keeps the tail of their stderr and queues it as the
+# error text when they fail. Successful runs store nothing.
+for _noteerr_cmd in ${=NOTEERR_WRAP}; do
+    if [[ "$_noteerr_cmd" =~ ^[A-Za-z0-9_.+-]+$ ]]; then
+        eval "$_noteerr_cmd() { noteerr run --background -- $_noteerr_cmd \"\$@\"; }"
+    fi
+done
+unset _noteerr_cmd
+
 # Hook into zsh prompt
 autoload -Uz add-zsh-hook
 add-zsh-hook precmd noteerr_capture_error
 
+# Tab completion for subcommands, and for entry IDs (with a preview of
+# each), projects and tags from the cache noteerr keeps in
+# ~/.noteerr/completions.tsv (no Python startup). Needs compinit.
+_noteerr_commands="annotate backup browse clear copy delete doctor exec flaky ingest install
+    list projects redact rerun run save search serve show similar snapshot stats tags"
+_noteerr() {
+    local file="$HOME/.noteerr/completions.tsv" want="" kind name rest
+    local -a items descriptions
+    if (( CURRENT == 2 )); then
+        compadd -- ${=_noteerr_commands}
+        return
+    fi
+    case "${words[CURRENT-1]}" in
+        --project|-p) want=p ;;
+        --tags|--tag|-t|--merge|--into|--rename|--delete) want=t ;;
+        *)
+            case "${words[2]}" in
+                show|copy|rerun|annotate) (( CURRENT == 3 )) && want=i ;;
+                delete) [[ "$PREFIX" != -* ]] && want=i ;;
+            esac ;;
+    esac
+    [[ -n "$want" && -r "$file" ]] || return 1
+    # Comma-separated tags: complete the last one
+    [[ "$want" == t ]] && compset -P '*,'
+    while IFS=$'\t' read -r kind name rest; do
+        [[ "$kind" == "$want" ]] || continue
+        items+=("$name")
+        if [[ "$want" == i ]]; then
+            descriptions+=("$name -- $rest")
+        else
+            descriptions+=("$name ($rest)")
+        fi
+    done < "$file"
+    # IDs stay newest first
+    compadd -V noteerr -l -d descriptions -a items
+}
+(( $+functions[compdef] )) && compdef _noteerr noteerr
+
 # Quick save alias - use this after a command fails
 alias ne='noteerr save'
 alias nel='noteerr list'
@@ -29,6 +29,9 @@ setup(
         "colorama>=0.4.4",
         "rich>=10.0.0",
     ],
+    extras_require={
+        "fast": ["numpy>=1.17"],
+    },
     entry_points={
         "console_scripts": [
             "noteerr=noteerr.cli:main",
@@ -0,0 +1,270 @@
+"""
+Full-screen browser for logged errors (`noteerr browse`).
+
+The screen has a query line, a list pane and a detail pane. Typing filters
+the list as you go, using the same syntax as `noteerr search`.
+
+Filtering runs against haystacks precomputed once per session, in chunks of
+`CHUNK` entries. Between chunks the input is polled, so a keystroke cancels
+the query in flight instead of waiting for it. A query that only extends the
+previous phrase narrows the previous results rather than rescanning them all.
+Screen updates are debounced while keys keep arriving.
+"""
+import dataclasses
+import textwrap
+import time
+from typing import Iterator, List, Optional
+
+from .models import ErrorEntry
+from .query import QueryError, parse_query, QueryPlan
+
+# Entries checked between input polls; keeps each step well under a frame
+CHUNK = 2000
+# Redraw at most this often while a query is running or keys are arriving
+FRAME = 1 / 30
+
+
+def haystack(entry: ErrorEntry) -> str:
+    """Lowercase text free-text terms are matched against, as in `term_matches`."""
+    return "\n".join((entry.command, entry.error, entry.notes, *entry.tags)).lower()
+
+
+def _structured(query) -> bool:
+    return bool(query.projects or query.tags or query.exit_codes or query.commands
+                or query.groups or query.since or query.until)
+
+
+class BrowseModel:
+    """Entries, the current query and its (possibly still growing) results."""
+
+    def __init__(self, entries: List[ErrorEntry]):
+        # Newest first, like `list`
+        self.entries = entries[::-1]
+        self.haystacks = [haystack(entry) for entry in self.entries]
+        self.query = ""
+        self.error: Optional[str] = None
+        # Positions in `entries` matching the query so far
+        self.results: List[int] = list(range(len(self.entries)))
+        self.done = True
+        self.selected = 0
+        self._job: Optional[Iterator[None]] = None
+        self._phrase: Optional[str] = ""
+
+    def set_query(self, text: str) -> None:
+        """Start filtering for `text`, cancelling any query in progress."""
+        try:
+            query = parse_query(text)
+        except QueryError as e:
+            # Mid-typing, e.g. an unterminated quote: keep the last results
+            self.query, self.error = text, str(e)
+            return
+        self.error = None
+
+        plain = not _structured(query) and len(query.terms) <= 1
+        phrase = query.terms[0] if plain and query.terms else ("" if plain else None)
+        if phrase is not None and self._phrase is not None and self.done and self._phrase in phrase:
+            # The new phrase contains the old one: only current results can match
+            candidates = self.results
+        else:
+            candidates = range(len(self.entries))
+
+        self.query = text
+        self._phrase = phrase
+        self.results = []
+        self.selected = 0
+        self.done = False
+        self._job = self._filter(candidates, query)
+
+    def _filter(self, candidates, query) -> Iterator[None]:
+        haystacks, entries, results = self.haystacks, self.entries, self.results
+        terms = query.terms
+        # Terms are checked against the haystacks; the plan handles the rest
+        structured = _structured(query)
+        plan = QueryPlan(dataclasses.replace(query, terms=[]))
+        for start in range(0, len(candidates), CHUNK):
+            for i in candidates[start:start + CHUNK]:
+                hay = haystacks[i]
+                if all(term in hay for term in terms) and (not structured or plan.matches(entries[i])):
+                    results.append(i)
+            yield
+
+    def step(self) -> bool:
+        """Advance the running query by one chunk; return True once it has finished."""
+        if self._job is not None:
+            try:
+                next(self._job)
+            except StopIteration:
+                self._job = None
+                self.done = True
+        return self.done
+
+    def move(self, delta: int) -> None:
+        if self.results:
+            self.selected = max(0, min(len(self.results) - 1, self.selected + delta))
+
+    @property
+    def current(self) -> Optional[ErrorEntry]:
+        if 0 <= self.selected < len(self.results):
+            return self.entries[self.results[self.selected]]
+        return None
+
+
+def _put(stdscr, y: int, x: int, text: str, width: int, attr: int = 0) -> None:
+    try:
+        stdscr.addnstr(y, x, text.replace("\t", "    "), width, attr)
+    except Exception:  # curses.error: wide characters spilling past the edge
+        pass
+
+
+def _detail_lines(entry: ErrorEntry) -> Iterator[str]:
+    yield f"#{entry.id}  exit {entry.exit_code}  {entry.formatted_timestamp}"
+    yield f"$ {entry.command}"
+    yield f"Dir: {entry.directory}"
+    if entry.project:
+        yield f"Project: {entry.project}"
+    if entry.tags:
+        yield f"Tags: {', '.join(entry.tags)}"
+    if entry.notes:
+        yield ""
+        yield "Notes:"
+        yield from entry.notes.splitlines()
+    yield ""
+    yield "Error:"
+    yield from entry.error.splitlines()
+
+
+def _draw(stdscr, curses, model: BrowseModel, top: int) -> int:
+    """Render the screen; return the (possibly adjusted) first visible row."""
+    height, width = stdscr.getmaxyx()
+    stdscr.erase()
+    if height < 5 or width < 40:
+        _put(stdscr, 0, 0, "Window too small", width - 1)
+        stdscr.refresh()
+        return top
+
+    prompt = "Search: " + model.query
+    _put(stdscr, 0, 0, prompt, width - 1, curses.A_BOLD)
+
+    list_width = width * 2 // 5
+    detail_width = width - list_width - 2
+    rows = height - 2
+    if model.selected < top:
+        top = model.selected
+    elif model.selected >= top + rows:
+        top = model.selected - rows + 1
+
+    # Only the visible slice is formatted, however many entries match
+    for row, i in enumerate(model.results[top:top + rows]):
+        entry = model.entries[i]
+        line = f"{entry.id:>6} {entry.short_date} {entry.command}".ljust(list_width)
+        attr = curses.A_REVERSE if top + row == model.selected else curses.A_NORMAL
+        _put(stdscr, row + 1, 0, line, list_width, attr)
+
+    entry = model.current
+    if entry is not None:
+        y = 1
+        for text in _detail_lines(entry):
+            for part in textwrap.wrap(text, detail_width) or [""]:
+                _put(stdscr, y, list_width + 2, part, detail_width)
+                y += 1
+                if y > rows:
+                    break
+            if y > rows:
+                break
+
+    if model.error:
+        status = model.error
+    else:
+        count = f"{len(model.results)} of {len(model.entries)}" + ("" if model.done else " ...")
+        status = f"{count}  |  Up/Down PgUp/PgDn move  Enter show  Ctrl-U clear  Esc quit"
+    _put(stdscr, height - 1, 0, status, width - 1, curses.A_DIM)
+    stdscr.move(0, min(width - 1, len(prompt)))
+    stdscr.refresh()
+    return top
+
+
+def run(entries: List[ErrorEntry], query: str = "") -> Optional[int]:
+    """
+    Run the browser until the user quits.
+
+    Args:
+        entries: Entries to browse, oldest first
+        query: Initial query
+
+    Returns:
+        ID of the entry picked with Enter, or None
+    """
+    import curses
+
+    model = BrowseModel(entries)
+    if query:
+        model.set_query(query)
+
+    def loop(stdscr) -> Optional[int]:
+        try:
+            curses.curs_set(1)
+        except curses.error:
+            pass
+        if hasattr(curses, "set_escdelay"):
+            # Esc quits; don't wait a full second for an escape sequence
+            curses.set_escdelay(25)
+        stdscr.keypad(True)
+        top = 0
+        dirty = True
+        last_draw = 0.0
+        while True:
+            # Redraw when idle, or once a frame while keys arrive or a query runs
+            now = time.monotonic()
+            if dirty and (model.done or now - last_draw >= FRAME):
+                top = _draw(stdscr, curses, model, top)
+                last_draw, dirty = now, False
+
+            # Poll between chunks of a running query; otherwise wait for a key
+            stdscr.timeout(-1 if model.done else 0)
+            try:
+                key = stdscr.get_wch()
+            except curses.error:
+                if not model.done:
+                    model.step()
+                    dirty = True
+                continue
+
+            dirty = True
+            rows = stdscr.getmaxyx()[0] - 2
+            if key == "\x1b":
+                # A lone Esc quits; the rest of an unknown escape sequence is dropped
+                stdscr.timeout(0)
+                sequence = False
+                try:
+                    while True:
+                        stdscr.get_wch()
+                        sequence = True
+                except curses.error:
+                    pass
+                if not sequence:
+                    return None
+            elif key in ("\n", "\r", curses.KEY_ENTER):
+                return model.current.id if model.current else None
+            elif key in (curses.KEY_BACKSPACE, "\x7f", "\b"):
+                model.set_query(model.query[:-1])
+            elif key == "\x15":  # Ctrl-U
+                model.set_query("")
+            elif key == curses.KEY_UP:
+                model.move(-1)
+            elif key == curses.KEY_DOWN:
+                model.move(1)
+            elif key == curses.KEY_PPAGE:
+                model.move(-rows)
+            elif key == curses.KEY_NPAGE:
+                model.move(rows)
+            elif key == curses.KEY_HOME:
+                model.move(-len(model.results))
+            elif key == curses.KEY_END:
+                model.move(len(model.results))
+            elif isinstance(key, str) and key.isprintable():
+                model.set_query(model.query + key)
+
+    try:
+        return curses.wrapper(loop)
+    except KeyboardInterrupt:
+        return None
@@ -0,0 +1,162 @@
+"""
+Run a command while keeping the tail of its error output (`noteerr run`).
+
+The child's stderr (and optionally stdout) goes through a pipe: every chunk
+is written straight on to the terminal and copied into a fixed-size ring
+buffer, so memory stays bounded however much the command prints and output
+is never delayed. Streams that are not captured are inherited untouched.
+"""
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+from typing import List, Optional, Tuple
+
+# Bytes of output kept per run; older output is overwritten
+TAIL_BYTES = 64 * 1024
+READ_SIZE = 64 * 1024
+
+_ANSI_RE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)")
+_SHELL_CHARS = set(" \t\n|&;<>()$`*?[]{}~\"'\\")
+
+
+class RingBuffer:
+    """Keeps the last `capacity` bytes written to it."""
+
+    def __init__(self, capacity: int = TAIL_BYTES):
+        self._buf = bytearray(capacity)
+        self._pos = 0
+        self.total = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf)
+
+    @property
+    def truncated(self) -> bool:
+        """True once earlier output has been overwritten."""
+        return self.total > self.capacity
+
+    def write(self, data: bytes) -> None:
+        capacity = len(self._buf)
+        n = len(data)
+        self.total += n
+        if n >= capacity:
+            self._buf[:] = data[n - capacity:]
+            self._pos = 0
+            return
+        end = self._pos + n
+        if end <= capacity:
+            self._buf[self._pos:end] = data
+        else:
+            split = capacity - self._pos
+            self._buf[self._pos:] = data[:split]
+            self._buf[:n - split] = data[split:]
+        self._pos = end % capacity
+
+    def getvalue(self) -> bytes:
+        if self.total >= self.capacity:
+            return bytes(self._buf[self._pos:] + self._buf[:self._pos])
+        return bytes(self._buf[:self._pos])
+
+    def text(self) -> str:
+        """The kept output as text, colour codes removed and starting on a whole line."""
+        text = self.getvalue().decode("utf-8", "replace")
+        if self.truncated:
+            newline = text.find("\n")
+            text = "...\n" + (text[newline + 1:] if newline >= 0 else text)
+        return _ANSI_RE.sub("", text).strip()
+
+
+def command_string(args: List[str]) -> str:
+    """The command line as it would be typed, for storing."""
+    if len(args) == 1:
+        return args[0]
+    if os.name == "nt":
+        return subprocess.list2cmdline(args)
+    return shlex.join(args)
+
+
+def _pump(fd: int, out_fd: int, ring: RingBuffer, lock: threading.Lock) -> None:
+    """Copy `fd` to `out_fd` until EOF, keeping a copy in `ring`."""
+    while True:
+        try:
+            data = os.read(fd, READ_SIZE)
+        except OSError:
+            break
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(out_fd, view)
+            except OSError:
+                break  # Our own output went away; keep capturing anyway
+            view = view[written:]
+        with lock:
+            ring.write(data)
+
+
+def run_captured(args: List[str], capacity: int = TAIL_BYTES,
+                 capture_stdout: bool = False) -> Tuple[int, RingBuffer]:
+    """
+    Run a command, passing its output through and keeping the tail of it.
+
+    A single argument containing spaces or shell syntax is run by the shell,
+    like `noteerr run "make && make test"`; anything else is executed
+    directly.
+
+    Args:
+        args: Command and arguments
+        capacity: Bytes of output to keep
+        capture_stdout: Keep stdout as well as stderr
+
+    Returns:
+        (exit status as a shell would report it, buffer holding the tail)
+    """
+    ring = RingBuffer(capacity)
+    shell = len(args) == 1 and any(c in _SHELL_CHARS for c in args[0])
+    try:
+        proc = subprocess.Popen(args[0] if shell else args, shell=shell,
+                                stdout=subprocess.PIPE if capture_stdout else None,
+                                stderr=subprocess.PIPE)
+    except OSError as e:
+        message = f"noteerr: {args[0]}: {e.strerror or e}\n".encode("utf-8", "replace")
+        os.write(sys.stderr.fileno(), message)
+        ring.write(message)
+        return (127 if isinstance(e, FileNotFoundError) else 126), ring
+
+    # Ctrl+C reaches the child directly; wait for it to finish instead of dying first
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        lock = threading.Lock()
+        pumps = []
+        if capture_stdout:
+            pumps.append(threading.Thread(
+                target=_pump, args=(proc.stdout.fileno(), sys.stdout.fileno(), ring, lock),
+                daemon=True))
+            pumps[0].start()
+        _pump(proc.stderr.fileno(), sys.stderr.fileno(), ring, lock)
+        for pump in pumps:
+            pump.join()
+        returncode = proc.wait()
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        for pipe in (proc.stdout, proc.stderr):
+            if pipe is not None:
+                pipe.close()
+    return (128 - returncode if returncode < 0 else returncode), ring
+
+
+def spool_output(spool_dir, ring: RingBuffer) -> Optional[str]:
+    """Write the kept output next to the spooled events; return its path."""
+    text = ring.text()
+    if not text:
+        return None
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    path = spool_dir / f"{os.getpid()}.{ring.total}.stderr"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
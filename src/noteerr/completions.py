@@ -0,0 +1,115 @@
+"""
+Tab-completion data for the shell integration, kept in `completions.tsv`.
+
+The bash and zsh scripts complete entry IDs, project names and tags by
+reading this file with shell builtins, so pressing Tab never starts Python
+or touches the store. It is plain text, one tab-separated item per line:
+
+    # noteerr completions v1 <data file mtime> <size> <inode>
+    i   <ID>        <command: first line of the error>   (newest first)
+    p   <project>   <errors>
+    t   <tag>       <errors>
+
+Storage rewrites it after each of its writes. The counts let projects and
+tags be added and dropped without scanning the store again; the recent IDs
+are taken from the tail of the entries already in memory. A file that does
+not match the store it was written for is rebuilt from all entries.
+"""
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FORMAT_VERSION = 1
+# Entry IDs offered for completion, newest first
+RECENT = 200
+PREVIEW = 72
+
+_HEADER = "# noteerr completions v"
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+def preview(record: Dict) -> str:
+    """One line describing an entry: its command and the first line of its error."""
+    error = next((line for line in (record.get("error") or "").splitlines() if line.strip()), "")
+    text = _clean(f"{record.get('command', '')}: {error}" if error else record.get("command", ""))
+    return text if len(text) <= PREVIEW else text[:PREVIEW - 3] + "..."
+
+
+class CompletionCache:
+    """Recent entries, and error counts per project and per tag."""
+
+    def __init__(self):
+        self.recent: List[Tuple[int, str]] = []
+        self.projects: Counter = Counter()
+        self.tags: Counter = Counter()
+
+    @classmethod
+    def build(cls, records: Iterable[Dict]) -> 'CompletionCache':
+        """Completions for raw entry dictionaries, oldest first."""
+        cache = cls()
+        tail = []
+        for record in records:
+            cache.add(record)
+            tail.append(record)
+            if len(tail) > 2 * RECENT:
+                del tail[:RECENT]
+        cache.set_recent(tail)
+        return cache
+
+    def add(self, record: Dict) -> None:
+        if record.get("project"):
+            self.projects[_clean(record["project"])] += 1
+        for tag in set(record.get("tags") or []):
+            self.tags[_clean(tag)] += 1
+
+    def remove(self, record: Dict) -> None:
+        if record.get("project"):
+            self.projects[_clean(record["project"])] -= 1
+        for tag in set(record.get("tags") or []):
+            self.tags[_clean(tag)] -= 1
+
+    def retag(self, old: List[str], new: List[str]) -> None:
+        self.remove({"tags": old})
+        self.add({"tags": new})
+
+    def set_recent(self, records: List[Dict]) -> None:
+        """Offer the last `RECENT` of `records` (the store's entries, oldest first)."""
+        self.recent = [(record["id"], preview(record)) for record in reversed(records[-RECENT:])]
+
+    def save(self, path: Path, signature: Tuple[int, int, int]) -> None:
+        """Write the completions for the data file with `signature`, atomically."""
+        lines = [f"{_HEADER}{FORMAT_VERSION} {' '.join(str(n) for n in signature)}\n"]
+        lines += [f"i\t{entry_id}\t{text}\n" for entry_id, text in self.recent]
+        lines += [f"p\t{name}\t{count}\n" for name, count in sorted(self.projects.items()) if count > 0]
+        lines += [f"t\t{name}\t{count}\n" for name, count in sorted(self.tags.items()) if count > 0]
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            f.writelines(lines)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, signature: Optional[Tuple[int, int, int]]) -> Optional['CompletionCache']:
+        """Read completions saved by `save`, or None if missing or not for `signature`."""
+        if signature is None:
+            return None
+        expected = f"{_HEADER}{FORMAT_VERSION} {' '.join(str(n) for n in signature)}"
+        cache = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if f.readline().rstrip("\n") != expected:
+                    return None
+                for line in f:
+                    kind, name, value = line.rstrip("\n").split("\t")
+                    if kind == "i":
+                        cache.recent.append((int(name), value))
+                    elif kind == "p":
+                        cache.projects[name] = int(value)
+                    elif kind == "t":
+                        cache.tags[name] = int(value)
+        except (OSError, ValueError):
+            return None
+        return cache
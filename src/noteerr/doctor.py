@@ -0,0 +1,281 @@
+"""
+Consistency checks and repairs for the data directory (`noteerr doctor`).
+
+The data file is scanned once, a record at a time, and the derived files
+next to it (the vector cache, the solutions index, the tag index and the
+capture spool) are compared with what the records say. With `fix`, problems found are
+repaired: damaged stores are salvaged, old ones migrated, IDs renumbered,
+stale files removed and derived files rebuilt from the store.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from .migrations import MigrationError, StoreScan, migrate_file, upgrade_record
+from .models import ErrorEntry
+from .recordfile import (SCHEMA_VERSION, RecordReader, file_signature, has_checksum,
+                         record_intact)
+from .recovery import recover_store
+from .similarity import VectorStore
+from .solutions import SolutionIndex
+from .tagindex import TagIndex
+from .spool import LOCK_NAME, STALE_AFTER, lock_holder_alive, pending_events
+
+OK, WARN, ERROR, FIXED = "ok", "warn", "error", "fixed"
+
+
+@dataclass
+class Check:
+    """Outcome of one check."""
+    name: str
+    status: str
+    detail: str
+
+
+@dataclass
+class _Scan:
+    """What one pass over the data file found."""
+    record_layout: bool
+    schema: int
+    next_id: Optional[int]
+    count: int = 0
+    max_id: int = 0
+    ids: Set[int] = field(default_factory=set)
+    duplicates: List[int] = field(default_factory=list)
+    invalid: List[str] = field(default_factory=list)
+    solutions: SolutionIndex = field(default_factory=SolutionIndex)
+    tags: TagIndex = field(default_factory=TagIndex)
+
+
+def _scan(path) -> _Scan:
+    with StoreScan(path) as store:
+        scan = _Scan(store.record_layout, store.schema, store.next_id)
+        for record in store.records():
+            scan.count += 1
+            entry_id = record.get("id") if isinstance(record, dict) else None
+            if not isinstance(entry_id, int):
+                scan.invalid.append(f"entry #{scan.count} has no ID")
+                continue
+            if entry_id in scan.ids:
+                scan.duplicates.append(entry_id)
+            scan.ids.add(entry_id)
+            scan.max_id = max(scan.max_id, entry_id)
+            try:
+                # Judge entries as they will be once upgraded
+                record = upgrade_record(record, store.schema)
+                ErrorEntry.from_dict(record).formatted_timestamp  # the timestamp must parse
+            except (TypeError, ValueError) as e:
+                scan.invalid.append(f"#{entry_id}: {e}")
+                continue
+            scan.solutions.add(record)
+            scan.tags.add(entry_id, record.get("tags") or [])
+    return scan
+
+
+def run_checks(storage, fix: bool = False, rebuild: bool = False) -> List[Check]:
+    """
+    Check the store and its derived files.
+
+    Args:
+        storage: Storage to check
+        fix: Repair the problems found
+        rebuild: Rebuild the derived files even if they look fine
+
+    Returns:
+        One Check per item, in the order checked
+    """
+    checks: List[Check] = []
+
+    # Temporary files of writes that never completed (recent ones may be in progress)
+    leftovers = [*storage.data_file.parent.glob(storage.data_file.name + ".*.tmp"),
+                 *(path.with_name(path.name + ".tmp")
+                   for path in (storage.vectors_file, storage.solutions_file, storage.tags_file,
+                                storage.dirs_file, storage.trends_file, storage.flaky_file,
+                                storage.completions_file))]
+    now = time.time()
+    leftovers = [path for path in leftovers
+                 if path.is_file() and now - path.stat().st_mtime > STALE_AFTER]
+    if leftovers:
+        names = ", ".join(sorted(p.name for p in leftovers))
+        if fix:
+            for path in leftovers:
+                path.unlink()
+            checks.append(Check("Leftover files", FIXED, f"removed {names}"))
+        else:
+            checks.append(Check("Leftover files", WARN, f"interrupted writes left {names}"))
+
+    checks.append(_check_integrity(storage, fix))
+    try:
+        scan = _scan(storage.data_file)
+    except (OSError, MigrationError) as e:
+        checks.append(Check("Data file", ERROR, str(e)))
+        return checks
+
+    # Format and schema version
+    current = scan.record_layout and scan.schema == SCHEMA_VERSION
+    layout = "one entry per line" if scan.record_layout else "pretty-printed"
+    detail = f"schema {scan.schema}, {layout}, {scan.count} entries"
+    if scan.schema > SCHEMA_VERSION:
+        # Nothing else can be checked (or fixed) safely by this release
+        checks.append(Check("Data file", ERROR,
+                            f"{detail}; written by a newer noteerr, upgrade noteerr to use it"))
+        return checks
+    if current:
+        checks.append(Check("Data file", OK, detail))
+    elif fix:
+        try:
+            migrate_file(storage.data_file)
+            scan = _scan(storage.data_file)
+        except (OSError, MigrationError) as e:
+            checks.append(Check("Data file", ERROR, f"{detail}; upgrade failed: {e}"))
+            return checks
+        checks.append(Check("Data file", FIXED, f"{detail}; upgraded to schema {SCHEMA_VERSION}"))
+    else:
+        checks.append(Check("Data file", WARN,
+                            f"{detail}; upgraded to schema {SCHEMA_VERSION} on next use"))
+
+    # Entries
+    problems = []
+    if scan.duplicates:
+        problems.append(f"{len(scan.duplicates)} repeated IDs")
+    if scan.next_id is not None and scan.next_id <= scan.max_id:
+        problems.append(f"next ID {scan.next_id} is not above the highest ID {scan.max_id}")
+    if problems and fix:
+        renumbered, next_id = storage.repair_ids()
+        checks.append(Check("Entry IDs", FIXED, f"renumbered {renumbered} entries, next ID {next_id}"))
+    elif problems:
+        checks.append(Check("Entry IDs", ERROR, "; ".join(problems)))
+    else:
+        checks.append(Check("Entry IDs", OK, f"unique, next ID {scan.next_id or scan.max_id + 1}"))
+    if scan.invalid:
+        shown = "; ".join(scan.invalid[:3]) + ("; ..." if len(scan.invalid) > 3 else "")
+        checks.append(Check("Entries", ERROR,
+                            f"{len(scan.invalid)} unreadable ({shown}); fix or delete them"))
+    else:
+        checks.append(Check("Entries", OK, "all readable"))
+
+    # Solutions index: must match what the notes say now
+    if problems and fix:
+        scan = _scan(storage.data_file)
+    saved = SolutionIndex.load(storage.solutions_file, file_signature(storage.data_file))
+    if saved is not None and saved.keys == scan.solutions.keys and not rebuild:
+        checks.append(Check("Solutions index", OK, f"{len(saved.keys)} keys"))
+    elif not storage.solutions_file.exists() and not scan.solutions.keys and not rebuild:
+        checks.append(Check("Solutions index", OK, "no annotated errors"))
+    elif fix or rebuild:
+        scan.solutions.save(storage.solutions_file, file_signature(storage.data_file))
+        checks.append(Check("Solutions index", FIXED, f"rebuilt, {len(scan.solutions.keys)} keys"))
+    else:
+        if not storage.solutions_file.exists():
+            state = "missing"
+        else:
+            state = "unreadable or stale" if saved is None else "out of date"
+        checks.append(Check("Solutions index", WARN, f"{storage.solutions_file.name} is {state}"))
+
+    checks.append(_check_tags(storage, scan, fix, rebuild))
+    checks.append(_check_vectors(storage, scan, fix, rebuild))
+    checks.append(_check_spool(storage, fix))
+    return checks
+
+
+def _check_integrity(storage, fix: bool) -> Check:
+    """Verify each record line against its checksum; with `fix`, salvage the intact ones."""
+    problem = None
+    checked = 0
+    try:
+        with RecordReader(storage.data_file) as reader:
+            if reader.is_record_layout:
+                damaged = 0
+                for line in reader.lines(checksums=True):
+                    if not record_intact(line):
+                        damaged += 1
+                    elif has_checksum(line):
+                        checked += 1
+                if damaged:
+                    problem = f"{damaged} damaged entries"
+            else:
+                # Not the record layout: fine if it loads as an older store
+                with StoreScan(storage.data_file) as scan:
+                    for _ in scan.records():
+                        pass
+    except (OSError, MigrationError) as e:
+        problem = str(e)
+
+    if problem is None:
+        if not checked:
+            return Check("Checksums", OK, "none yet (added when the store is upgraded)")
+        return Check("Checksums", OK, f"{checked} entries verified")
+    if not fix:
+        return Check("Checksums", ERROR, f"{problem}; --fix salvages the intact entries")
+    recovery = recover_store(storage.data_file)
+    detail = f"kept {recovery.kept} intact entries"
+    if recovery.quarantine is not None:
+        detail += f", damaged data moved to {recovery.quarantine.name}"
+    return Check("Checksums", FIXED, detail)
+
+
+def _check_tags(storage, scan: _Scan, fix: bool, rebuild: bool) -> Check:
+    path = storage.tags_file
+    if not path.exists() and not rebuild:
+        return Check("Tag index", OK, "not built yet (built by tag filters)")
+    saved = TagIndex.load(path, file_signature(storage.data_file))
+    if saved is None and not (fix or rebuild):
+        # Written for another version of the store: ignored and rebuilt on next use
+        return Check("Tag index", OK, "out of date, rebuilt on next use")
+    if saved is not None and saved.counts() == scan.tags.counts() and not rebuild:
+        return Check("Tag index", OK, f"{len(saved.postings)} tags")
+    if fix or rebuild:
+        scan.tags.save(path, file_signature(storage.data_file))
+        return Check("Tag index", FIXED, f"rebuilt, {len(scan.tags.postings)} tags")
+    return Check("Tag index", WARN, f"{path.name} does not match the entries' tags")
+
+
+def _check_vectors(storage, scan: _Scan, fix: bool, rebuild: bool) -> Check:
+    path = storage.vectors_file
+    if not path.exists() and not rebuild:
+        return Check("Vector cache", OK, "not built yet (built by `similar`)")
+    vectors = VectorStore.load(path, file_signature(storage.data_file))
+    if vectors is None and not (fix or rebuild):
+        # Written for another version of the store: ignored and rebuilt on next use
+        return Check("Vector cache", OK, "out of date, rebuilt on next use")
+
+    problem = None
+    if vectors is None:
+        problem = "out of date"
+    elif scan.next_id is not None and vectors.next_id > scan.next_id:
+        problem = "newer than the store"
+    if problem is None:
+        stale = sum(1 for entry_id in vectors.ids if entry_id not in scan.ids)
+        if stale:
+            problem = f"{stale} rows for deleted entries"
+        elif not rebuild:
+            return Check("Vector cache", OK, f"{len(vectors)} rows")
+    if fix or rebuild:
+        return Check("Vector cache", FIXED, f"rebuilt, {storage.rebuild_vectors()} rows")
+    return Check("Vector cache", WARN, problem)
+
+
+def _check_spool(storage, fix: bool) -> Check:
+    spool_dir = storage.spool_dir
+    if not spool_dir.exists():
+        return Check("Capture spool", OK, "empty")
+    events: Dict[str, int] = {"pending": 0, "abandoned": 0}
+    for _, event in pending_events(spool_dir):
+        events["pending" if event is not None else "abandoned"] += 1
+    lock = spool_dir / LOCK_NAME
+    notes = []
+    fixed = False
+    if lock.exists() and not lock_holder_alive(lock):
+        if fix:
+            lock.unlink(missing_ok=True)
+            notes.append("removed stale ingester lock")
+            fixed = True
+        else:
+            notes.append("stale ingester lock")
+    if events["pending"]:
+        notes.append(f"{events['pending']} events waiting (run `noteerr ingest`)")
+    if events["abandoned"]:
+        notes.append(f"{events['abandoned']} abandoned events (dropped by `noteerr ingest`)")
+    if not notes:
+        return Check("Capture spool", OK, "empty")
+    return Check("Capture spool", FIXED if fixed else WARN, "; ".join(notes))
@@ -0,0 +1,224 @@
+"""
+Per-command outcome history, for telling flaky commands from broken ones.
+
+Every outcome noteerr sees is appended to `outcomes.log` beside the data
+file: reruns, commands run through `noteerr run` (successes included) and
+every captured failure, repeats that were merged into an earlier entry too.
+An event is a small fixed header and the command:
+
+    <u32 unix time> <u8 failed> <u16 length> <command, UTF-8>
+
+Writers only append, one `write` per batch, without reading or locking
+anything, so recording stays cheap however long the log grows.
+
+The statistics are kept in `flaky.bin`, together with how far into the log
+they have read. `FlakyIndex.sync` applies only the events appended since, so
+each `noteerr flaky` costs as much as the new events, not the whole history.
+For each command it keeps all-time counts and its last `WINDOW` outcomes as
+a bit mask, from which the failures and pass/fail flips in the window are
+counted without storing the events themselves.
+"""
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FORMAT_VERSION = 1
+# Outcomes per command in the sliding window
+WINDOW = 64
+# Commands longer than this (in bytes) are cut
+MAX_COMMAND = 4096
+
+_MASK = (1 << WINDOW) - 1
+_MAGIC = b"NOTEERRF"
+# magic, version, log inode, bytes of the log applied, command count
+_HEADER = struct.Struct("<8sHxxqqI")
+# window bits, outcomes in the window, failures, successes, last seen,
+# last failure, command length in bytes
+_ROW = struct.Struct("<QHIIddH")
+# unix time, failed, command length in bytes
+_EVENT = struct.Struct("<IBH")
+_CHUNK = 1 << 20
+
+
+def command_key(command: str) -> str:
+    """Commands differing only in whitespace count as one."""
+    return " ".join(command.split())
+
+
+def _event(command: str, failed: bool, timestamp: float) -> bytes:
+    name = command_key(command).encode("utf-8")
+    if len(name) > MAX_COMMAND:
+        name = name[:MAX_COMMAND].decode("utf-8", "ignore").encode("utf-8")
+    return _EVENT.pack(int(timestamp), 1 if failed else 0, len(name)) + name
+
+
+def append_outcomes(path: Path, outcomes: Iterable[Tuple[str, bool, float]]) -> int:
+    """
+    Append (command, failed, unix time) outcomes to the log at `path`.
+
+    Returns:
+        Number of events written
+    """
+    events = [_event(*outcome) for outcome in outcomes]
+    if not events:
+        return 0
+    data = memoryview(b"".join(events))
+    # O_APPEND keeps concurrent writers' batches from overwriting each other
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+    return len(events)
+
+
+@dataclass
+class CommandStats:
+    """What is known about one command's outcomes."""
+    command: str
+    # Last WINDOW outcomes, newest in bit 0, 1 for a failure
+    history: int = 0
+    runs: int = 0
+    failures: int = 0
+    successes: int = 0
+    last_seen: float = 0.0
+    last_failure: float = 0.0
+
+    def record(self, failed: bool, timestamp: float) -> None:
+        self.history = ((self.history << 1) | failed) & _MASK
+        self.runs = min(self.runs + 1, WINDOW)
+        if failed:
+            self.failures += 1
+            self.last_failure = max(self.last_failure, timestamp)
+        else:
+            self.successes += 1
+        self.last_seen = max(self.last_seen, timestamp)
+
+    @property
+    def window_failures(self) -> int:
+        return bin(self.history).count("1")
+
+    @property
+    def flips(self) -> int:
+        """Changes between passing and failing within the window."""
+        if self.runs < 2:
+            return 0
+        return bin((self.history ^ (self.history >> 1)) & ((1 << (self.runs - 1)) - 1)).count("1")
+
+    @property
+    def failure_rate(self) -> float:
+        return self.window_failures / self.runs if self.runs else 0.0
+
+    @property
+    def flakiness(self) -> float:
+        """
+        Share of consecutive outcomes in the window that flip: 0 for a
+        command that always passes or always fails, 1 for one alternating.
+        """
+        return self.flips / (self.runs - 1) if self.runs > 1 else 0.0
+
+    def outcomes(self) -> str:
+        """The window's outcomes oldest first, '.' for a pass and 'x' for a failure."""
+        return "".join("x" if self.history >> i & 1 else "." for i in range(self.runs - 1, -1, -1))
+
+
+class FlakyIndex:
+    """Command -> CommandStats, and how much of the outcome log they cover."""
+
+    def __init__(self):
+        self.commands: Dict[str, CommandStats] = {}
+        self.log_inode = 0
+        self.offset = 0
+
+    def record(self, command: str, failed: bool, timestamp: float) -> None:
+        stats = self.commands.get(command)
+        if stats is None:
+            stats = self.commands[command] = CommandStats(command)
+        stats.record(failed, timestamp)
+
+    def sync(self, log_path: Path) -> int:
+        """
+        Apply the events appended to the log since the last sync.
+
+        A log that was replaced or truncated is read from its start; the
+        statistics gathered from the old one are kept.
+
+        Returns:
+            Number of events applied
+        """
+        try:
+            f = open(log_path, "rb")
+        except FileNotFoundError:
+            return 0
+        applied = 0
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self.log_inode or st.st_size < self.offset:
+                self.log_inode, self.offset = st.st_ino, 0
+            f.seek(self.offset)
+            pending = b""
+            while True:
+                chunk = f.read(_CHUNK)
+                if not chunk:
+                    break
+                data = pending + chunk
+                pos = 0
+                while pos + _EVENT.size <= len(data):
+                    timestamp, failed, size = _EVENT.unpack_from(data, pos)
+                    end = pos + _EVENT.size + size
+                    if end > len(data):
+                        break
+                    self.record(data[pos + _EVENT.size:end].decode("utf-8", "replace"),
+                                bool(failed), timestamp)
+                    pos = end
+                    applied += 1
+                # An event cut by the chunk boundary (or still being appended) waits
+                self.offset += pos
+                pending = data[pos:]
+        return applied
+
+    def ranked(self, min_runs: int = 4) -> List[CommandStats]:
+        """Commands that both passed and failed within their window, flakiest first."""
+        flaky = [stats for stats in self.commands.values()
+                 if stats.runs >= min_runs and 0 < stats.window_failures < stats.runs]
+        return sorted(flaky, key=lambda s: (-s.flakiness, -s.window_failures, -s.last_failure))
+
+    def save(self, path: Path) -> None:
+        """Write the statistics, atomically."""
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, self.log_inode, self.offset,
+                                 len(self.commands)))
+            for stats in self.commands.values():
+                name = stats.command.encode("utf-8")
+                f.write(_ROW.pack(stats.history, stats.runs, stats.failures, stats.successes,
+                                  stats.last_seen, stats.last_failure, len(name)))
+                f.write(name)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['FlakyIndex']:
+        """Read statistics saved by `save`, or None if missing or incompatible."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, version, log_inode, offset, count = _HEADER.unpack_from(data)
+            if magic != _MAGIC or version != FORMAT_VERSION:
+                return None
+            index = cls()
+            index.log_inode, index.offset = log_inode, offset
+            pos = _HEADER.size
+            for _ in range(count):
+                *row, size = _ROW.unpack_from(data, pos)
+                pos += _ROW.size
+                command = data[pos:pos + size].decode("utf-8")
+                pos += size
+                index.commands[command] = CommandStats(command, *row)
+            if pos != len(data):
+                return None
+        except (OSError, ValueError, struct.error):
+            return None
+        return index
@@ -0,0 +1,206 @@
+"""In-memory indexes derived from the decoded error store."""
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .models import ErrorEntry
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the set of 3-character substrings of `text`."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def searchable_text(entry: ErrorEntry) -> str:
+    """The lowercase text the trigram index covers for an entry."""
+    return f"{entry.command}\n{entry.error}".lower()
+
+
+def intersect(postings: Iterable[Sequence[int]]) -> List[int]:
+    """
+    IDs present in every ascending postings list, ascending.
+
+    The shortest list drives; each of its IDs is looked up in the others by
+    binary search from where the previous lookup stopped, so the cost grows
+    with the smallest list rather than the largest.
+    """
+    lists = sorted(postings, key=len)
+    if not lists:
+        return []
+    result = list(lists[0])
+    for ids in lists[1:]:
+        kept = []
+        pos, end = 0, len(ids)
+        for entry_id in result:
+            pos = bisect_left(ids, entry_id, pos)
+            if pos == end:
+                break
+            if ids[pos] == entry_id:
+                kept.append(entry_id)
+        result = kept
+        if not result:
+            break
+    return result
+
+
+def union(postings: Iterable[Sequence[int]]) -> List[int]:
+    """IDs present in any of the postings lists, ascending."""
+    lists = [ids for ids in postings if ids]
+    if len(lists) == 1:
+        return list(lists[0])
+    merged: Set[int] = set()
+    for ids in lists:
+        merged.update(ids)
+    return sorted(merged)
+
+
+def _remove_id(postings: Dict[str, List[int]], key: str, entry_id: int) -> None:
+    ids = postings.get(key)
+    if not ids:
+        return
+    i = bisect_left(ids, entry_id)
+    if i < len(ids) and ids[i] == entry_id:
+        del ids[i]
+    if not ids:
+        del postings[key]
+
+
+def _remove_ids(postings: Dict[str, List[int]], key: str, entry_ids: Set[int]) -> None:
+    if len(entry_ids) == 1:
+        _remove_id(postings, key, next(iter(entry_ids)))
+        return
+    ids = postings.get(key)
+    if not ids:
+        return
+    ids[:] = [entry_id for entry_id in ids if entry_id not in entry_ids]
+    if not ids:
+        del postings[key]
+
+
+class StoreIndex:
+    """
+    Decoded entries plus lookup tables built from them.
+
+    Built once per load of the data file and updated in place by the
+    Storage write methods, so repeated queries in one process never
+    rebuild it. Postings lists hold entry IDs in ascending order.
+    """
+
+    def __init__(self, entries: Iterable[ErrorEntry]):
+        self.entries: List[ErrorEntry] = []
+        self.by_id: Dict[int, ErrorEntry] = {}
+        self.by_project: Dict[str, List[int]] = {}
+        self.by_tag: Dict[str, List[int]] = {}
+        self.timestamps: List[str] = []
+        # Entries are usually appended in time order; late spooled events,
+        # imports or hand edits may break that
+        self.chronological = True
+        # Built on first regex/fuzzy search, then maintained incrementally
+        self._trigrams: Optional[Dict[str, Set[int]]] = None
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'StoreIndex':
+        """Build an index from raw entry dictionaries."""
+        return cls(ErrorEntry.from_dict(record) for record in records)
+
+    def get(self, entry_id: int) -> Optional[ErrorEntry]:
+        return self.by_id.get(entry_id)
+
+    def _post(self, postings: Dict[str, List[int]], key: str, entry_id: int) -> None:
+        ids = postings.setdefault(key, [])
+        if ids and ids[-1] > entry_id:
+            ids.insert(bisect_left(ids, entry_id), entry_id)
+        else:
+            ids.append(entry_id)
+
+    def add(self, entry: ErrorEntry) -> None:
+        if self.timestamps and entry.timestamp < self.timestamps[-1]:
+            self.chronological = False
+        self.entries.append(entry)
+        self.timestamps.append(entry.timestamp)
+        self.by_id[entry.id] = entry
+        if entry.project:
+            self._post(self.by_project, entry.project.lower(), entry.id)
+        for tag in set(entry.tags):
+            self._post(self.by_tag, tag, entry.id)
+        if self._trigrams is not None:
+            self._index_trigrams(entry)
+
+    def _index_trigrams(self, entry: ErrorEntry) -> None:
+        table = self._trigrams
+        for gram in trigrams(searchable_text(entry)):
+            ids = table.get(gram)
+            if ids is None:
+                table[gram] = {entry.id}
+            else:
+                ids.add(entry.id)
+
+    def trigram_postings(self) -> Dict[str, Set[int]]:
+        """Trigram -> entry IDs over lowercase command and error text."""
+        if self._trigrams is None:
+            self._trigrams = {}
+            for entry in self.entries:
+                self._index_trigrams(entry)
+        return self._trigrams
+
+    def update(self, entry_id: int, notes: Optional[str] = None,
+               tags: Optional[List[str]] = None) -> None:
+        entry = self.by_id.get(entry_id)
+        if entry is None:
+            return
+        if notes is not None:
+            entry.notes = notes
+        if tags is not None:
+            for tag in set(entry.tags):
+                _remove_id(self.by_tag, tag, entry_id)
+            entry.tags = list(tags)
+            for tag in set(entry.tags):
+                self._post(self.by_tag, tag, entry_id)
+
+    def remove(self, entry_id: int) -> None:
+        self.remove_many([entry_id])
+
+    def remove_many(self, entry_ids: Iterable[int]) -> None:
+        """
+        Remove several entries. The entry list and each postings list they
+        appear in are rebuilt once for the batch rather than once per entry.
+        """
+        removed = [entry for entry in (self.by_id.pop(i, None) for i in entry_ids)
+                   if entry is not None]
+        if not removed:
+            return
+        doomed = {entry.id for entry in removed}
+        kept = [position for position, entry in enumerate(self.entries)
+                if entry.id not in doomed]
+        self.entries[:] = [self.entries[position] for position in kept]
+        self.timestamps[:] = [self.timestamps[position] for position in kept]
+
+        by_project: Dict[str, Set[int]] = {}
+        by_tag: Dict[str, Set[int]] = {}
+        for entry in removed:
+            if entry.project:
+                by_project.setdefault(entry.project.lower(), set()).add(entry.id)
+            for tag in entry.tags:
+                by_tag.setdefault(tag, set()).add(entry.id)
+        for postings, groups in ((self.by_project, by_project), (self.by_tag, by_tag)):
+            for key, ids in groups.items():
+                _remove_ids(postings, key, ids)
+        if self._trigrams is not None:
+            for entry in removed:
+                for gram in trigrams(searchable_text(entry)):
+                    ids = self._trigrams.get(gram)
+                    if ids is not None:
+                        ids.discard(entry.id)
+
+    def time_range(self, since: Optional[str] = None,
+                   until: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """
+        Return the (start, stop) slice of `entries` logged in [since, until),
+        or None if entries are not in time order.
+        """
+        if not self.chronological:
+            return None
+        start = bisect_left(self.timestamps, since) if since else 0
+        stop = bisect_left(self.timestamps, until) if until else len(self.timestamps)
+        return start, max(start, stop)
@@ -0,0 +1,238 @@
+"""
+Schema versions of errors.json and the steps that upgrade older stores.
+
+The header line records the version a store was written with:
+
+    {"schema": 3, "next_id": 3, "entries": [
+
+Stores without it are version 1. Each upgrade step turns a record of one
+version into a record of the next and is registered with
+`@migration(from_version)`. Steps only ever see one record, so
+`migrate_file` can stream a store of any size through them into a new file
+and swap it in; nothing but the current record is held in memory.
+
+Versions:
+
+    1   Entries as written by 1.x; `notes`, `tags` and `project` may be
+        missing (they were added over time) or null.
+    2   Every record has every entry field, in `ErrorEntry.to_dict` order,
+        so raw record lines can be passed through and filtered without
+        decoding them. Keys this release does not know are kept.
+    3   Every record line ends with a checksum (see `recordfile`).
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from .recordfile import SCHEMA_VERSION, RecordReader, encode_record, header_line, atomic_write
+
+Record = Dict[str, Any]
+
+MIGRATIONS: Dict[int, Callable[[Record], Record]] = {}
+
+_ENTRIES_RE = re.compile(r'"entries"\s*:\s*\[')
+_NEXT_ID_RE = re.compile(r'"next_id"\s*:\s*(\d+)')
+_SCHEMA_RE = re.compile(r'"schema"\s*:\s*(\d+)')
+
+
+class MigrationError(Exception):
+    """The store cannot be read or upgraded."""
+
+
+class NewerStoreError(MigrationError):
+    """The store was written by a newer noteerr; this one must not read or rewrite it."""
+
+    def __init__(self, path, schema: int):
+        super().__init__(f"{path} was written by a newer noteerr "
+                         f"(schema {schema}); upgrade noteerr to use it")
+        self.schema = schema
+
+
+def migration(from_version: int):
+    """Register a step upgrading records from `from_version` to the next version."""
+    def register(step: Callable[[Record], Record]) -> Callable[[Record], Record]:
+        MIGRATIONS[from_version] = step
+        return step
+    return register
+
+
+def upgrade_record(record: Record, version: int) -> Record:
+    """Run a record through the steps from `version` to `SCHEMA_VERSION`."""
+    for v in range(version, SCHEMA_VERSION):
+        record = MIGRATIONS[v](record)
+    return record
+
+
+def upgrade_records(records: Iterable[Record], version: int) -> Iterator[Record]:
+    """Upgrade a stream of records; each must have an integer ID."""
+    for position, record in enumerate(records):
+        if not isinstance(record, dict) or not isinstance(record.get("id"), int):
+            raise MigrationError(f"entry #{position + 1} in the store has no ID")
+        yield upgrade_record(record, version)
+
+
+def upgrade_data(data: Dict[str, Any]) -> bool:
+    """
+    Upgrade a store that is already loaded, in place.
+
+    Returns:
+        True if it was from an older version (and needs writing back)
+    """
+    version = data.get("schema", 1)
+    if version >= SCHEMA_VERSION:
+        return False
+    data["entries"] = list(upgrade_records(data["entries"], version))
+    data["schema"] = SCHEMA_VERSION
+    return True
+
+
+# Version 1 -> 2 --------------------------------------------------------------
+
+_V2_FIELDS = {
+    "timestamp": "1970-01-01T00:00:00",
+    "command": "",
+    "error": "",
+    "exit_code": 1,
+    "directory": "",
+    "notes": "",
+    "tags": [],
+    "project": "",
+}
+
+
+@migration(1)
+def _complete_fields(record: Record) -> Record:
+    upgraded = {"id": record["id"]}
+    for name, default in _V2_FIELDS.items():
+        value = record.get(name)
+        if value is None:
+            value = [] if name == "tags" else default
+        upgraded[name] = value
+    for key, value in record.items():
+        upgraded.setdefault(key, value)
+    return upgraded
+
+
+# Version 2 -> 3 --------------------------------------------------------------
+
+@migration(2)
+def _add_checksums(record: Record) -> Record:
+    # Records don't change; `encode_record` adds the checksum as they are rewritten
+    return record
+
+
+# Streaming ---------------------------------------------------------------------
+
+class StoreScan:
+    """
+    Stream the records of a data file in either layout, oldest first.
+
+    Use as a context manager. The record layout is read through the
+    memory-mapped `RecordReader`; pretty-printed files from older versions
+    are decoded one entry at a time from a sliding buffer.
+    """
+
+    def __init__(self, path: Path, chunk_size: int = 1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._reader = RecordReader(path)
+        self.record_layout = self._reader.is_record_layout
+        if self.record_layout:
+            self.schema = self._reader.schema
+            self.next_id: Optional[int] = self._reader.next_id
+        else:
+            self.schema, self.next_id = self._legacy_header()
+
+    def close(self) -> None:
+        self._reader.close()
+
+    def __enter__(self) -> 'StoreScan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def records(self) -> Iterator[Record]:
+        if self.record_layout:
+            try:
+                yield from self._reader.records(chunk_size=self.chunk_size)
+            except ValueError as e:
+                raise MigrationError(f"unreadable entry: {e}") from None
+        else:
+            yield from self._legacy_records()
+
+    def _legacy_header(self):
+        """Find `schema` and `next_id` around the entries array without reading it."""
+        with open(self.path, "rb") as f:
+            head = f.read(4096).decode("utf-8", "replace")
+            f.seek(max(0, os.path.getsize(self.path) - 4096))
+            tail = f.read().decode("utf-8", "replace")
+        entries = _ENTRIES_RE.search(head)
+        if entries is None:
+            raise MigrationError(f"{self.path} is not a noteerr store")
+        # Only look outside the entries: before the array, or after its end
+        outside = head[:entries.start()] + tail[tail.rfind("]") + 1:]
+        schema = _SCHEMA_RE.search(outside)
+        next_id = _NEXT_ID_RE.search(outside)
+        return (int(schema.group(1)) if schema else 1,
+                int(next_id.group(1)) if next_id else None)
+
+    def _legacy_records(self) -> Iterator[Record]:
+        decoder = json.JSONDecoder()
+        with open(self.path, "r", encoding="utf-8") as f:
+            buf = f.read(self.chunk_size)
+            pos = _ENTRIES_RE.search(buf).end()
+            eof = False
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    if pos >= len(buf):
+                        raise ValueError("end of buffer")
+                    record, pos = decoder.raw_decode(buf, pos)
+                except ValueError as e:
+                    if eof:
+                        raise MigrationError(f"{self.path} is truncated or corrupt: {e}") from None
+                    # The entry runs past the buffer: drop what was consumed, read more
+                    more = f.read(self.chunk_size)
+                    eof = not more
+                    buf, pos = buf[pos:] + more, 0
+                    continue
+                yield record
+
+
+def migrate_file(path: Path, chunk_size: int = 1 << 20) -> Optional[int]:
+    """
+    Upgrade the store at `path` to the current schema and record layout.
+
+    Records are streamed through the registered steps into a new file next
+    to the store, which then replaces it (see `atomic_write`); if anything
+    fails the original is left untouched.
+
+    Returns:
+        Number of entries rewritten, or None if the store was already current
+    """
+    with StoreScan(path, chunk_size) as scan:
+        if scan.schema > SCHEMA_VERSION:
+            raise NewerStoreError(path, scan.schema)
+        if scan.record_layout and scan.schema == SCHEMA_VERSION:
+            return None
+        next_id = scan.next_id
+        if next_id is None:
+            next_id = 1 + max((record["id"] for record in scan.records()), default=0)
+
+    # The store is closed before the new file replaces it (Windows requires it)
+    count = 0
+    with atomic_write(path) as out, StoreScan(path, chunk_size) as scan:
+        out.write(header_line(next_id))
+        for record in upgrade_records(scan.records(), scan.schema):
+            if count:
+                out.write(",\n")
+            out.write(encode_record(record))
+            count += 1
+        out.write("\n]}\n" if count else "]}\n")
+    return count
@@ -1,5 +1,5 @@
 """Data models for noteerr."""
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from datetime import datetime
 from typing import Optional, Dict, Any
 
@@ -26,8 +26,12 @@ class ErrorEntry:
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ErrorEntry':
-        """Create an ErrorEntry from a dictionary."""
-        return cls(**data)
+        """Create an ErrorEntry from a dictionary, ignoring keys it doesn't know."""
+        try:
+            return cls(**data)
+        except TypeError:
+            # Fields added by a newer version
+            return cls(**{k: v for k, v in data.items() if k in _FIELD_NAMES})
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert ErrorEntry to dictionary."""
@@ -42,6 +46,10 @@ class ErrorEntry:
     @property
     def short_date(self) -> str:
         """Return a short date format."""
+        ts = self.timestamp
+        # ISO timestamps already start with the date; skip parsing them
+        if len(ts) >= 10 and ts[4] == "-" and ts[7] == "-" and ts[:4].isdigit():
+            return ts[:10]
         dt = datetime.fromisoformat(self.timestamp)
         return dt.strftime("%Y-%m-%d")
     
@@ -77,3 +85,6 @@ class ErrorEntry:
                 return True
         
         return False
+
+
+_FIELD_NAMES = frozenset(field.name for field in fields(ErrorEntry))
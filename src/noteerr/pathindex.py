@@ -0,0 +1,94 @@
+"""
+Directory postings for `list --dir`, cached in `dirs.bin` next to the data file.
+
+Each working directory maps to the IDs of the entries saved in it, ascending,
+exactly like the tag postings (and in the same file format, see `tagindex`).
+A directory's subtree is every key equal to it or starting with it plus a
+separator; in sorted order those keys are one contiguous run, so a subtree
+query is two bisections over the directory names and a merge of their
+postings. No entry is decoded, and no path compared, unless it matches.
+"""
+import heapq
+import os
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .recordfile import ID_RE, record_directory
+from .tagindex import TagIndex
+
+
+def directory_key(directory: Optional[str]) -> Optional[str]:
+    """The form an entry's directory is indexed under (None if it has none)."""
+    return os.path.normpath(directory) if directory else None
+
+
+def in_directory(directory: Optional[str], root: str, recursive: bool = False) -> bool:
+    """Whether `directory` is `root` or, if `recursive`, anywhere below it."""
+    key = directory_key(directory)
+    if key is None:
+        return False
+    root = directory_key(root)
+    return key == root or (recursive and key.startswith(root.rstrip(os.sep) + os.sep))
+
+
+class PathIndex(TagIndex):
+    """Directory -> ascending entry IDs, with subtree lookups."""
+
+    MAGIC = b"NOTEERRD"
+
+    def __init__(self, postings: Optional[Dict[str, array]] = None):
+        super().__init__(postings)
+        self._keys: Optional[List[str]] = None
+
+    @classmethod
+    def build(cls, records: Iterable[Dict]) -> 'PathIndex':
+        """Index raw entry dictionaries."""
+        index = cls()
+        for record in records:
+            index.add(record["id"], record.get("directory"))
+        return index
+
+    @classmethod
+    def build_from_lines(cls, lines: Iterable[bytes]) -> 'PathIndex':
+        """Index raw record lines, reading only their ID and directory."""
+        index = cls()
+        for line in lines:
+            match = ID_RE.match(line)
+            if match:
+                index.add(int(match.group(1)), record_directory(line))
+        return index
+
+    def add(self, entry_id: int, directory: Optional[str]) -> None:
+        key = directory_key(directory)
+        if key is not None:
+            if key not in self.postings:
+                self._keys = None
+            super().add(entry_id, [key])
+
+    def remove(self, entry_id: int, directory: Optional[str]) -> None:
+        key = directory_key(directory)
+        if key is not None:
+            super().remove(entry_id, [key])
+            if key not in self.postings:
+                self._keys = None
+
+    def directories(self, root: str, recursive: bool = False) -> List[str]:
+        """Indexed directories that are `root` or, if `recursive`, below it."""
+        root = directory_key(root)
+        if not recursive:
+            return [root] if root in self.postings else []
+        if self._keys is None:
+            self._keys = sorted(self.postings)
+        keys = self._keys
+        # Keys below root sort between "root/" and "root0" ('0' follows '/')
+        prefix = root.rstrip(os.sep) + os.sep
+        found = keys[bisect_left(keys, prefix):bisect_left(keys, prefix[:-1] + chr(ord(os.sep) + 1))]
+        return ([root] if root in self.postings and root != prefix else []) + found
+
+    def recent_ids(self, root: str, recursive: bool = False) -> Iterator[int]:
+        """IDs of the entries saved in `root` (or its subtree), newest first."""
+        postings = [self.postings[key] for key in self.directories(root, recursive)]
+        if len(postings) == 1:
+            return reversed(postings[0])
+        return heapq.merge(*(reversed(ids) for ids in postings), reverse=True)
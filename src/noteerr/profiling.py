@@ -0,0 +1,146 @@
+"""Per-phase timing instrumentation for noteerr."""
+import functools
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+# Captured when the CLI first imports this module, before click and rich
+_process_mark = time.perf_counter()
+_startup: List[Tuple[str, float]] = []
+
+_tracer: Optional["Tracer"] = None
+_instrumented = []
+
+
+def phase_of(name: str):
+    """
+    Declare which phase a method's time belongs to.
+
+    The decorator only tags the function; nothing is wrapped until tracing
+    is enabled, so instrumented methods cost nothing otherwise.
+    """
+    def decorator(func):
+        func.__noteerr_phase__ = name
+        return func
+    return decorator
+
+
+def mark(name: str) -> None:
+    """Record the time since the previous mark as a startup phase."""
+    global _process_mark
+    now = time.perf_counter()
+    _startup.append((name, now - _process_mark))
+    _process_mark = now
+
+
+class Tracer:
+    """Accumulates self-time per phase, attributing nested calls to their own phase."""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self._stack = []
+        self.started = time.perf_counter()
+
+    def push(self, name: str) -> None:
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def pop(self) -> None:
+        name, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.totals[name] = self.totals.get(name, 0.0) + elapsed - children
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def report(self, stream=None) -> None:
+        """Print the timing breakdown, startup phases first."""
+        stream = stream or sys.stderr
+        while self._stack:
+            self.pop()
+
+        rows = [(name, seconds, None) for name, seconds in _startup]
+        order = ["history", "redact", "project", "read", "index", "dedup", "write", "render"]
+        for name in sorted(self.totals, key=lambda n: order.index(n) if n in order else len(order)):
+            rows.append((name, self.totals[name], self.calls[name]))
+
+        total = sum(seconds for _, seconds, _ in rows)
+        stream.write(f"\nnoteerr timing (total {total * 1000:.1f} ms)\n")
+        for name, seconds, calls in rows:
+            share = seconds / total * 100 if total else 0.0
+            count = f"  ({calls} call{'s' if calls != 1 else ''})" if calls else ""
+            stream.write(f"  {name:<14}{seconds * 1000:9.2f} ms {share:5.1f}%{count}\n")
+        stream.flush()
+
+
+def _wrap(func, name: str):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        tracer = _tracer
+        if tracer is None:
+            return func(*args, **kwargs)
+        tracer.push(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            tracer.pop()
+    return wrapper
+
+
+def instrument(cls) -> None:
+    """Wrap every method of `cls` tagged with `phase_of`."""
+    for attr, value in list(vars(cls).items()):
+        name = getattr(value, "__noteerr_phase__", None)
+        if name and callable(value):
+            setattr(cls, attr, _wrap(value, name))
+            _instrumented.append((cls, attr, value))
+
+
+@contextmanager
+def phase(name: str):
+    """Attribute the enclosed block to a phase when tracing is enabled."""
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    tracer.push(name)
+    try:
+        yield
+    finally:
+        tracer.pop()
+
+
+def trace_settings(profile: bool = False, profile_output: Optional[str] = None
+                   ) -> Tuple[bool, Optional[str]]:
+    """
+    Resolve whether tracing is on and where to dump cProfile stats.
+
+    `NOTEERR_TRACE=1` enables the breakdown; any other non-false value is
+    treated as a path for the pstats dump as well.
+    """
+    env = os.environ.get("NOTEERR_TRACE", "").strip()
+    if env.lower() in ("", "0", "false", "no", "off"):
+        env = ""
+    if env and env.lower() not in ("1", "true", "yes", "on") and not profile_output:
+        profile_output = env
+    return bool(profile or profile_output or env), profile_output
+
+
+def start(*classes) -> Tracer:
+    """Instrument `classes` and start collecting timings."""
+    global _tracer
+    for cls in classes:
+        if not any(c is cls for c, _, _ in _instrumented):
+            instrument(cls)
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop() -> Optional[Tracer]:
+    """Stop collecting timings and return the tracer."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
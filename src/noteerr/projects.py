@@ -0,0 +1,245 @@
+"""
+Working out which project a directory belongs to, without asking.
+
+In order, a directory's project is:
+
+    1. the project of the longest matching path rule (`noteerr projects --map`)
+    2. the name in the nearest pyproject.toml or package.json above it
+    3. the name of the nearest directory above it holding .git
+
+Rules are kept in `project-rules.tsv` (directory, tab, project). Answers are
+remembered in `projects.cache`, keyed by directory, with the marker file they
+came from and a stamp of the mtimes the answer depends on: the marker's, and
+those of the directories from the one asked about up to the marker's, where
+a nearer marker could appear. Checking the stamp and that the rules haven't
+been edited is a `stat` call per directory level, so saving an error never
+walks the tree, reads manifests or scans the store twice for the same
+directory.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+FORMAT_VERSION = 2
+# Directories remembered; the least recently added are dropped first
+MAX_CACHED = 2000
+MARKERS = ("pyproject.toml", "package.json", ".git")
+
+_HEADER = "# noteerr project cache v"
+_SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]\s*$")
+_NAME_RE = re.compile(r"""^\s*name\s*=\s*["']([^"']+)["']""")
+
+
+@dataclass
+class Detection:
+    """A directory's project and where it came from."""
+    project: str
+    # Marker file, or the rules file, the name was taken from ("" if none)
+    source: str
+
+
+def _stamp(path: str) -> int:
+    """mtime of `path` (0 if missing)."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _search_stamp(directory: str, source: str) -> int:
+    """
+    Stamp of what finding `source` from `directory` depended on: the mtimes
+    of the directories searched (adding or removing a marker changes its
+    directory's), and of `source` itself unless it is .git, which git
+    touches constantly. With no source, every directory up to the root.
+    """
+    top = os.path.dirname(source) if source else None
+    stamp = _stamp(source) if source and os.path.basename(source) != ".git" else 0
+    current = directory
+    while True:
+        stamp += _stamp(current)
+        parent = os.path.dirname(current)
+        if current == top or parent == current:
+            return stamp
+        current = parent
+
+
+def _pyproject_name(path: str) -> str:
+    """`name` from the [project] or [tool.poetry] table of a pyproject.toml."""
+    section = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = _SECTION_RE.match(line)
+            if match:
+                section = match.group(1).strip()
+                continue
+            match = _NAME_RE.match(line)
+            if match and section in ("project", "tool.poetry"):
+                return match.group(1).strip()
+    return ""
+
+
+def _package_name(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        name = json.load(f).get("name")
+    # Scoped packages (@org/name) are known by their name
+    return name.rsplit("/", 1)[-1] if isinstance(name, str) else ""
+
+
+def _marker_project(directory: str, marker: str) -> str:
+    path = os.path.join(directory, marker)
+    if marker == ".git":
+        return os.path.basename(directory)
+    try:
+        return _pyproject_name(path) if marker == "pyproject.toml" else _package_name(path)
+    except (OSError, ValueError, AttributeError):
+        return ""
+
+
+def _normalize(directory: str) -> str:
+    return os.path.normpath(os.path.abspath(os.path.expanduser(directory)))
+
+
+class ProjectResolver:
+    """Directory -> project, remembered across runs."""
+
+    def __init__(self, rules_file: Path, cache_file: Path):
+        self.rules_file = rules_file
+        self.cache_file = cache_file
+        self._rules: Optional[List[Tuple[str, str]]] = None
+        self._cache: Optional[Dict[str, Tuple[str, str, int]]] = None
+        self._dirty = False
+
+    # Rules -------------------------------------------------------------------
+
+    def rules(self) -> List[Tuple[str, str]]:
+        """(directory, project) rules, longest directory first."""
+        if self._rules is None:
+            rules = []
+            try:
+                with open(self.rules_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.startswith("#") or "\t" not in line:
+                            continue
+                        directory, project = line.rstrip("\n").split("\t", 1)
+                        if directory.strip() and project.strip():
+                            rules.append((_normalize(directory.strip()), project.strip()))
+            except OSError:
+                pass
+            self._rules = sorted(rules, key=lambda rule: -len(rule[0]))
+        return self._rules
+
+    def _write_rules(self, rules: List[Tuple[str, str]]) -> None:
+        tmp = self.rules_file.with_name(self.rules_file.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("# directory<TAB>project: errors saved under directory belong to project\n")
+            for directory, project in sorted(rules):
+                f.write(f"{directory}\t{project}\n")
+        os.replace(tmp, self.rules_file)
+        # Remembered answers may no longer hold
+        self._rules = self._cache = None
+
+    def set_rule(self, directory: str, project: str) -> str:
+        """Map `directory` and everything under it to `project`; return the directory."""
+        directory = _normalize(directory)
+        rules = [rule for rule in self.rules() if rule[0] != directory]
+        self._write_rules(rules + [(directory, project)])
+        return directory
+
+    def remove_rule(self, directory: str) -> bool:
+        directory = _normalize(directory)
+        rules = self.rules()
+        kept = [rule for rule in rules if rule[0] != directory]
+        if len(kept) == len(rules):
+            return False
+        self._write_rules(kept)
+        return True
+
+    def _match_rule(self, directory: str) -> Optional[Tuple[str, str]]:
+        for prefix, project in self.rules():
+            if directory == prefix or directory.startswith(prefix.rstrip(os.sep) + os.sep):
+                return prefix, project
+        return None
+
+    # Cache -------------------------------------------------------------------
+
+    def _load_cache(self) -> Dict[str, Tuple[str, str, int]]:
+        """directory -> (project, source, source stamp), dropped if the rules changed."""
+        if self._cache is not None:
+            return self._cache
+        cache: Dict[str, Tuple[str, str, int]] = {}
+        expected = f"{_HEADER}{FORMAT_VERSION} {_stamp(str(self.rules_file))}"
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                if f.readline().rstrip("\n") == expected:
+                    for line in f:
+                        directory, project, source, stamp = line.rstrip("\n").split("\t")
+                        cache[directory] = (project, source, int(stamp))
+        except (OSError, ValueError):
+            cache = {}
+        self._cache = cache
+        return cache
+
+    def save(self) -> None:
+        """Write the cache back if lookups added to it."""
+        if not self._dirty:
+            return
+        cache = self._load_cache()
+        entries = list(cache.items())[-MAX_CACHED:]
+        tmp = self.cache_file.with_name(self.cache_file.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{_HEADER}{FORMAT_VERSION} {_stamp(str(self.rules_file))}\n")
+            for directory, (project, source, stamp) in entries:
+                f.write(f"{directory}\t{project}\t{source}\t{stamp}\n")
+        os.replace(tmp, self.cache_file)
+        self._dirty = False
+
+    # Lookup ------------------------------------------------------------------
+
+    def detect(self, directory: str) -> Detection:
+        """
+        The project `directory` belongs to, or an empty one if nothing says.
+
+        A remembered answer is used while the file it came from and the
+        directories searched to find it have the same mtimes.
+        """
+        directory = _normalize(directory)
+        cache = self._load_cache()
+        cached = cache.get(directory)
+        if cached is not None and self._source_stamp(directory, cached[1]) == cached[2]:
+            return Detection(cached[0], cached[1])
+
+        detection = self._detect(directory)
+        if "\t" in directory or "\n" in directory:
+            return detection  # Can't be written to the cache
+        cache.pop(directory, None)
+        cache[directory] = (detection.project, detection.source,
+                            self._source_stamp(directory, detection.source))
+        self._dirty = True
+        return detection
+
+    def _source_stamp(self, directory: str, source: str) -> int:
+        if source == str(self.rules_file):
+            # Rules are checked against the rules file's mtime, with the whole cache
+            return _stamp(source)
+        return _search_stamp(directory, source)
+
+    def _detect(self, directory: str) -> Detection:
+        rule = self._match_rule(directory)
+        if rule is not None:
+            return Detection(rule[1], str(self.rules_file))
+        current = directory
+        while True:
+            for marker in MARKERS:
+                path = os.path.join(current, marker)
+                if os.path.exists(path):
+                    project = _marker_project(current, marker)
+                    if project:
+                        return Detection(project, path)
+            parent = os.path.dirname(current)
+            if parent == current:
+                return Detection("", "")
+            current = parent
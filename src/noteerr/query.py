@@ -0,0 +1,308 @@
+"""
+Structured search queries for noteerr.
+
+A query mixes field filters and free text:
+
+    project:api tag:docker exit:137 since:2d "no space left"
+
+Separate terms must all match; comma-separated values inside one filter
+match any of them (`exit:137,139`). Queries compile into a `QueryPlan` that
+drives the scan from the most selective indexed filter (project, tag or
+time range) and checks everything else on the candidates only.
+"""
+import re
+import shlex
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from .index import StoreIndex, intersect, union
+from .models import ErrorEntry
+from .solutions import error_group
+
+FIELDS = {
+    "project": "projects",
+    "tag": "tags",
+    "exit": "exit_codes",
+    "cmd": "commands",
+    "command": "commands",
+    "group": "groups",
+    "since": "since",
+    "until": "until",
+}
+
+_DURATION_RE = re.compile(r"^(\d+)([smhdw])$")
+_DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+class QueryError(ValueError):
+    """Raised when a query cannot be parsed."""
+
+
+def parse_time(value: str, now: Optional[datetime] = None) -> str:
+    """
+    Convert a relative duration (`30m`, `2d`, `1w`) or a date/ISO timestamp
+    into an ISO timestamp comparable with `ErrorEntry.timestamp`.
+    """
+    match = _DURATION_RE.match(value.strip().lower())
+    if match:
+        amount, unit = int(match.group(1)), _DURATION_UNITS[match.group(2)]
+        return ((now or datetime.now()) - timedelta(**{unit: amount})).isoformat()
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise QueryError(f"Invalid time '{value}'. Use e.g. 30m, 2d, 1w or 2026-01-31") from None
+
+
+@dataclass
+class Query:
+    """A parsed query. Each inner list is a set of alternatives (any-of)."""
+    projects: List[List[str]] = field(default_factory=list)
+    tags: List[List[str]] = field(default_factory=list)
+    exit_codes: List[List[int]] = field(default_factory=list)
+    commands: List[str] = field(default_factory=list)
+    groups: List[List[str]] = field(default_factory=list)
+    terms: List[str] = field(default_factory=list)
+    since: Optional[str] = None
+    until: Optional[str] = None
+
+
+def _split(text: str) -> List[str]:
+    """Split on whitespace, keeping double-quoted phrases together."""
+    lexer = shlex.shlex(text, posix=True)
+    lexer.whitespace_split = True
+    lexer.quotes = '"'
+    lexer.escape = ''
+    lexer.commenters = ''
+    try:
+        return list(lexer)
+    except ValueError as e:
+        raise QueryError(f"Invalid query: {e}") from None
+
+
+def join_args(args: Iterable[str]) -> str:
+    """Join command-line arguments into one query, quoting multi-word ones."""
+    args = list(args)
+    if len(args) == 1:
+        return args[0]
+    return " ".join(f'"{arg}"' if len(arg.split()) > 1 and '"' not in arg else arg
+                    for arg in args)
+
+
+def parse_query(text: str) -> Query:
+    """
+    Parse a query string.
+
+    A query without any `field:` filters or double quotes is treated as a
+    single phrase, so plain `noteerr search permission denied` keeps
+    matching the whole phrase as before.
+    """
+    query = Query()
+    has_field = any(FIELDS.get(token.partition(":")[0].lower()) and ":" in token
+                    for token in text.split())
+    if not has_field and '"' not in text:
+        phrase = text.strip()
+        if phrase:
+            query.terms.append(phrase.lower())
+        return query
+
+    tokens = _split(text)
+
+    for token in tokens:
+        name, sep, value = token.partition(":")
+        attr = FIELDS.get(name.lower()) if sep else None
+        if attr is None or not value:
+            if token.strip():
+                query.terms.append(token.lower())
+            continue
+
+        values = [v.strip() for v in value.split(",") if v.strip()]
+        if attr == "projects":
+            query.projects.append([v.lower() for v in values])
+        elif attr == "tags":
+            query.tags.append(values)
+        elif attr == "exit_codes":
+            try:
+                query.exit_codes.append([int(v) for v in values])
+            except ValueError:
+                raise QueryError(f"Invalid exit code in '{token}'") from None
+        elif attr == "commands":
+            query.commands.append(value.lower())
+        elif attr == "groups":
+            query.groups.append([v.lower() for v in values])
+        elif attr == "since":
+            query.since = parse_time(value)
+        elif attr == "until":
+            query.until = parse_time(value)
+    return query
+
+
+def raw_needle(text: str) -> Optional[bytes]:
+    """
+    Return the lowercase bytes `text` occupies in a record's raw JSON line,
+    or None if it contains characters JSON would escape.
+    """
+    text = text.lower()
+    if not text.isascii() or '"' in text or "\\" in text or any(ord(c) < 0x20 for c in text):
+        return None
+    return text.encode("ascii")
+
+
+def term_matches(entry: ErrorEntry, term: str) -> bool:
+    """Check whether a lowercase free-text term appears in an entry."""
+    return (term in entry.command.lower()
+            or term in entry.error.lower()
+            or term in entry.notes.lower()
+            or any(term in tag.lower() for tag in entry.tags))
+
+
+class QueryPlan:
+    """
+    Execution plan for a query.
+
+    `strategy` names the access path chosen by `run`; `describe` explains it.
+    """
+
+    def __init__(self, query: Query):
+        self.query = query
+        self.strategy = "full scan"
+        self.candidates = None
+
+    def matches(self, entry: ErrorEntry) -> bool:
+        """Apply every predicate, cheapest first."""
+        q = self.query
+        if q.since and entry.timestamp < q.since:
+            return False
+        if q.until and entry.timestamp >= q.until:
+            return False
+        for alternatives in q.projects:
+            if entry.project.lower() not in alternatives:
+                return False
+        for alternatives in q.tags:
+            if not any(tag in entry.tags for tag in alternatives):
+                return False
+        for alternatives in q.exit_codes:
+            if entry.exit_code not in alternatives:
+                return False
+        for command in q.commands:
+            if command not in entry.command.lower():
+                return False
+        if q.groups:
+            group = error_group(entry.error)
+            for alternatives in q.groups:
+                if group not in alternatives:
+                    return False
+        for term in q.terms:
+            if not term_matches(entry, term):
+                return False
+        return True
+
+    def raw_needles(self) -> List[bytes]:
+        """
+        Byte strings that must all appear in a matching record's lowercased
+        JSON line, used to skip decoding records on the unindexed path.
+        """
+        q = self.query
+        needles = []
+
+        def quoted(prefix: bytes, value: str) -> Optional[bytes]:
+            raw = raw_needle(value)
+            return prefix + b'"' + raw + b'"' if raw is not None else None
+
+        for alternatives in q.projects:
+            if len(alternatives) == 1:
+                needles.append(quoted(b'"project": ', alternatives[0]))
+        for alternatives in q.tags:
+            if len(alternatives) == 1:
+                needles.append(quoted(b"", alternatives[0]))
+        for alternatives in q.exit_codes:
+            if len(alternatives) == 1:
+                needles.append(f'"exit_code": {alternatives[0]}'.encode("ascii"))
+        needles += [raw_needle(text) for text in q.commands + q.terms]
+        return [needle for needle in needles if needle]
+
+    def _access_paths(self, index: StoreIndex):
+        """Yield (description, size, newest-first candidate iterator factory)."""
+        q = self.query
+
+        def by_ids(ids):
+            return lambda: (index.by_id[i] for i in reversed(ids))
+
+        groups = [(f"project index ({','.join(alternatives)})",
+                   union(index.by_project.get(value, []) for value in alternatives))
+                  for alternatives in q.projects]
+        groups += [(f"tag index ({','.join(alternatives)})",
+                    union(index.by_tag.get(value, []) for value in alternatives))
+                   for alternatives in q.tags]
+        for description, ids in groups:
+            yield description, len(ids), by_ids(ids)
+        if len(groups) > 1:
+            # Entries must pass every filter: intersect all the postings
+            ids = intersect(ids for _, ids in groups)
+            yield " & ".join(d for d, _ in groups), len(ids), by_ids(ids)
+        if q.since or q.until:
+            span = index.time_range(q.since, q.until)
+            if span is not None:
+                start, stop = span
+                yield ("time range", stop - start,
+                       lambda: (index.entries[i] for i in range(stop - 1, start - 1, -1)))
+
+    def run(self, index: StoreIndex, limit: Optional[int] = None) -> List[ErrorEntry]:
+        """Execute against the in-memory index; results are newest first."""
+        best = None
+        for path in self._access_paths(index):
+            if best is None or path[1] < best[1]:
+                best = path
+
+        if best is None:
+            self.strategy, self.candidates = "full scan", len(index.entries)
+            candidates: Iterable[ErrorEntry] = reversed(index.entries)
+        else:
+            self.strategy, self.candidates = best[0], best[1]
+            candidates = best[2]()
+        return self._collect(candidates, limit)
+
+    def run_stream(self, entries: Iterable[ErrorEntry], limit: Optional[int] = None,
+                   strategy: str = "stream", candidates: Optional[int] = None) -> List[ErrorEntry]:
+        """
+        Execute over entries streamed newest first (the unindexed JSON path,
+        or the entries an on-disk index picked out, named by `strategy`).
+
+        Every entry is checked: the store is not necessarily in time order,
+        so an entry before `since` doesn't mean the older ones are too.
+        """
+        self.strategy, self.candidates = strategy, candidates
+        return self._collect(entries, limit)
+
+    def _collect(self, candidates: Iterable[ErrorEntry], limit: Optional[int]) -> List[ErrorEntry]:
+        result = []
+        for entry in candidates:
+            if self.matches(entry):
+                result.append(entry)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def describe(self) -> str:
+        """Human-readable summary of the chosen access path and filters."""
+        q = self.query
+        filters = []
+        filters += [f"project:{','.join(p)}" for p in q.projects]
+        filters += [f"tag:{','.join(t)}" for t in q.tags]
+        filters += [f"exit:{','.join(str(c) for c in e)}" for e in q.exit_codes]
+        filters += [f"cmd:{c}" for c in q.commands]
+        filters += [f"group:{','.join(g)}" for g in q.groups]
+        if q.since:
+            filters.append(f"since:{q.since}")
+        if q.until:
+            filters.append(f"until:{q.until}")
+        filters += [f'"{t}"' for t in q.terms]
+        access = self.strategy
+        if self.candidates is not None:
+            access += f", {self.candidates} candidate(s)"
+        return f"{access}; filters: {' '.join(filters) or '(none)'}"
+
+
+def compile_query(text: str) -> QueryPlan:
+    """Parse `text` and return its execution plan."""
+    return QueryPlan(parse_query(text))
@@ -0,0 +1,392 @@
+"""
+Record-oriented layout for errors.json and a memory-mapped reader for it.
+
+The data file stays valid JSON, but every entry is written on its own line
+after a one-line header:
+
+    {"schema": 3, "next_id": 3, "entries": [
+    {"id": 1, "timestamp": "...", ..., "_crc": "5e1b0d3a"},
+    {"id": 2, "timestamp": "...", ..., "_crc": "0c4f9e21"}
+    ]}
+
+JSON escapes newlines inside strings, so each line holds exactly one record.
+Read-only commands can then map the file and decode only the lines they need
+instead of loading the whole store.
+
+The last key of each record is a CRC-32 of the record without it, so a
+damaged line can be recognized on its own (see `recovery`). Readers strip it:
+records and raw lines handed out by `RecordReader` never include it.
+
+`schema` is the version of the record format (see `migrations`); headers
+without it were written before versioning and are version 1.
+"""
+import json
+import mmap
+import os
+import re
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+# Version of the store format written by this release
+SCHEMA_VERSION = 3
+
+CRC_KEY = "_crc"
+_CRC_PREFIX = b', "_crc": "'
+# The checksum suffix: prefix, 8 hex digits and '"}'
+_CRC_TAIL = len(_CRC_PREFIX) + 10
+
+HEADER_RE = re.compile(rb'\{(?:"schema": (\d+), )?"next_id": (\d+), "entries": \[\r?\n')
+TIMESTAMP_RE = re.compile(rb'"timestamp": "([^"]*)"')
+ID_RE = re.compile(rb'\{"id": (\d+),')
+# The tags array: strings (with escapes) separated by ", "
+TAGS_RE = re.compile(rb'"tags": (\[(?:"(?:[^"\\]|\\.)*"(?:, )?)*\])')
+DIRECTORY_RE = re.compile(rb'"directory": ("(?:[^"\\]|\\.)*")')
+
+
+def record_timestamp(line: bytes) -> Optional[str]:
+    """Read the timestamp from a raw record line without decoding the record."""
+    match = TIMESTAMP_RE.search(line, 0, 200)
+    return match.group(1).decode("ascii", "replace") if match else None
+
+
+def record_tags(line: bytes) -> Optional[List[str]]:
+    """Read the tags from a raw record line without decoding the rest of it."""
+    match = TAGS_RE.search(line)
+    if match is None:
+        return None
+    raw = match.group(1)
+    return [] if raw == b"[]" else json.loads(raw)
+
+
+def record_directory(line: bytes) -> Optional[str]:
+    """Read the working directory from a raw record line without decoding the rest of it."""
+    match = DIRECTORY_RE.search(line)
+    return json.loads(match.group(1)) if match else None
+
+
+def encode_record(record: Dict[str, Any]) -> str:
+    """Serialize one entry on a single line, with its ID first and its checksum last."""
+    fields = {"id": record["id"], **record}
+    fields.pop(CRC_KEY, None)
+    body = json.dumps(fields, ensure_ascii=False)
+    return '%s, "_crc": "%08x"}' % (body[:-1], zlib.crc32(body.encode("utf-8")))
+
+
+def strip_checksum(line: bytes) -> bytes:
+    """The stored record line without its checksum."""
+    if line[-_CRC_TAIL:-10] == _CRC_PREFIX:
+        return line[:-_CRC_TAIL] + b"}"
+    return line
+
+
+def has_checksum(line: bytes) -> bool:
+    """Whether a stored record line ends with a checksum."""
+    return line[-_CRC_TAIL:-10] == _CRC_PREFIX and line.endswith(b'"}')
+
+
+def record_intact(line: bytes) -> bool:
+    """
+    Check a stored record line (without the separating comma).
+
+    Lines with a checksum must match it; lines from older versions, which
+    have none, must at least decode.
+    """
+    if has_checksum(line):
+        try:
+            return zlib.crc32(line[:-_CRC_TAIL] + b"}") == int(line[-10:-2], 16)
+        except ValueError:
+            return False
+    return decode_line(line) is not None
+
+
+def records_intact(raw: bytes) -> bool:
+    """
+    Whether every checksummed record line in a whole data file still matches
+    its checksum. Lines without one (older versions) are left to the JSON decoder.
+    """
+    crc32 = zlib.crc32
+    try:
+        for line in raw.split(b"\n"):
+            line = line.rstrip(b"\r")
+            if line.endswith(b","):
+                line = line[:-1]
+            # As `record_intact`, without decoding the lines that have no checksum
+            if (line[-_CRC_TAIL:-10] == _CRC_PREFIX and line.endswith(b'"}')
+                    and crc32(line[:-_CRC_TAIL] + b"}") != int(line[-10:-2], 16)):
+                return False
+    except ValueError:
+        return False
+    return True
+
+
+def decode_line(line: bytes) -> Optional[Dict[str, Any]]:
+    """Decode a record line, or return None if it is damaged."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    record.pop(CRC_KEY, None)
+    return record
+
+
+def file_signature(path) -> Optional[Tuple[int, int, int]]:
+    """(mtime, size, inode) of a file, which changes whenever it is replaced; None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def header_line(next_id: int) -> str:
+    """The first line of a store written by this release."""
+    return f'{{"schema": {SCHEMA_VERSION}, "next_id": {int(next_id)}, "entries": [\n'
+
+
+@contextmanager
+def atomic_write(path: Path) -> Iterator[TextIO]:
+    """
+    Replace `path` with the text written to the yielded file, atomically.
+
+    The text goes to a temporary file beside `path`, is flushed to disk and
+    renamed over it when the block ends, so readers (and a crash at any
+    point) see either the old file or the new one, never a mix. If the block
+    raises, `path` is untouched.
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(20):
+            try:
+                os.replace(tmp, path)
+                break
+            except PermissionError:
+                # Windows refuses while another process has the file open
+                if os.name != "nt" or attempt == 19:
+                    raise
+                time.sleep(0.05)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def dump_store(data: Dict[str, Any], f) -> None:
+    """Write `data` to the text file `f` in the record layout."""
+    f.write(header_line(data["next_id"]))
+    entries = data["entries"]
+    last = len(entries) - 1
+    for i, record in enumerate(entries):
+        f.write(encode_record(record))
+        f.write(",\n" if i < last else "\n")
+    f.write("]}\n")
+
+
+class RecordReader:
+    """
+    Read-only, memory-mapped view of a data file in the record layout.
+
+    Use as a context manager. `is_record_layout` is False for empty files
+    and for files written by older versions (pretty-printed JSON); callers
+    should fall back to a full load in that case.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        st = os.fstat(self._file.fileno())
+        # `file_signature` of the file as opened
+        self.signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        self._mm: Optional[mmap.mmap] = None
+        self.next_id: Optional[int] = None
+        self.schema = 1
+        # Lines skipped by `records` because they could not be decoded
+        self.damaged = 0
+        self._start = self._end = 0
+
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return
+
+        header = HEADER_RE.match(self._mm)
+        footer = self._mm.rfind(b"\n]}")
+        if header is None or footer < header.end() - 1:
+            return
+        self.schema = int(header.group(1) or 1)
+        self.next_id = int(header.group(2))
+        self._start = header.end()
+        self._end = footer + 1
+
+    @property
+    def is_record_layout(self) -> bool:
+        return self.next_id is not None
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self) -> 'RecordReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def _strip(line: bytes, checksum: bool = False) -> bytes:
+        line = line.rstrip(b"\r")
+        if line.endswith(b","):
+            line = line[:-1]
+        return line if checksum else strip_checksum(line)
+
+    def lines(self, reverse: bool = False, checksums: bool = False) -> Iterator[bytes]:
+        """
+        Yield the raw bytes of each record line, oldest first by default.
+
+        With `checksums`, lines keep their checksum, for `record_intact`.
+        """
+        mm, start, end = self._mm, self._start, self._end
+        if not self.is_record_layout or start >= end:
+            return
+        if reverse:
+            stop = end - 1  # position of the newline ending the last record
+            while stop > start:
+                nl = mm.rfind(b"\n", start - 1, stop)
+                yield self._strip(mm[nl + 1:stop], checksums)
+                stop = nl
+        else:
+            pos = start
+            while pos < end:
+                nl = mm.find(b"\n", pos, end)
+                if nl < 0:
+                    nl = end
+                yield self._strip(mm[pos:nl], checksums)
+                pos = nl + 1
+
+    def lines_since(self, since: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        """
+        Yield record lines newest first, as `lines(reverse=True)` does, but
+        skip whole chunks in which every record is older than `since`.
+
+        Entries need not be in time order, so this never stops early; lines
+        of the chunks it keeps are all yielded, for the caller to check.
+        """
+        bound = since.encode("utf-8")
+        for chunk in self.chunks(reverse=True, chunk_size=chunk_size):
+            # JSON escapes quotes inside strings, so these only match keys
+            stamps = TIMESTAMP_RE.findall(chunk)
+            if stamps and len(stamps) == chunk.count(b'{"id": ') and max(stamps) < bound:
+                continue
+            for line in reversed(chunk.split(b"\n")):
+                if line:
+                    yield self._strip(line)
+
+    def chunks(self, reverse: bool = False, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """Yield runs of whole record lines of roughly `chunk_size` bytes."""
+        mm, start, end = self._mm, self._start, self._end
+        if not self.is_record_layout or start >= end:
+            return
+        if reverse:
+            stop = end
+            while stop > start:
+                cut = max(start, stop - chunk_size)
+                if cut > start:
+                    cut = mm.rfind(b"\n", start - 1, cut) + 1
+                    if cut <= start:
+                        cut = start
+                yield mm[cut:stop]
+                stop = cut
+        else:
+            pos = start
+            while pos < end:
+                cut = min(end, pos + chunk_size)
+                if cut < end:
+                    nl = mm.find(b"\n", cut - 1, end)
+                    cut = end if nl < 0 else nl + 1
+                yield mm[pos:cut]
+                pos = cut
+
+    def records(self, reverse: bool = False, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+        """
+        Yield each record decoded, oldest first by default.
+
+        Records are decoded a chunk at a time (one `json.loads` per chunk),
+        so memory stays bounded by `chunk_size` rather than the file size.
+        Lines that cannot be decoded, or no longer match their checksum, are
+        skipped and counted in `damaged`.
+        """
+        for chunk in self.chunks(reverse=reverse, chunk_size=chunk_size):
+            body = chunk.rstrip(b",\r\n")
+            if not body:
+                continue
+            try:
+                if not records_intact(body):
+                    raise ValueError("record checksum mismatch")
+                batch = json.loads(b"[" + body + b"]")
+            except ValueError:
+                # A damaged line: decode this chunk line by line instead
+                batch = []
+                for line in body.split(b"\n"):
+                    if not line.strip():
+                        continue
+                    line = self._strip(line, checksum=True)
+                    record = decode_line(line) if record_intact(line) else None
+                    if record is None:
+                        self.damaged += 1
+                    else:
+                        batch.append(record)
+            else:
+                for record in batch:
+                    record.pop(CRC_KEY, None)
+            yield from (reversed(batch) if reverse else batch)
+
+    def _bisect(self, entry_id: int) -> int:
+        """
+        Binary search for the line of `entry_id`, relying on IDs ascending
+        through the file as they do when entries are only ever appended.
+        Returns the line's offset, or -1 if the search found nothing.
+        """
+        mm, lo, hi = self._mm, self._start, self._end
+        while lo < hi:
+            line = mm.rfind(b"\n", lo, (lo + hi) // 2) + 1 or lo
+            match = ID_RE.match(mm, line)
+            if match is None:
+                return -1
+            found = int(match.group(1))
+            if found == entry_id:
+                return line
+            if found > entry_id:
+                hi = line
+            else:
+                nl = mm.find(b"\n", line, hi)
+                if nl < 0:
+                    break
+                lo = nl + 1
+        return -1
+
+    def find(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Locate and decode a single record by ID without decoding the others."""
+        if not self.is_record_layout:
+            return None
+        pos = self._bisect(entry_id)
+        if pos < 0:
+            # IDs out of order (renumbered or edited by hand): scan for it
+            needle = b'\n{"id": %d,' % entry_id
+            pos = self._mm.find(needle, self._start - 1, self._end)
+            if pos < 0:
+                return None
+            pos += 1
+        nl = self._mm.find(b"\n", pos, self._end)
+        return decode_line(self._strip(self._mm[pos:nl if nl >= 0 else self._end]))
@@ -0,0 +1,160 @@
+"""
+Salvaging a damaged errors.json.
+
+Stores are replaced atomically, so a crash while saving leaves the previous
+file intact. A file can still be damaged by a crash in an older version
+(which rewrote it in place), a full disk, or an edit by hand. Every record
+line carries a CRC-32 (see `recordfile`), so intact lines are recognized on
+their own and copied into the rebuilt store byte for byte, without being
+decoded. Damaged lines are appended to `errors.json.damaged` beside the
+store rather than dropped.
+"""
+import mmap
+import shutil
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from .migrations import MigrationError, StoreScan, upgrade_records
+from .recordfile import (HEADER_RE, ID_RE, SCHEMA_VERSION, atomic_write, dump_store,
+                         has_checksum, record_intact)
+
+
+@dataclass
+class Recovery:
+    """What `recover_store` kept and where the rest went."""
+    kept: int
+    damaged: int
+    quarantine: Optional[Path]
+
+
+def _quarantine_path(path: Path) -> Path:
+    return path.with_name(path.name + ".damaged")
+
+
+def _quarantine(path: Path, lines: List[bytes]) -> Optional[Path]:
+    """Append damaged lines to the quarantine file, under a dated comment."""
+    if not lines:
+        return None
+    target = _quarantine_path(path)
+    with open(target, "ab") as f:
+        f.write(f"# {datetime.now().isoformat()} damaged lines from {path.name}\n".encode("utf-8"))
+        for line in lines:
+            f.write(line + b"\n")
+    return target
+
+
+@dataclass
+class _Salvage:
+    """Runs of consecutive intact record lines in a record-layout file, by byte range."""
+    schema: int
+    next_id: int
+    count: int
+    starts: array
+    ends: array
+    damaged: List[bytes]
+
+
+def _scan_lines(mm) -> Optional[_Salvage]:
+    header = HEADER_RE.match(mm)
+    start = header.end() if header else mm.find(b'\n{"id": ') + 1
+    if start <= 0:
+        return None
+
+    starts, ends = array("q"), array("q")
+    damaged: List[bytes] = []
+    count = max_id = 0
+    checksummed = extend = False
+    pos, end = start, len(mm)
+    while pos < end:
+        nl = mm.find(b"\n", pos)
+        if nl < 0:
+            nl = end
+        line = mm[pos:nl].rstrip(b"\r")
+        if line.endswith(b","):
+            line = line[:-1]
+        line_start, pos = pos, nl + 1
+        match = ID_RE.match(line)
+        if match is None or not record_intact(line):
+            if line and line != b"]}":
+                damaged.append(line)
+            extend = False
+            continue
+        # Lines between two intact ones are copied with them in one piece
+        if extend:
+            ends[-1] = line_start + len(line)
+        else:
+            starts.append(line_start)
+            ends.append(line_start + len(line))
+        extend = True
+        count += 1
+        max_id = max(max_id, int(match.group(1)))
+        checksummed = checksummed or has_checksum(line)
+
+    if header:
+        return _Salvage(int(header.group(1) or 1), max(int(header.group(2)), max_id + 1),
+                        count, starts, ends, damaged)
+    # Without the header, checksums tell this release's records from older ones
+    return _Salvage(SCHEMA_VERSION if checksummed else 1, max_id + 1, count, starts, ends, damaged)
+
+
+def recover_store(path: Path) -> Recovery:
+    """
+    Rebuild the store at `path` from its intact records.
+
+    Args:
+        path: Data file that failed to load
+
+    Returns:
+        Counts of kept and damaged records, and the quarantine file if any
+    """
+    if path.stat().st_size == 0:
+        with atomic_write(path) as out:
+            dump_store({"entries": [], "next_id": 1}, out)
+        return Recovery(0, 0, None)
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        salvage = _scan_lines(mm)
+    if salvage is None:
+        return _recover_document(path)
+
+    quarantine = _quarantine(path, salvage.damaged)
+    # Intact lines are copied as they are, without decoding them; the map is
+    # closed before the rebuilt file replaces it
+    starts, ends = salvage.starts, salvage.ends
+    with atomic_write(path) as out:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            out.write(f'{{"schema": {salvage.schema}, "next_id": {salvage.next_id}, "entries": [\n')
+            for i in range(len(starts)):
+                if i:
+                    out.write(",\n")
+                out.write(mm[starts[i]:ends[i]].decode("utf-8"))
+            out.write("\n]}\n" if starts else "]}\n")
+    return Recovery(salvage.count, len(salvage.damaged), quarantine)
+
+
+def _recover_document(path: Path) -> Recovery:
+    """
+    Salvage a store that is not in the record layout (pretty-printed by an
+    older version): keep the entries before the damage. The damaged file is
+    kept whole as the quarantine file.
+    """
+    records, schema, next_id = [], 1, None
+    try:
+        with StoreScan(path) as scan:
+            schema, next_id = scan.schema, scan.next_id
+            for record in scan.records():
+                records.append(record)
+    except MigrationError:
+        pass  # Keep what was read before the damage
+    records = list(upgrade_records(
+        (r for r in records if isinstance(r, dict) and isinstance(r.get("id"), int)), schema))
+
+    quarantine = _quarantine_path(path)
+    shutil.copyfile(path, quarantine)
+    max_id = max((record["id"] for record in records), default=0)
+    with atomic_write(path) as out:
+        dump_store({"entries": records, "next_id": max(next_id or 1, max_id + 1)}, out)
+    return Recovery(len(records), 1, quarantine)
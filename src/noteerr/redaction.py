@@ -0,0 +1,274 @@
+"""
+Masking secrets in captured commands and error output before they are stored.
+
+Failed commands and their stderr routinely carry credentials: tokens in
+`Authorization` headers, passwords in database and git URLs, cloud access
+keys. Everything noteerr saves is redacted first, so none of it reaches
+errors.json, `show`, `copy` or the outcome log.
+
+A rule is a name, a regular expression and the keywords its matches start
+with. When the expression has a group named `secret`, only that part of a
+match is replaced (the `password=` before it is kept); otherwise all of it.
+
+The keywords of every rule, lowercased, are compiled into one alternation of
+literal strings and run over the lowercased text (so they are found in any
+case). `re` turns that into a scan that skips, in C, every character no
+keyword starts with, so the text is read once whatever the number of rules.
+Only where a keyword is found are the rules owning it tried, anchored there,
+most specific first. Rule expressions never scan on their own, which keeps
+redaction in the tens of milliseconds per megabyte (see
+`benchmarks/bench_redaction.py`) where running each rule over the whole text
+costs that much per rule.
+
+Rules beyond the built-ins live in `redact-rules.tsv` next to the data file,
+one `name<TAB>pattern[<TAB>keyword,keyword...]` per line. Keywords default to
+the literal text the pattern starts with; a pattern of `-` turns off the rule
+of that name.
+"""
+import os
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DISABLED = "-"
+
+_META = set(".^$*+?{}[]\\|()")
+_QUANTIFIERS = set("*?{")
+_FLAGS_RE = re.compile(r"^\(\?([aiLmsux]+)\)")
+# What secrets are replaced with; text already redacted is left alone
+MASK_PREFIX = "[REDACTED:"
+_MASK_RE = re.compile(r"\[REDACTED:[^\]\s]*\]")
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A kind of secret."""
+    name: str
+    pattern: str
+    # Literal text every match starts with, in any case (the scan looks for these)
+    keywords: Tuple[str, ...]
+
+
+# Most specific first: where several rules match at one place, the first wins
+BUILTIN_RULES: List[Rule] = [
+    Rule("private-key", r"-----BEGIN [A-Z ]*PRIVATE KEY-----[\s\S]*?-----END [A-Z ]*PRIVATE KEY-----",
+         ("-----BEGIN ",)),
+    Rule("aws-access-key", r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b", ("AKIA", "ASIA")),
+    Rule("aws-secret-key", r"(?i:aws_?secret_?access_?key)[\"']?\s*[=:]\s*[\"']?"
+                           r"(?P<secret>[A-Za-z0-9/+=]{40})", ("aws",)),
+    Rule("github-token", r"\bgh[pousr]_[A-Za-z0-9]{36,}|\bgithub_pat_[A-Za-z0-9_]{40,}", ("gh",)),
+    Rule("slack-token", r"\bxox[abposr]-[A-Za-z0-9-]{10,}", ("xox",)),
+    Rule("jwt", r"\beyJ[A-Za-z0-9_-]{8,}\.eyJ[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]{8,}", ("eyJ",)),
+    Rule("url-password", r"://[^/\s:@]+:(?P<secret>[^/\s@]+)@", ("://",)),
+    Rule("bearer", r"(?i:bearer|token|basic)\s+(?P<secret>[A-Za-z0-9._~+/-]{16,}=*)",
+         ("bearer", "token", "basic")),
+    Rule("assignment", r"(?<!/)(?i:password|passwd|secret|token|api_?key|access_?key)"
+                       r"[\w.-]*[\"']?\s*[=:]\s*[\"']?(?P<secret>[^\s\"'&;,]{4,})",
+         ("pass", "secret", "token", "api", "access")),
+]
+
+
+class RedactionError(Exception):
+    """A redaction rule is invalid."""
+
+
+def literal_prefix(pattern: str) -> Tuple[str, ...]:
+    """
+    Keywords for a pattern: the literal text it starts with, or none if it
+    doesn't start with any or has top-level alternatives.
+    """
+    flags = _FLAGS_RE.match(pattern)
+    body = pattern[flags.end():] if flags else pattern
+    if body.startswith(r"\b"):
+        body = body[2:]
+    if "|" in body:
+        return ()
+    prefix = []
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == "\\" and i + 1 < len(body) and not body[i + 1].isalnum():
+            char, step = body[i + 1], 2
+        elif char in _META:
+            break
+        else:
+            step = 1
+        if i + step < len(body) and body[i + step] in _QUANTIFIERS:
+            break  # Optional or repeated: not certain to be there
+        prefix.append(char)
+        i += step
+    text = "".join(prefix)
+    return (text,) if text else ()
+
+
+def make_rule(name: str, pattern: str, keywords: Tuple[str, ...] = ()) -> Rule:
+    """A custom rule, checked; raises RedactionError if it can't be used."""
+    if not re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9._-]*", name):
+        raise RedactionError(f"Invalid rule name '{name}': use letters, digits, '.', '_' and '-'")
+    if any(c in pattern for c in "\t\n") or any(c in k for k in keywords for c in "\t\n,"):
+        raise RedactionError("Patterns and keywords can't contain tabs, newlines or commas")
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise RedactionError(f"Invalid pattern: {e}") from None
+    if compiled.match(""):
+        raise RedactionError("Pattern matches the empty string")
+    if set(compiled.groupindex) - {"secret"}:
+        raise RedactionError("The only named group allowed is 'secret'")
+    keywords = tuple(k for k in keywords if k) or literal_prefix(pattern)
+    if not keywords:
+        raise RedactionError("Pattern doesn't start with literal text; give the keywords "
+                             "its matches start with")
+    return Rule(name, pattern, keywords)
+
+
+class Redactor:
+    """The enabled rules, with their keywords compiled into one scan."""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = [rule for rule in rules if rule.pattern != DISABLED]
+        self._compiled = [re.compile(rule.pattern) for rule in self.rules]
+        # keyword (lowercase) -> indexes of the rules starting with it, in rule order
+        owners: Dict[str, List[int]] = {}
+        for i, rule in enumerate(self.rules):
+            for keyword in dict.fromkeys(k.lower() for k in rule.keywords):
+                owners.setdefault(keyword, []).append(i)
+        # Rules to try where a character starts some keyword
+        self._by_first: Dict[str, List[Tuple[str, List[int]]]] = {}
+        for keyword, indexes in owners.items():
+            self._by_first.setdefault(keyword[0], []).append((keyword, indexes))
+        keywords = sorted(owners, key=len, reverse=True)
+        # Keywords are found in any case; the rules themselves decide what case they need.
+        # The scan runs over the lowercased text: an IGNORECASE alternation can't
+        # skip ahead in C and is several times slower.
+        alternation = "|".join(map(re.escape, keywords))
+        self._scan = re.compile(alternation) if keywords else None
+        # For the rare text whose lowercase form has a different length
+        self._scan_any_case = re.compile(alternation, re.IGNORECASE) if keywords else None
+
+    @classmethod
+    def from_file(cls, path: Path) -> 'Redactor':
+        """The built-in rules, changed and extended by the rules file at `path`."""
+        return cls(merge_rules(read_rules(path)))
+
+    def _match_at(self, text: str, lowered: str, pos: int,
+                  masks: List[Tuple[int, int]]) -> Optional[Tuple[int, Tuple[int, int], re.Match]]:
+        """
+        The first rule matching at `pos`, among those owning a keyword found
+        there, whose secret doesn't overlap one of the `masks` already in the text.
+        `lowered` is `text` lowercased, with the same length.
+        """
+        candidates = set()
+        for keyword, indexes in self._by_first.get(lowered[pos], ()):
+            if lowered.startswith(keyword, pos):
+                candidates.update(indexes)
+        for i in sorted(candidates):
+            match = self._compiled[i].match(text, pos)
+            if match:
+                span = self._span(match)
+                if not _overlaps(span, masks):
+                    return i, span, match
+        return None
+
+    @staticmethod
+    def _span(match: re.Match) -> Tuple[int, int]:
+        """The part of `match` to hide: its `secret` group if it has one, else all of it."""
+        if "secret" in match.re.groupindex and match.start("secret") >= 0:
+            return match.span("secret")
+        return match.span()
+
+    def findall(self, text: str) -> List[Tuple[str, int, int]]:
+        """(rule name, start, end) of every secret in `text`, in order."""
+        found = []
+        if not text or self._scan is None:
+            return found
+        # Redacting twice changes nothing: earlier masks are never matched into
+        masks = [m.span() for m in _MASK_RE.finditer(text)] if MASK_PREFIX in text else []
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            scan, scanned = self._scan, lowered
+        else:
+            # A few characters (like 'İ') change length when lowercased; positions in
+            # `lowered` would no longer be positions in `text`
+            scan, scanned = self._scan_any_case, text
+            lowered = "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+        pos = 0
+        while True:
+            hit = scan.search(scanned, pos)
+            if hit is None:
+                return found
+            matched = self._match_at(text, lowered, hit.start(), masks)
+            if matched is None:
+                pos = hit.start() + 1
+                continue
+            i, span, match = matched
+            found.append((self.rules[i].name, *span))
+            pos = max(match.end(), hit.start() + 1)
+
+    def redact(self, text: str) -> str:
+        """`text` with every secret the rules find replaced by `[REDACTED:<rule>]`."""
+        found = self.findall(text)
+        if not found:
+            return text
+        parts = []
+        last = 0
+        for name, start, end in found:
+            parts.append(text[last:start])
+            parts.append(f"{MASK_PREFIX}{name}]")
+            last = end
+        parts.append(text[last:])
+        return "".join(parts)
+
+
+def _overlaps(span: Tuple[int, int], masks: List[Tuple[int, int]]) -> bool:
+    """Whether `span` shares any character with one of the (sorted) `masks`."""
+    i = bisect_right(masks, (span[0],))
+    return any(start < span[1] and span[0] < end for start, end in masks[max(i - 1, 0):i + 1])
+
+
+def read_rules(path: Path) -> List[Rule]:
+    """Rules in a rules file, in order; a missing file has none."""
+    rules = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#") or "\t" not in line:
+                    continue
+                name, pattern, *rest = line.rstrip("\n").split("\t")
+                keywords = tuple(k for k in rest[0].split(",") if k) if rest else ()
+                if pattern == DISABLED:
+                    rules.append(Rule(name, DISABLED, ()))
+                    continue
+                try:
+                    rules.append(make_rule(name, pattern, keywords))
+                except RedactionError:
+                    continue  # Edited by hand into something unusable
+    except OSError:
+        pass
+    return rules
+
+
+def merge_rules(custom: List[Rule]) -> List[Rule]:
+    """
+    The rules in effect: built-ins first, replaced or turned off by custom
+    rules of the same name, then the other custom rules.
+    """
+    overrides = {rule.name: rule for rule in custom}
+    rules = [overrides.pop(rule.name, rule) for rule in BUILTIN_RULES]
+    return rules + [rule for rule in custom if rule.name in overrides]
+
+
+def write_rules(path: Path, rules: List[Rule]) -> None:
+    """Save custom rules (and turned-off built-ins) to the rules file, atomically."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("# name<TAB>pattern[<TAB>keywords]: secrets to redact; a pattern of - "
+                "turns a rule off\n")
+        for rule in rules:
+            line = f"{rule.name}\t{rule.pattern}"
+            if rule.pattern != DISABLED and rule.keywords != literal_prefix(rule.pattern):
+                line += "\t" + ",".join(rule.keywords)
+            f.write(line + "\n")
+    os.replace(tmp, path)
@@ -0,0 +1,277 @@
+"""Local HTTP/JSON query server for noteerr."""
+import ipaddress
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, urlsplit
+
+from . import __version__
+from .query import QueryError
+from .storage import Storage
+from .textsearch import FuzzyMatcher, RegexMatcher
+from .utils import parse_tags
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8731
+LOOPBACK_NAMES = {"localhost", "localhost."}
+# Entry fields POST /entries accepts as text
+TEXT_FIELDS = ("command", "error", "directory", "notes", "project")
+
+
+def _host_name(value: str) -> Optional[str]:
+    """The host name in a Host header value or an origin, without the port."""
+    try:
+        return urlsplit(value if "//" in value else f"//{value}").hostname
+    except ValueError:
+        return None
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """Request handler for the noteerr JSON API."""
+
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = "HTTP/1.1"
+    server_version = f"noteerr/{__version__}"
+    # Idle keep-alive connections release their worker after this many seconds;
+    # kept short because a waiting connection holds one of a fixed number of workers
+    timeout = 5
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.saturated:
+            # Other clients are waiting for a worker: don't hold this one idle
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def _forbidden_host(self) -> Optional[str]:
+        """
+        Why the request must be refused, if it names a host the server doesn't
+        answer to. A web page whose DNS name is re-pointed at 127.0.0.1 (DNS
+        rebinding) still sends its own name, so only IP addresses, localhost
+        and the address the server is bound to are accepted.
+        """
+        host = _host_name(self.headers.get("Host") or "")
+        if host is None:
+            return "missing or invalid Host header"
+        if host in LOOPBACK_NAMES or host == self.server.server_name.lower():
+            return None
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return f"unknown host '{host}'"
+        return None
+
+    def _forbidden_origin(self) -> Optional[str]:
+        """Why a write must be refused if it comes from a page on another origin."""
+        origin = self.headers.get("Origin")
+        if origin is None:
+            return None  # Not sent by a browser
+        host = self.headers.get("Host") or ""
+        if origin == "null" or urlsplit(origin).netloc.lower() != host.lower():
+            return f"cross-origin request from '{origin}'"
+        return None
+
+    def _read_json_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def do_GET(self):
+        reason = self._forbidden_host()
+        if reason:
+            self._send_error(403, reason)
+            return
+
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        storage = self.server.storage
+
+        try:
+            limit = int(params.get("limit", 10))
+        except ValueError:
+            self._send_error(400, "limit must be an integer")
+            return
+
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok", "version": __version__})
+
+        elif parts == ["entries"]:
+            entries = storage.get_recent_entries(limit=limit if limit > 0 else None,
+                                                 project=params.get("project") or None,
+                                                 tag=params.get("tag") or None)
+            self._send_json(200, {"entries": [e.to_dict() for e in entries]})
+
+        elif len(parts) == 2 and parts[0] == "entries":
+            try:
+                entry = storage.get_entry_by_id(int(parts[1]))
+            except ValueError:
+                self._send_error(400, f"Invalid error ID: '{parts[1]}'")
+                return
+            if entry is None:
+                self._send_error(404, f"Error #{parts[1]} not found")
+                return
+            self._send_json(200, entry.to_dict())
+
+        elif parts == ["search"]:
+            query = params.get("q", "")
+            if not query:
+                self._send_error(400, "missing query parameter 'q'")
+                return
+            mode = params.get("mode", "query")
+            if mode not in ("query", "regex", "fuzzy"):
+                self._send_error(400, f"Unknown search mode '{mode}'")
+                return
+            max_results = limit if limit > 0 else None
+            try:
+                if mode == "regex":
+                    matches = storage.match_entries(RegexMatcher(query), limit=max_results)
+                elif mode == "fuzzy":
+                    matches = storage.match_entries(FuzzyMatcher(query), limit=max_results)
+                else:
+                    matches = storage.query_entries(query, limit=max_results)
+            except QueryError as e:
+                self._send_error(400, str(e))
+                return
+            self._send_json(200, {"query": query, "entries": [e.to_dict() for e in matches]})
+
+        elif parts == ["similar"]:
+            text = params.get("q", "")
+            if not text:
+                self._send_error(400, "missing query parameter 'q'")
+                return
+            matches = storage.similar_entries(text, limit=limit if limit > 0 else 5)
+            self._send_json(200, {"query": text, "entries": [
+                {**entry.to_dict(), "score": round(score, 4)} for entry, score in matches
+            ]})
+
+        elif parts == ["stats"]:
+            stats_data = storage.get_statistics()
+            if stats_data.get("most_recent") is not None:
+                stats_data["most_recent"] = stats_data["most_recent"].to_dict()
+            self._send_json(200, stats_data)
+
+        elif parts == ["projects"]:
+            self._send_json(200, {"projects": storage.get_project_summaries()})
+
+        else:
+            self._send_error(404, f"Unknown endpoint: {url.path}")
+
+    def do_POST(self):
+        reason = self._forbidden_host() or self._forbidden_origin()
+        if reason:
+            self._send_error(403, reason)
+            return
+
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/entries":
+            self._send_error(404, f"Unknown endpoint: {url.path}")
+            return
+
+        # Browsers only send other content types cross-site without asking first
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._send_error(415, "Content-Type must be application/json")
+            return
+
+        try:
+            body = self._read_json_body()
+        except (ValueError, UnicodeDecodeError):
+            self._send_error(400, "request body must be JSON")
+            return
+        if not isinstance(body, dict):
+            self._send_error(400, "request body must be a JSON object")
+            return
+
+        if not body.get("command"):
+            self._send_error(400, "'command' is required")
+            return
+        # Checked before anything is written: a wrong type would be stored for good
+        for name in TEXT_FIELDS:
+            if body.get(name) is not None and not isinstance(body[name], str):
+                self._send_error(400, f"'{name}' must be a string")
+                return
+        exit_code = body.get("exit_code", 1)
+        if isinstance(exit_code, bool) or not isinstance(exit_code, (int, str)):
+            self._send_error(400, "'exit_code' must be an integer")
+            return
+
+        tags = body.get("tags") or []
+        if isinstance(tags, str):
+            tags = parse_tags(tags)
+        elif not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            self._send_error(400, "'tags' must be a string or a list of strings")
+            return
+
+        try:
+            entry = self.server.storage.add_entry(
+                command=body["command"],
+                error=body.get("error") or "Command failed",
+                exit_code=int(exit_code),
+                directory=body.get("directory") or os.getcwd(),
+                notes=body.get("notes") or "",
+                tags=tags,
+                project=body.get("project") or ""
+            )
+        except (TypeError, ValueError) as e:
+            self._send_error(400, str(e))
+            return
+
+        self._send_json(201, entry.to_dict())
+
+
+class QueryServer(HTTPServer):
+    """HTTP server that answers requests on a fixed-size thread pool."""
+
+    def __init__(self, address: Tuple[str, int], storage: Storage,
+                 workers: int = 8, verbose: bool = False):
+        super().__init__(address, QueryRequestHandler)
+        self.storage = storage
+        self.verbose = verbose
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="noteerr-serve")
+        # Connections accepted and not yet closed, including those waiting for a worker
+        self._connections = 0
+        self._connections_lock = threading.Lock()
+
+    @property
+    def saturated(self) -> bool:
+        """Whether connections are queued behind busy workers."""
+        return self._connections > self.workers
+
+    def process_request(self, request, client_address):
+        """Hand each connection to the worker pool instead of a new thread."""
+        with self._connections_lock:
+            self._connections += 1
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._connections_lock:
+                self._connections -= 1
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,299 @@
+"""
+Offline "have I seen this before?" lookup over past error messages.
+
+Error text is embedded with a hashing-trick TF-IDF vectorizer: word unigrams
+and bigrams are hashed into `DIMENSIONS` buckets, so there is no vocabulary
+to train or store and nothing leaves the machine. Vectors stay sparse, one
+row per entry, in flat `array` buffers (CSR layout) that are cached next to
+the data file and only extended with entries added since the last lookup.
+
+Scores are cosine similarities with IDF weights taken from the whole store.
+When NumPy is installed the buffers are copied into NumPy arrays once and a
+batch of queries is scored with a few vectorized passes; otherwise postings
+lists are built in pure Python and give the same scores.
+
+Like the tag index, the cache records the signature of the data file it
+describes; Storage patches it after each of its own writes, and a cache that
+doesn't match the store is rebuilt on next use.
+"""
+import math
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DIMENSIONS = 1 << 18
+FORMAT_VERSION = 2
+# Long logs: embed the head and tail, where the command and the failure usually are
+MAX_TEXT = 8192
+
+_MAGIC = b"NOTEERRV"
+# magic, version, byte order, dimensions, data file mtime, size and inode,
+# next_id, rows, non-zeros
+_HEADER = struct.Struct("<8sHcxIqqqqqq")
+_TOKEN_RE = re.compile(r"[a-z]{2,}")
+
+# NumPy is optional and imported on first use: it would add noticeably to
+# the startup time of every command otherwise
+_numpy = False
+
+
+def _get_numpy():
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase runs of two or more letters; digits, underscores and punctuation split words."""
+    if len(text) > MAX_TEXT:
+        text = text[:MAX_TEXT // 2] + "\n" + text[-MAX_TEXT // 2:]
+    return _TOKEN_RE.findall(text.lower())
+
+
+def embed(text: str) -> Dict[int, float]:
+    """Return the sparse term-frequency vector (1 + log tf) of `text`."""
+    tokens = tokenize(text)
+    counts: Dict[int, int] = {}
+    for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        bucket = zlib.crc32(feature.encode("utf-8")) & (DIMENSIONS - 1)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return {bucket: 1.0 + math.log(count) for bucket, count in counts.items()}
+
+
+class VectorStore:
+    """
+    Sparse error-text vectors for stored entries.
+
+    Row `i` covers entry `ids[i]`, with its buckets and weights in
+    `features[indptr[i]:indptr[i + 1]]` and `weights[...]`. `df` counts the
+    rows each bucket appears in. Entries with IDs below `next_id` have been
+    embedded (or had no words to embed).
+    """
+
+    def __init__(self):
+        self.next_id = 1
+        self.ids = array("i")
+        self.indptr = array("q", [0])
+        self.features = array("I")
+        self.weights = array("f")
+        self.df = array("I", bytes(4 * DIMENSIONS))
+        self.dirty = False
+        # Scoring tables derived from the buffers, rebuilt after any change
+        self._prepared = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: int, text: str) -> None:
+        """Embed and append one entry."""
+        self.next_id = max(self.next_id, entry_id + 1)
+        self.dirty = True
+        self._prepared = None
+        vector = embed(text)
+        if not vector:
+            return
+        self.ids.append(entry_id)
+        self.features.extend(vector.keys())
+        self.weights.extend(vector.values())
+        self.indptr.append(len(self.features))
+        df = self.df
+        for bucket in vector:
+            df[bucket] += 1
+
+    def remove(self, entry_ids: Iterable[int]) -> int:
+        """Drop the rows of deleted entries; return how many there were."""
+        doomed = set(entry_ids)
+        rows = [row for row, entry_id in enumerate(self.ids) if entry_id in doomed]
+        if not rows:
+            return 0
+        ids, indptr, features, weights = array("i"), array("q", [0]), array("I"), array("f")
+        df = self.df
+        start = 0
+        for row in rows + [len(self.ids)]:
+            # The rows between two removed ones are copied as a block, shifted down
+            if row > start:
+                lo, hi = self.indptr[start], self.indptr[row]
+                shift = len(features) - lo
+                ids.extend(self.ids[start:row])
+                features.extend(self.features[lo:hi])
+                weights.extend(self.weights[lo:hi])
+                indptr.extend(end + shift for end in self.indptr[start + 1:row + 1])
+            if row < len(self.ids):
+                for bucket in self.features[self.indptr[row]:self.indptr[row + 1]]:
+                    df[bucket] -= 1
+            start = row + 1
+        self.ids, self.indptr, self.features, self.weights = ids, indptr, features, weights
+        self.dirty = True
+        self._prepared = None
+        return len(rows)
+
+    def _idf(self, df: int) -> float:
+        return math.log((1 + len(self.ids)) / (1 + df)) + 1.0
+
+    def _query_vector(self, text: str) -> Tuple[Dict[int, float], float]:
+        vector = {bucket: tf * self._idf(self.df[bucket]) for bucket, tf in embed(text).items()}
+        return vector, math.sqrt(sum(w * w for w in vector.values()))
+
+    def _prepare(self):
+        """Build IDF-weighted rows, their norms and the lookup structure once per change."""
+        if self._prepared is not None:
+            return self._prepared
+        rows = len(self.ids)
+        np = _get_numpy()
+        if np is not None:
+            features = np.frombuffer(self.features, dtype=np.uint32).copy()
+            indptr = np.frombuffer(self.indptr, dtype=np.int64).copy()
+            df = np.frombuffer(self.df, dtype=np.uint32).astype(np.float64)
+            idf = (np.log((1 + rows) / (1 + df)) + 1.0).astype(np.float32)
+            weights = np.frombuffer(self.weights, dtype=np.float32) * idf[features]
+            row_of = np.repeat(np.arange(rows), np.diff(indptr))
+            norms = np.sqrt(np.bincount(row_of, weights=weights * weights, minlength=rows))
+            self._prepared = (features, weights, row_of, norms)
+        else:
+            idf_cache: Dict[int, float] = {}
+            postings: Dict[int, Tuple[List[int], List[float]]] = {}
+            norms = [0.0] * rows
+            features, weights, indptr, df = self.features, self.weights, self.indptr, self.df
+            for row in range(rows):
+                total = 0.0
+                for k in range(indptr[row], indptr[row + 1]):
+                    bucket = features[k]
+                    idf = idf_cache.get(bucket)
+                    if idf is None:
+                        idf = idf_cache[bucket] = self._idf(df[bucket])
+                    w = weights[k] * idf
+                    total += w * w
+                    posting = postings.get(bucket)
+                    if posting is None:
+                        posting = postings[bucket] = ([], [])
+                    posting[0].append(row)
+                    posting[1].append(w)
+                norms[row] = math.sqrt(total)
+            self._prepared = (postings, norms)
+        return self._prepared
+
+    def _score_batch(self, queries: List[Tuple[Dict[int, float], float]]):
+        """Yield (entry IDs, cosine similarities) of the rows each query touches."""
+        prepared = self._prepare()
+        np = _get_numpy()
+        if np is not None:
+            features, weights, row_of, norms = prepared
+            ids = np.frombuffer(self.ids, dtype=np.int32)
+            # One pass over all non-zeros picks the ones any query can touch
+            touched = np.zeros(DIMENSIONS, dtype=bool)
+            for query, _ in queries:
+                touched[list(query)] = True
+            hits = np.flatnonzero(touched[features])
+            hit_features, hit_weights, hit_rows = features[hits], weights[hits], row_of[hits]
+            for query, query_norm in queries:
+                dense = np.zeros(DIMENSIONS, dtype=np.float32)
+                dense[list(query)] = list(query.values())
+                dots = np.bincount(hit_rows, weights=hit_weights * dense[hit_features],
+                                   minlength=len(self.ids))
+                rows = np.flatnonzero(dots)
+                yield ids[rows], dots[rows] / (norms[rows] * query_norm)
+            return
+
+        postings, norms = prepared
+        for query, query_norm in queries:
+            dots: Dict[int, float] = {}
+            for bucket, q in query.items():
+                posting = postings.get(bucket)
+                if posting is None:
+                    continue
+                for row, w in zip(*posting):
+                    dots[row] = dots.get(row, 0.0) + q * w
+            yield ([self.ids[row] for row in dots],
+                   [dot / (norms[row] * query_norm) for row, dot in dots.items()])
+
+    def nearest_batch(self, texts: Sequence[str], limit: int = 5, min_score: float = 0.0,
+                      exclude: Iterable[int] = ()) -> List[List[Tuple[int, float]]]:
+        """
+        Find the most similar stored entries for each text.
+
+        Returns, per text, up to `limit` (entry ID, cosine similarity) pairs
+        scoring at least `min_score`, best first; ties go to the newer entry.
+        """
+        queries = [self._query_vector(text) for text in texts]
+        results: List[List[Tuple[int, float]]] = [[] for _ in texts]
+        live = [i for i, (_, norm) in enumerate(queries) if norm]
+        if not self.ids or not live:
+            return results
+
+        exclude = set(exclude)
+        np = _get_numpy()
+        scored = self._score_batch([queries[i] for i in live])
+        for i, (ids, scores) in zip(live, scored):
+            if np is not None:
+                keep = scores >= min_score
+                if exclude:
+                    keep &= ~np.isin(ids, list(exclude))
+                ids, scores = ids[keep], scores[keep]
+                if len(scores) > limit:
+                    # Everything tied with the limit-th best score, then an exact sort
+                    kth = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+                    top = scores >= kth
+                    ids, scores = ids[top], scores[top]
+                order = np.lexsort((-ids.astype(np.int64), -scores))[:limit]
+                hits = zip(ids[order].tolist(), scores[order].tolist())
+            else:
+                hits = sorted(((entry_id, score) for entry_id, score in zip(ids, scores)
+                               if score >= min_score and entry_id not in exclude),
+                              key=lambda hit: (-hit[1], -hit[0]))[:limit]
+            results[i] = [(entry_id, min(score, 1.0)) for entry_id, score in hits]
+        return results
+
+    def nearest(self, text: str, limit: int = 5, min_score: float = 0.0,
+                exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Find the most similar stored entries for a single text."""
+        return self.nearest_batch([text], limit, min_score, exclude)[0]
+
+    def save(self, path: Path, signature: Tuple[int, int, int]) -> None:
+        """Write the vectors for the data file with `signature` to `path`, atomically."""
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, sys.byteorder[0].encode("ascii"),
+                                 DIMENSIONS, *signature, self.next_id, len(self.ids),
+                                 len(self.features)))
+            for buffer in (self.ids, self.indptr, self.features, self.weights, self.df):
+                buffer.tofile(f)
+        os.replace(tmp, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path, signature: Optional[Tuple[int, int, int]]) -> Optional['VectorStore']:
+        """Read vectors saved by `save`, or None if missing, incompatible or not for `signature`."""
+        if signature is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return None
+                (magic, version, byteorder, dimensions, *saved,
+                 next_id, rows, nnz) = _HEADER.unpack(header)
+                if (magic != _MAGIC or version != FORMAT_VERSION or dimensions != DIMENSIONS
+                        or tuple(saved) != tuple(signature)
+                        or byteorder != sys.byteorder[0].encode("ascii")):
+                    return None
+                store = cls()
+                store.next_id = next_id
+                store.indptr = array("q")
+                store.df = array("I")
+                for buffer, count in ((store.ids, rows), (store.indptr, rows + 1),
+                                      (store.features, nnz), (store.weights, nnz),
+                                      (store.df, DIMENSIONS)):
+                    buffer.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return None
+        return store
@@ -0,0 +1,341 @@
+"""
+Point-in-time snapshots and incremental backups of errors.json.
+
+Every write replaces the data file with a new one (see `atomic_write`); the
+file a name pointed to before is never modified again. A snapshot is
+therefore just a hard link to the current file plus a small manifest, made
+in constant time and costing no space until the store moves on. Restoring
+links the snapshot's file back in place the same way. Where hard links are
+not available (some network or FAT file systems) the file is copied.
+
+Backups go to another directory, usually another disk. The record lines are
+cut into segments at every `SEGMENT_IDS` IDs and each segment is stored
+under the hash of its bytes:
+
+    DIR/segments/<sha256>.jsonl     record lines, as stored
+    DIR/backups/<name>.json         header fields and the segment hashes
+
+Entries are only ever appended at the end, so between two backups only the
+newest segment and the ones holding edited or deleted entries change; an
+incremental backup copies just those, and every backup in DIR can still be
+restored in full.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .completions import CompletionCache
+from .migrations import migrate_file
+from .recordfile import ID_RE, SCHEMA_VERSION, RecordReader, atomic_write, record_intact
+from .solutions import SolutionIndex
+
+# Entries per backup segment, by ID
+SEGMENT_IDS = 4096
+MANIFEST = "manifest.json"
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+class SnapshotError(Exception):
+    """A snapshot or backup cannot be made or restored."""
+
+
+@dataclass
+class Snapshot:
+    """A snapshot's manifest."""
+    name: str
+    created: str
+    next_id: int
+    size: int
+    path: Path
+
+
+def _default_name(taken: Callable[[str], bool]) -> str:
+    """The current date and time, numbered if that name is `taken` (within the same second)."""
+    base = name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    number = 1
+    while taken(name):
+        number += 1
+        name = f"{base}-{number}"
+    return name
+
+
+def _check_name(name: str) -> str:
+    if not _NAME_RE.match(name):
+        raise SnapshotError(f"Invalid name '{name}': use letters, digits, '.', '_' and '-'")
+    return name
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _current_store(storage) -> RecordReader:
+    """Map the data file, upgrading it to the current layout first if needed."""
+    migrate_file(storage.data_file)
+    reader = RecordReader(storage.data_file)
+    if not reader.is_record_layout:
+        reader.close()
+        raise SnapshotError(f"{storage.data_file} is not a noteerr store")
+    return reader
+
+
+def create_snapshot(storage, name: Optional[str] = None, replace: bool = False) -> Snapshot:
+    """
+    Snapshot the store as it is now.
+
+    Args:
+        storage: Storage to snapshot
+        name: Snapshot name (default: the current date and time)
+        replace: Overwrite an existing snapshot of that name
+
+    Returns:
+        The new snapshot
+    """
+    name = _check_name(name or _default_name(lambda n: (storage.snapshots_dir / n).exists()))
+    target = storage.snapshots_dir / name
+    if target.exists():
+        if not replace:
+            raise SnapshotError(f"Snapshot '{name}' already exists")
+        shutil.rmtree(target)
+
+    with _current_store(storage) as reader:
+        next_id = reader.next_id
+    # Link into a temporary directory and rename it, so a snapshot is complete or absent
+    tmp = storage.snapshots_dir / f".{name}.{os.getpid()}.tmp"
+    tmp.mkdir(parents=True)
+    try:
+        _link_or_copy(storage.data_file, tmp / storage.data_file.name)
+        snapshot = Snapshot(name, datetime.now().isoformat(timespec="seconds"), next_id,
+                            (tmp / storage.data_file.name).stat().st_size, target)
+        with open(tmp / MANIFEST, "w", encoding="utf-8") as f:
+            json.dump({"name": name, "created": snapshot.created, "next_id": next_id,
+                       "size": snapshot.size}, f)
+        os.replace(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return snapshot
+
+
+def list_snapshots(storage) -> List[Snapshot]:
+    """Every snapshot, oldest first."""
+    snapshots = []
+    if not storage.snapshots_dir.is_dir():
+        return snapshots
+    for path in storage.snapshots_dir.iterdir():
+        try:
+            with open(path / MANIFEST, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            snapshots.append(Snapshot(manifest["name"], manifest["created"],
+                                      manifest["next_id"], manifest["size"], path))
+        except (OSError, ValueError, KeyError):
+            continue  # Not a snapshot (or an unfinished one)
+    return sorted(snapshots, key=lambda s: (s.created, s.name))
+
+
+def _snapshot(storage, name: str) -> Snapshot:
+    for snapshot in list_snapshots(storage):
+        if snapshot.name == name:
+            return snapshot
+    raise SnapshotError(f"Snapshot '{name}' not found")
+
+
+def delete_snapshot(storage, name: str) -> None:
+    shutil.rmtree(_snapshot(storage, name).path)
+
+
+def _refresh_derived(storage) -> None:
+    """Bring the indexes beside the data file in line with a restored store."""
+    with RecordReader(storage.data_file) as reader:
+        solutions = SolutionIndex.build(reader.records())
+        completions = CompletionCache.build(reader.records())
+        signature = reader.signature
+    try:
+        solutions.save(storage.solutions_file, signature)
+        completions.save(storage.completions_file, signature)
+    except OSError:
+        pass
+    # The tag and directory indexes, trend columns and vector cache are keyed to the
+    # data file and rebuilt when they don't match
+
+
+def restore_snapshot(storage, name: str) -> Snapshot:
+    """
+    Put a snapshot's store back in place of the current one.
+
+    The current store is snapshotted first as "before-restore".
+
+    Returns:
+        The restored snapshot
+    """
+    snapshot = _snapshot(storage, name)
+    source = snapshot.path / storage.data_file.name
+    if not source.exists():
+        raise SnapshotError(f"Snapshot '{name}' is incomplete")
+    if storage.data_file.exists() and name != "before-restore":
+        create_snapshot(storage, "before-restore", replace=True)
+
+    tmp = storage.data_file.with_name(f"{storage.data_file.name}.{os.getpid()}.tmp")
+    try:
+        _link_or_copy(source, tmp)
+        os.replace(tmp, storage.data_file)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _refresh_derived(storage)
+    return snapshot
+
+
+# Backups ---------------------------------------------------------------------
+
+@dataclass
+class Backup:
+    """Outcome of `backup`: what was written where."""
+    name: str
+    manifest: Path
+    segments: int
+    copied: int
+    copied_bytes: int
+
+
+def _segments(reader: RecordReader) -> Iterator[bytes]:
+    """
+    Cut the record lines (with their checksums) into segments, starting a new
+    one whenever a line's ID falls in a different block of `SEGMENT_IDS`.
+    """
+    lines: List[bytes] = []
+    block = None
+    for line in reader.lines(checksums=True):
+        match = ID_RE.match(line)
+        line_block = int(match.group(1)) // SEGMENT_IDS if match else block
+        if lines and line_block != block:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+        block = line_block
+        lines.append(line)
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def backup(storage, target: Path, incremental: bool = False,
+           name: Optional[str] = None) -> Backup:
+    """
+    Back the store up into `target`.
+
+    Args:
+        storage: Storage to back up
+        target: Backup directory (created if missing)
+        incremental: Skip segments the directory already holds
+        name: Name of the backup (default: the current date and time);
+            must not be taken by another backup in `target`
+
+    Returns:
+        What was written
+    """
+    segments_dir = target / "segments"
+    backups_dir = target / "backups"
+    name = _check_name(name or _default_name(lambda n: (backups_dir / f"{n}.json").exists()))
+    if (backups_dir / f"{name}.json").exists():
+        raise SnapshotError(f"Backup '{name}' already exists in {target}")
+    segments_dir.mkdir(parents=True, exist_ok=True)
+    backups_dir.mkdir(exist_ok=True)
+
+    hashes = []
+    copied = copied_bytes = 0
+    with _current_store(storage) as reader:
+        schema, next_id = reader.schema, reader.next_id
+        for segment in _segments(reader):
+            digest = hashlib.sha256(segment).hexdigest()
+            hashes.append(digest)
+            path = segments_dir / f"{digest}.jsonl"
+            if incremental and path.exists():
+                continue
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_bytes(segment)
+            os.replace(tmp, path)
+            copied += 1
+            copied_bytes += len(segment)
+
+    # The manifest goes last: a backup exists once all its segments do
+    manifest = backups_dir / f"{name}.json"
+    with atomic_write(manifest) as f:
+        json.dump({"name": name, "created": datetime.now().isoformat(timespec="seconds"),
+                   "schema": schema, "next_id": next_id, "segments": hashes}, f)
+    return Backup(name, manifest, len(hashes), copied, copied_bytes)
+
+
+def list_backups(target: Path) -> List[Tuple[str, str, int]]:
+    """(name, created, segment count) of every backup in `target`, oldest first."""
+    backups = []
+    for path in sorted((target / "backups").glob("*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            backups.append((manifest["name"], manifest["created"], len(manifest["segments"])))
+        except (OSError, ValueError, KeyError):
+            continue
+    return sorted(backups, key=lambda b: (b[1], b[0]))
+
+
+def restore_backup(storage, target: Path, name: Optional[str] = None) -> int:
+    """
+    Rebuild the store from a backup in `target` (default: the newest one).
+
+    Every record is checked against its checksum before the current store,
+    snapshotted first as "before-restore", is replaced.
+
+    Returns:
+        Number of entries restored
+    """
+    backups = list_backups(target)
+    if not backups:
+        raise SnapshotError(f"No backups in {target}")
+    name = name or backups[-1][0]
+    try:
+        with open(target / "backups" / f"{_check_name(name)}.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except OSError:
+        raise SnapshotError(f"Backup '{name}' not found in {target}") from None
+    if manifest["schema"] > SCHEMA_VERSION:
+        raise SnapshotError(f"Backup '{name}' was made by a newer noteerr")
+
+    def read_segment(digest: str) -> bytes:
+        try:
+            return (target / "segments" / f"{digest}.jsonl").read_bytes()
+        except OSError:
+            raise SnapshotError(f"Backup '{name}' is missing segment {digest[:12]}") from None
+
+    # Verify everything before touching the store, one segment in memory at a time
+    count = 0
+    for digest in manifest["segments"]:
+        segment = read_segment(digest)
+        if hashlib.sha256(segment).hexdigest() != digest:
+            raise SnapshotError(f"Segment {digest[:12]} of backup '{name}' is damaged")
+        lines = segment.splitlines()
+        if not all(record_intact(line) for line in lines):
+            raise SnapshotError(f"Backup '{name}' holds damaged entries")
+        count += len(lines)
+
+    if storage.data_file.exists():
+        create_snapshot(storage, "before-restore", replace=True)
+    with atomic_write(storage.data_file) as out:
+        # Older records keep their schema and are upgraded on next use
+        out.write(f'{{"schema": {manifest["schema"]}, "next_id": {manifest["next_id"]}, '
+                  f'"entries": [\n')
+        for i, digest in enumerate(manifest["segments"]):
+            if i:
+                out.write(",\n")
+            out.write(read_segment(digest).decode("utf-8").rstrip("\n").replace("\n", ",\n"))
+        out.write("\n]}\n" if count else "]}\n")
+    _refresh_derived(storage)
+    return count
@@ -0,0 +1,133 @@
+"""
+Precomputed index of annotated errors, for suggesting fixes at capture time.
+
+Every entry with notes is filed under a few keys, most specific first:
+
+    !<error fingerprint>    first error line with numbers, paths and quoted
+                            values masked
+    =<command>              the command, whitespace collapsed
+    ~<program subcommand>   its first two words
+
+Each key maps to the newest annotated entry carrying it. The index is written
+as `solutions.tsv` next to the data file, one `key<TAB>id<TAB>note` line per
+key, so the shell hooks can look a failed command up with a single `awk`
+call instead of starting Python at every prompt.
+
+The first line is a comment naming the format version and the signature of
+the data file the index describes; an index for any other version of the
+store is rebuilt. Keys never start with `#`, so the hooks skip that line.
+"""
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FORMAT_VERSION = 2
+
+_HEADER = "# noteerr solutions v"
+
+_MASKS = [
+    (re.compile(r"(['\"`]).*?\1"), "*"),           # quoted values
+    (re.compile(r"(?:[a-z]:)?[\\/][^\s:'\"]*"), "*"),  # paths
+    (re.compile(r"0x[0-9a-f]+|\d+"), "#"),          # numbers and addresses
+]
+
+
+def command_keys(command: str) -> List[str]:
+    """Return the exact and program-level keys for a command."""
+    words = command.split()
+    if not words:
+        return []
+    return ["=" + " ".join(words), "~" + " ".join(words[:2])]
+
+
+def error_key(error: str) -> Optional[str]:
+    """Return a fingerprint of the first non-empty error line, or None."""
+    for line in error.splitlines():
+        line = line.strip().lower()
+        if line:
+            for pattern, replacement in _MASKS:
+                line = pattern.sub(replacement, line)
+            return "!" + " ".join(line.split())[:200]
+    return None
+
+
+def error_group(error: str) -> str:
+    """
+    Short ID of an error's fingerprint (see `error_key`): errors differing
+    only in numbers, paths and quoted values share it.
+    """
+    return "%08x" % zlib.crc32((error_key(error) or "!").encode("utf-8"))
+
+
+def _clean(note: str) -> str:
+    return " ".join(note.split())
+
+
+class SolutionIndex:
+    """Maps lookup keys to the newest annotated entry: key -> (entry ID, note)."""
+
+    def __init__(self, keys: Optional[Dict[str, Tuple[int, str]]] = None):
+        self.keys = keys or {}
+
+    @classmethod
+    def build(cls, records: Iterable[Dict]) -> 'SolutionIndex':
+        """Index raw entry dictionaries."""
+        index = cls()
+        for record in records:
+            index.add(record)
+        return index
+
+    def add(self, record: Dict) -> None:
+        """File an entry under its keys if it has notes and is the newest for them."""
+        note = _clean(record.get("notes") or "")
+        if not note:
+            return
+        keys = command_keys(record.get("command", ""))
+        fingerprint = error_key(record.get("error", ""))
+        if fingerprint and fingerprint != "!command failed":
+            keys.append(fingerprint)
+        for key in keys:
+            current = self.keys.get(key)
+            if current is None or current[0] <= record["id"]:
+                self.keys[key] = (record["id"], note)
+
+    def lookup(self, command: str, error: str = "") -> Optional[Tuple[int, str]]:
+        """Return (entry ID, note) for the most specific matching key."""
+        keys = command_keys(command)
+        fingerprint = error_key(error) if error else None
+        if fingerprint:
+            keys.insert(0, fingerprint)
+        for key in keys:
+            hit = self.keys.get(key)
+            if hit is not None:
+                return hit
+        return None
+
+    def save(self, path: Path, signature: Tuple[int, int, int]) -> None:
+        """Write the index for the data file with `signature` as TSV, atomically."""
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{_HEADER}{FORMAT_VERSION} {' '.join(str(n) for n in signature)}\n")
+            for key, (entry_id, note) in self.keys.items():
+                f.write(f"{key}\t{entry_id}\t{note}\n")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, signature: Optional[Tuple[int, int, int]]) -> Optional['SolutionIndex']:
+        """Read an index saved by `save`, or None if missing, unreadable or not for `signature`."""
+        if signature is None:
+            return None
+        expected = f"{_HEADER}{FORMAT_VERSION} {' '.join(str(n) for n in signature)}"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if f.readline().rstrip("\n") != expected:
+                    return None
+                keys = {}
+                for line in f:
+                    key, entry_id, note = line.rstrip("\n").split("\t", 2)
+                    keys[key] = (int(entry_id), note)
+        except (OSError, ValueError):
+            return None
+        return cls(keys)
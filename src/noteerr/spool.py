@@ -0,0 +1,307 @@
+"""
+Spool of failure events written by the shell hooks, and the ingester that
+moves them into storage.
+
+Capturing must not delay the next prompt, so a hook only writes one small
+file per failed command into `~/.noteerr/spool/` with shell builtins (no
+process is started) and returns. Each event file looks like:
+
+    noteerr-event v1
+    <exit code>
+    <unix time>
+    <working directory>
+    <file holding captured stderr, or empty>
+    <command, possibly spanning several lines>
+    .
+
+The trailing `.` line marks the event as complete, so files are never read
+half-written even though the hook cannot rename them atomically. Nothing is
+locked on the writing side; concurrent shells just write different files.
+
+A background `noteerr ingest` drains the spool in batches, coalescing
+repeats of the same failure (a loop failing 1000 times becomes one entry)
+and writing each batch to storage with a single store write.
+"""
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .query import Query, QueryPlan
+
+HEADER = "noteerr-event v1\n"
+TRAILER = "\n.\n"
+LOCK_NAME = "ingest.pid"
+# Events still missing their trailer after this long were abandoned mid-write
+STALE_AFTER = 60.0
+# Captured stderr beyond this is cut down to its head and tail
+MAX_ERROR = 64 * 1024
+DEFAULT_ERROR = "Command failed"
+
+
+def write_event(spool_dir: Path, command: str, exit_code: int, directory: str,
+                stderr_file: str = "", timestamp: Optional[float] = None) -> Path:
+    """Spool one failure event, as the shell hooks do; return its path."""
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = time.time() if timestamp is None else timestamp
+    name = f"{int(timestamp)}.{os.getpid()}.{time.monotonic_ns()}"
+    tmp = spool_dir / f".{name}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(f"{HEADER}{exit_code}\n{int(timestamp)}\n{directory}\n{stderr_file}\n{command}{TRAILER}")
+    path = spool_dir / f"{name}.event"
+    os.replace(tmp, path)
+    return path
+
+
+def parse_event(text: str) -> Optional[Dict]:
+    """Decode an event file, or return None if it is incomplete or malformed."""
+    if not text.startswith(HEADER) or not text.endswith(TRAILER):
+        return None
+    fields = text[len(HEADER):-len(TRAILER)].split("\n", 4)
+    if len(fields) != 5:
+        return None
+    exit_code, timestamp, directory, stderr_file, command = fields
+    try:
+        return {
+            "exit_code": int(exit_code),
+            "timestamp": float(timestamp),
+            "directory": directory,
+            "stderr_file": stderr_file,
+            "command": command.strip(),
+        }
+    except ValueError:
+        return None
+
+
+def _read_error(stderr_file: str) -> str:
+    if not stderr_file:
+        return ""
+    try:
+        with open(stderr_file, "rb") as f:
+            data = f.read(MAX_ERROR + 1)
+            if len(data) > MAX_ERROR:
+                f.seek(-MAX_ERROR // 2, os.SEEK_END)
+                data = data[:MAX_ERROR // 2] + b"\n...\n" + f.read()
+    except OSError:
+        return ""
+    return data.decode("utf-8", "replace").strip()
+
+
+def pending_events(spool_dir: Path) -> Iterator[Tuple[Path, Optional[Dict]]]:
+    """
+    Yield (path, event) for spooled events, oldest first.
+
+    `event` is None for files to discard: malformed, or never completed.
+    Events still being written are skipped.
+    """
+    try:
+        names = sorted(name for name in os.listdir(spool_dir) if name.endswith(".event"))
+    except FileNotFoundError:
+        return
+    now = time.time()
+    for name in names:
+        path = spool_dir / name
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            mtime = path.stat().st_mtime
+        except OSError:
+            continue
+        event = parse_event(text)
+        if event is None and now - mtime < STALE_AFTER:
+            continue
+        yield path, event
+
+
+def coalesce(events: List[Dict]) -> List[Dict]:
+    """
+    Merge repeats of the same failure (command, directory, exit code and
+    error text), keeping the latest one, in order of each failure's last
+    occurrence. Repeats are counted by the outcome history instead (see
+    `Storage.record_outcomes`).
+    """
+    merged: Dict[Tuple, Dict] = {}
+    for event in events:
+        key = (event["command"], event["directory"], event["exit_code"], event["error"])
+        merged.pop(key, None)
+        merged[key] = event
+    return list(merged.values())
+
+
+class Ingester:
+    """
+    Moves spooled events into storage.
+
+    Only one ingester runs per spool: `acquire` takes a lock file holding the
+    process ID, replacing it if that process has gone away.
+    """
+
+    def __init__(self, storage, spool_dir: Optional[Path] = None, window: float = 60.0):
+        self.storage = storage
+        self.spool_dir = spool_dir or storage.spool_dir
+        self.lock_file = self.spool_dir / LOCK_NAME
+        # A failure repeating within `window` seconds of the last one ingested
+        # by this process is coalesced into that entry as well
+        self.window = window
+        self._recent: Optional[Dict[Tuple, float]] = None
+
+    def acquire(self) -> bool:
+        """Take the ingester lock; return False if another live ingester holds it."""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if lock_holder_alive(self.lock_file):
+                    return False
+                try:
+                    self.lock_file.unlink()
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{os.getpid()}\n")
+            return True
+        return False
+
+    def release(self) -> None:
+        try:
+            self.lock_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def drain(self) -> Tuple[int, int]:
+        """
+        Ingest everything currently spooled in one batch.
+
+        Returns:
+            (events consumed, entries written)
+        """
+        paths, events = [], []
+        for path, event in pending_events(self.spool_dir):
+            paths.append(path)
+            if event is not None:
+                # Redacted before repeats are compared, as stored entries are
+                event["command"] = self.storage.redact(event["command"])
+                event["error"] = self.storage.redact(_read_error(event["stderr_file"]) or DEFAULT_ERROR)
+                events.append(event)
+
+        # Every capture counts towards the command's outcome history, repeats included
+        self.storage.record_outcomes((e["command"], True, e["timestamp"]) for e in events)
+        if events and self._recent is None:
+            self._recent = self._recently_stored(min(e["timestamp"] for e in events) - self.window)
+
+        records = []
+        for event in coalesce(events):
+            key = (event["command"], event["directory"], event["exit_code"], event["error"])
+            last = self._recent.get(key)
+            self._recent[key] = event["timestamp"]
+            if last is not None and event["timestamp"] - last <= self.window:
+                continue
+            records.append({
+                "timestamp": datetime.fromtimestamp(event["timestamp"]).isoformat(),
+                "command": event["command"],
+                "error": event["error"],
+                "exit_code": event["exit_code"],
+                "directory": event["directory"],
+                "project": self.storage.detect_project(event["directory"]),
+            })
+        if records:
+            # Stored oldest first within the batch
+            records.sort(key=lambda record: record["timestamp"])
+            self.storage.add_entries(records, redact=False)
+
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        for event in events:
+            # Captured output spooled alongside the event is ours to remove
+            if event["stderr_file"] and Path(event["stderr_file"]).parent == self.spool_dir:
+                try:
+                    os.unlink(event["stderr_file"])
+                except OSError:
+                    pass
+        return len(paths), len(records)
+
+    def _recently_stored(self, since: float) -> Dict[Tuple, float]:
+        """Failures already stored since `since`, so repeats merge across ingester runs."""
+        recent: Dict[Tuple, float] = {}
+        # The store need not be in time order: the query checks every entry's
+        # timestamp (on the raw line) rather than stopping at the first old one
+        plan = QueryPlan(Query(since=datetime.fromtimestamp(since).isoformat()))
+        for entry in self.storage.query_entries(plan):
+            try:
+                stamp = datetime.fromisoformat(entry.timestamp).timestamp()
+            except ValueError:
+                continue
+            key = (entry.command, entry.directory, entry.exit_code, entry.error)
+            recent[key] = max(stamp, recent.get(key, stamp))
+        return recent
+
+    def run(self, linger: float = 2.0, interval: float = 0.25) -> Tuple[int, int]:
+        """
+        Drain the spool until it has stayed empty for `linger` seconds.
+
+        Waiting `interval` between passes lets a burst of failures pile up
+        and be written as one batch. Returns totals like `drain`.
+        """
+        consumed = written = 0
+        idle_since = time.monotonic()
+        while True:
+            time.sleep(interval)
+            try:
+                os.utime(self.lock_file)
+            except OSError:
+                pass
+            batch = self.drain()
+            consumed += batch[0]
+            written += batch[1]
+            if batch[0]:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= linger:
+                return consumed, written
+
+
+def lock_holder_alive(lock_file: Path) -> bool:
+    """
+    A running ingester refreshes its lock file every pass, so an old lock is
+    stale. On POSIX a lock whose process has exited is stale right away.
+    """
+    try:
+        if time.time() - lock_file.stat().st_mtime > STALE_AFTER:
+            return False
+        pid = int(lock_file.read_text().strip() or 0)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        return True
+    if os.name != "posix" or pid <= 0:
+        # os.kill(pid, 0) would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def start_ingester(spool_dir: Path) -> None:
+    """Start `noteerr ingest` in the background unless one is already running."""
+    if lock_holder_alive(spool_dir / LOCK_NAME):
+        return
+    options = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL,
+               "stderr": subprocess.DEVNULL}
+    if os.name == "nt":
+        options["creationflags"] = (subprocess.DETACHED_PROCESS
+                                    | subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        options["start_new_session"] = True
+    subprocess.Popen([sys.executable, "-m", "noteerr.cli", "ingest", "--linger", "2", "--quiet"],
+                     **options)
@@ -1,11 +1,46 @@
 """Storage backend for noteerr using JSON."""
 import json
-import os
+import sys
+import threading
+from contextlib import closing
+from dataclasses import fields
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 
+from .index import StoreIndex, intersect, union
+from .completions import CompletionCache
+from .flaky import CommandStats, FlakyIndex, append_outcomes
+from .migrations import MigrationError, NewerStoreError, migrate_file, upgrade_data
 from .models import ErrorEntry
+from .pathindex import PathIndex, in_directory
+from .profiling import phase_of
+from .projects import ProjectResolver
+from .query import QueryPlan, compile_query, raw_needle, term_matches
+from .recordfile import (CRC_KEY, SCHEMA_VERSION, RecordReader, atomic_write, decode_line,
+                         records_intact,
+                         dump_store, file_signature, record_timestamp)
+from .recovery import recover_store
+from .redaction import Redactor
+from .similarity import VectorStore
+from .solutions import SolutionIndex
+from .tagindex import TagIndex, retagged
+from .trends import Rollup, TrendCache
+
+# `"field": ` for each ErrorEntry field, in `to_dict` order. Quotes inside JSON
+# strings are escaped, so these only ever match keys.
+_RECORD_KEYS = [f'"{field.name}": '.encode("ascii") for field in fields(ErrorEntry)]
+
+
+def _is_complete_record(line: bytes) -> bool:
+    """Check that a raw record line has every entry field, in `to_dict` order."""
+    pos = 0
+    for key in _RECORD_KEYS:
+        pos = line.find(key, pos)
+        if pos < 0:
+            return False
+    return line.startswith(b"{")
 
 
 class Storage:
@@ -23,135 +58,612 @@ class Storage:
             self.data_file = data_file
             self.data_file.parent.mkdir(parents=True, exist_ok=True)
         
+        # Decoded store and derived indexes, valid while the file signature matches
+        self._lock = threading.RLock()
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._data: Optional[Dict[str, Any]] = None
+        self._index: Optional[StoreIndex] = None
+        
+        # Error-text vectors for `similar_entries`, cached beside the data file
+        self.vectors_file = self.data_file.with_name("vectors.bin")
+        self._vectors: Optional[VectorStore] = None
+        self._vectors_signature: Optional[Tuple[int, int, int]] = None
+        # Annotated errors by command and error fingerprint, read by the shell hooks
+        self.solutions_file = self.data_file.with_name("solutions.tsv")
+        # Tag -> entry IDs, for filtering by tag without decoding every entry
+        self.tags_file = self.data_file.with_name("tags.bin")
+        # Working directory -> entry IDs, for `list --dir` subtree queries
+        self.dirs_file = self.data_file.with_name("dirs.bin")
+        # Timestamp and category columns for `stats --trend`
+        self.trends_file = self.data_file.with_name("trends.bin")
+        # Recent IDs, projects and tags for the shell integration's tab completion
+        self.completions_file = self.data_file.with_name("completions.tsv")
+        # Directory -> project rules, and the projects worked out per directory
+        self.project_rules_file = self.data_file.with_name("project-rules.tsv")
+        self.project_cache_file = self.data_file.with_name("projects.cache")
+        self._project_resolver: Optional[ProjectResolver] = None
+        # Secret patterns added to or turned off among the built-in ones
+        self.redact_rules_file = self.data_file.with_name("redact-rules.tsv")
+        self._redactor: Optional[Tuple[int, Redactor]] = None
+        # Failure events captured by the shell hooks, waiting for `noteerr ingest`
+        self.spool_dir = self.data_file.with_name("spool")
+        # Point-in-time copies of the data file (see `snapshots`)
+        self.snapshots_dir = self.data_file.with_name("snapshots")
+        # Pass/fail events per command, and the statistics drawn from them (see `flaky`)
+        self.outcomes_file = self.data_file.with_name("outcomes.log")
+        self.flaky_file = self.data_file.with_name("flaky.bin")
+        
         # Initialize file if it doesn't exist
         if not self.data_file.exists():
             self._write_data({"entries": [], "next_id": 1})
     
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """Return (mtime, size, inode) of the data file, or None if missing."""
+        return file_signature(self.data_file)
+    
+    @phase_of("read")
     def _read_data(self) -> Dict[str, Any]:
-        """Read data from JSON file."""
+        """Read data from JSON file, reusing the cached copy if unchanged."""
+        with self._lock:
+            signature = self._file_signature()
+            if self._data is not None and signature == self._signature:
+                return self._data
+            if self._migrate():
+                signature = self._file_signature()
+            
+            try:
+                with open(self.data_file, 'rb') as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                return {"entries": [], "next_id": 1}
+            try:
+                # A record changed since it was written would otherwise be
+                # rewritten, with a fresh checksum, by the next save
+                if not records_intact(raw):
+                    raise ValueError("record checksum mismatch")
+                data = json.loads(raw)
+            except ValueError:
+                # Damaged: rebuild it from the intact records instead of
+                # starting over (the next save would overwrite the history)
+                recovery = recover_store(self.data_file)
+                message = (f"noteerr: {self.data_file} was damaged; "
+                           f"recovered {recovery.kept} entries")
+                if recovery.quarantine is not None:
+                    message += f", damaged data saved to {recovery.quarantine}"
+                sys.stderr.write(message + "\n")
+                signature = self._file_signature()
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            for record in data["entries"]:
+                record.pop(CRC_KEY, None)
+            
+            try:
+                # Only still old if it couldn't be migrated (a read-only file)
+                upgrade_data(data)
+            except MigrationError:
+                pass  # Damaged entries; `noteerr doctor` reports them
+            
+            self._data = data
+            self._signature = signature
+            self._index = None
+            return data
+    
+    @phase_of("write")
+    def _write_data(self, data: Dict[str, Any], base: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Write data to JSON file and keep it as the cached copy.
+        
+        Writers build `data` as a new object rather than changing the cached
+        one, which only becomes `data` once the file has been replaced: if
+        the write fails, the cache still matches the file on disk.
+        
+        Args:
+            data: The whole store
+            base: The store `data` was made from, if the caller patches the
+                in-memory index with its changes; otherwise (or if `base` is
+                not the cached store) the index is rebuilt on next use
+        """
+        with self._lock:
+            with atomic_write(self.data_file) as f:
+                dump_store(data, f)
+            if base is None or base is not self._data:
+                self._index = None
+            self._data = data
+            self._signature = self._file_signature()
+    
+    def _open_reader(self) -> Optional[RecordReader]:
+        """
+        Memory-map the data file for a read-only query.
+        
+        Returns None when the store is already cached in this process or the
+        file is not in the record layout, in which case callers use the index.
+        """
+        if self._data is not None:
+            return None
+        try:
+            reader = RecordReader(self.data_file)
+        except OSError:
+            return None
+        if reader.schema > SCHEMA_VERSION:
+            reader.close()
+            raise NewerStoreError(self.data_file, reader.schema)
+        if not reader.is_record_layout or reader.schema < SCHEMA_VERSION:
+            reader.close()
+            return self._open_reader() if self._migrate() else None
+        return reader
+    
+    def _migrate(self) -> bool:
+        """
+        Rewrite a store from an older version (pretty-printed, or an older
+        schema) in the current record layout, streaming it a record at a time
+        (see `migrate_file`). Done once, the first time it is opened.
+        
+        Returns:
+            True if the file was rewritten; False if it was already current
+            or can't be (read-only, or damaged: loading it recovers it)
+        
+        A store written by a newer release raises NewerStoreError instead:
+        the next save would write it back as this release's schema.
+        """
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {"entries": [], "next_id": 1}
+            return migrate_file(self.data_file) is not None
+        except NewerStoreError:
+            raise
+        except (OSError, MigrationError):
+            return False
     
-    def _write_data(self, data: Dict[str, Any]) -> None:
-        """Write data to JSON file."""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    @phase_of("index")
+    def _get_index(self) -> StoreIndex:
+        """Return the in-memory index, building it on first use after a load."""
+        with self._lock:
+            data = self._read_data()
+            if self._index is None or data is not self._data:
+                index = StoreIndex.from_records(data["entries"])
+                if data is not self._data:
+                    # Unreadable file: don't cache anything
+                    return index
+                self._index = index
+            return self._index
     
+    @phase_of("write")
     def add_entry(self, command: str, error: str, exit_code: int, 
                   directory: str, notes: str = "", tags: List[str] = None, 
-                  project: str = "") -> ErrorEntry:
-        """Add a new error entry."""
-        data = self._read_data()
-        
-        entry = ErrorEntry(
-            id=data["next_id"],
-            timestamp=datetime.now().isoformat(),
-            command=command,
-            error=error,
-            exit_code=exit_code,
-            directory=directory,
-            notes=notes,
-            tags=tags or [],
-            project=project
-        )
-        
-        data["entries"].append(entry.to_dict())
-        data["next_id"] += 1
-        self._write_data(data)
-        
-        return entry
+                  project: str = "", redact: bool = True) -> ErrorEntry:
+        """Add a new error entry (see `add_entries` for `redact`)."""
+        return self.add_entries([{
+            "timestamp": datetime.now().isoformat(),
+            "command": command,
+            "error": error,
+            "exit_code": exit_code,
+            "directory": directory,
+            "notes": notes,
+            "tags": tags or [],
+            "project": project
+        }], redact=redact)[0]
+    
+    @phase_of("write")
+    def add_entries(self, records: List[Dict[str, Any]], redact: bool = True) -> List[ErrorEntry]:
+        """
+        Add several entries with a single write of the store.
+        
+        Args:
+            records: Entry fields without "id"; "timestamp" defaults to now,
+                notes, tags and project to empty. Timestamps are kept as
+                given, so entries need not be in time order (a failure can
+                be spooled before the newest entry but ingested after it)
+            redact: Mask secrets in the commands and errors (see `redact`);
+                only for records the caller has already redacted
+            
+        Returns:
+            The new entries, in order
+        """
+        if redact:
+            records = [{**record, "command": self.redact(record.get("command") or ""),
+                        "error": self.redact(record.get("error") or "")} for record in records]
+        with self._lock:
+            data = self._read_data()
+            before = self._signature
+            added = []
+            next_id = data["next_id"]
+            for record in records:
+                entry = ErrorEntry.from_dict({
+                    "timestamp": datetime.now().isoformat(),
+                    **record,
+                    "id": next_id
+                })
+                next_id += 1
+                added.append(entry)
+            if not added:
+                return added
+            base, data = data, {**data, "next_id": next_id,
+                                 "entries": data["entries"] + [entry.to_dict() for entry in added]}
+            self._write_data(data, base)
+            
+            self._update_solutions(before, data, added=data["entries"][-len(added):])
+            if self._index is not None:
+                for entry in added:
+                    self._index.add(ErrorEntry.from_dict(entry.to_dict()))
+            self._update_tag_index(before, [(entry.id, [], entry.tags) for entry in added])
+            self._update_path_index(before, added=[(entry.id, entry.directory) for entry in added])
+            self._update_trends(before, added=data["entries"][-len(added):])
+            self._update_completions(before, data, added=data["entries"][-len(added):])
+            self._update_vectors(before, added=[(entry.id, entry.error) for entry in added])
+        
+        return added
     
+    @phase_of("index")
     def get_all_entries(self) -> List[ErrorEntry]:
         """Get all error entries."""
-        data = self._read_data()
-        return [ErrorEntry.from_dict(e) for e in data["entries"]]
+        return list(self._get_index().entries)
     
+    @phase_of("index")
     def get_entry_by_id(self, entry_id: int) -> Optional[ErrorEntry]:
         """Get a specific entry by ID."""
-        entries = self.get_all_entries()
-        for entry in entries:
-            if entry.id == entry_id:
-                return entry
-        return None
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                record = reader.find(entry_id)
+            return ErrorEntry.from_dict(record) if record else None
+        return self._get_index().get(entry_id)
+    
+    @phase_of("index")
+    def get_recent_entries(self, limit: Optional[int] = None, project: Optional[str] = None,
+                           tag: Optional[str] = None, offset: int = 0,
+                           directory: Optional[str] = None,
+                           recursive: bool = False) -> List[ErrorEntry]:
+        """
+        Get the most recent entries first, optionally filtered by project,
+        tag and working directory.
+        
+        Args:
+            limit: Maximum number of entries to return (None for all)
+            project: Only entries from this project (case-insensitive)
+            tag: Only entries with this exact tag
+            offset: Number of matching entries to skip first (for paging)
+            directory: Only entries saved in this absolute, normalized directory
+            recursive: With `directory`, also entries saved anywhere below it
+            
+        Returns:
+            Matching entries, newest first
+        """
+        # Small chunks when only one page is needed
+        chunk_size = 1 << 16 if limit is not None and offset + limit <= 1000 else 1 << 20
+        with closing(self.iter_recent_entries(project, tag, chunk_size, directory=directory,
+                                              recursive=recursive)) as entries:
+            stop = None if limit is None else offset + limit
+            return [*islice(entries, offset, stop)]
     
+    def iter_recent_entries(self, project: Optional[str] = None, tag: Optional[str] = None,
+                            chunk_size: int = 1 << 20, directory: Optional[str] = None,
+                            recursive: bool = False) -> Iterator[ErrorEntry]:
+        """
+        Yield entries newest first, optionally filtered by project, tag and
+        working directory (see `get_recent_entries`).
+        
+        Entries are decoded as they are consumed, so callers can start
+        printing before the whole store has been read. Close the iterator
+        (or exhaust it) to release the memory-mapped file.
+        """
+        project_lower = project.lower() if project else None
+        
+        def wanted(entry):
+            if project_lower is not None and entry.project.lower() != project_lower:
+                return False
+            if directory is not None and not in_directory(entry.directory, directory, recursive):
+                return False
+            return tag is None or tag in entry.tags
+        
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                if directory is not None or tag is not None:
+                    # Decode only the entries the directory or tag postings point at
+                    if directory is not None:
+                        ids = self._path_index(reader).recent_ids(directory, recursive)
+                    else:
+                        ids = reversed(self._tag_index(reader).ids(tag))
+                    for entry_id in ids:
+                        record = reader.find(entry_id)
+                        if record is not None:
+                            entry = ErrorEntry.from_dict(record)
+                            if wanted(entry):
+                                yield entry
+                    return
+                for record in reader.records(reverse=True, chunk_size=chunk_size):
+                    entry = ErrorEntry.from_dict(record)
+                    if wanted(entry):
+                        yield entry
+            return
+        index = self._get_index()
+        if tag is not None:
+            candidates = (index.get(i) for i in reversed(index.by_tag.get(tag, [])[:]))
+        else:
+            candidates = reversed(index.entries[:])
+        for entry in candidates:
+            if entry is not None and wanted(entry):
+                yield entry
+    
+    def iter_recent_json(self) -> Iterator[str]:
+        """
+        Yield every entry newest first as a one-line JSON object, in the key
+        order of `ErrorEntry.to_dict`.
+        
+        Complete records in the record layout are passed through as stored,
+        without being decoded and re-encoded.
+        """
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                for line in reader.lines(reverse=True):
+                    if _is_complete_record(line):
+                        yield line.decode("utf-8")
+                    elif line:
+                        record = decode_line(line)
+                        if record is not None:
+                            record = ErrorEntry.from_dict(record).to_dict()
+                            yield json.dumps(record, ensure_ascii=False)
+            return
+        for entry in reversed(self._get_index().entries[:]):
+            yield json.dumps(entry.to_dict(), ensure_ascii=False)
+    
+    @phase_of("write")
     def update_entry(self, entry_id: int, notes: Optional[str] = None, 
                     tags: Optional[List[str]] = None) -> bool:
         """Update an existing entry."""
-        data = self._read_data()
+        return self.update_entries([entry_id], notes=notes, tags=tags) > 0
+    
+    @phase_of("write")
+    def update_entries(self, entry_ids: Iterable[int], notes: Optional[str] = None,
+                       tags: Optional[List[str]] = None) -> int:
+        """
+        Set the notes and/or tags of several entries with a single write.
         
-        for entry_data in data["entries"]:
-            if entry_data["id"] == entry_id:
-                if notes is not None:
-                    entry_data["notes"] = notes
-                if tags is not None:
-                    entry_data["tags"] = tags
-                self._write_data(data)
-                return True
+        Args:
+            entry_ids: Entries to update; IDs not in the store are ignored
+            notes: New notes, or None to keep each entry's own
+            tags: New tags, or None to keep each entry's own
+            
+        Returns:
+            Number of entries updated
+        """
+        wanted = set(entry_ids)
+        with self._lock:
+            data = self._read_data()
+            before = self._signature
+            
+            updated = []
+            changes = []
+            entries = []
+            for entry_data in data["entries"]:
+                if entry_data["id"] in wanted:
+                    entry_data = dict(entry_data)
+                    if notes is not None:
+                        entry_data["notes"] = notes
+                    if tags is not None:
+                        changes.append((entry_data["id"], entry_data.get("tags") or [], tags))
+                        entry_data["tags"] = list(tags)
+                    updated.append(entry_data["id"])
+                entries.append(entry_data)
+            if not updated:
+                return 0
+            
+            base, data = data, {**data, "entries": entries}
+            self._write_data(data, base)
+            self._update_solutions(before, data, rebuild=notes is not None)
+            if self._index is not None:
+                for entry_id in updated:
+                    self._index.update(entry_id, notes=notes, tags=tags)
+            self._update_tag_index(before, changes)
+            self._update_trends(before, retagged=[(entry_id, new) for entry_id, _, new in changes])
+            self._update_completions(before, data, retagged=changes)
+            self._update_vectors(before)
         
-        return False
+        return len(updated)
     
+    @phase_of("write")
     def delete_entry(self, entry_id: int) -> bool:
         """Delete an entry by ID."""
-        data = self._read_data()
-        original_count = len(data["entries"])
-        
-        data["entries"] = [e for e in data["entries"] if e["id"] != entry_id]
+        return self.delete_entries([entry_id]) > 0
+    
+    @phase_of("write")
+    def delete_entries(self, entry_ids: Iterable[int]) -> int:
+        """
+        Delete several entries with a single write.
         
-        if len(data["entries"]) < original_count:
-            self._write_data(data)
-            return True
+        Args:
+            entry_ids: Entries to delete; IDs not in the store are ignored
+            
+        Returns:
+            Number of entries deleted
+        """
+        doomed = set(entry_ids)
+        with self._lock:
+            data = self._read_data()
+            before = self._signature
+            
+            remaining = []
+            removed = []
+            for entry_data in data["entries"]:
+                (removed if entry_data["id"] in doomed else remaining).append(entry_data)
+            if not removed:
+                return 0
+            
+            base, data = data, {**data, "entries": remaining}
+            self._write_data(data, base)
+            self._update_solutions(before, data, rebuild=any(e.get("notes") for e in removed))
+            if self._index is not None:
+                self._index.remove_many(entry_data["id"] for entry_data in removed)
+            self._update_tag_index(before, [(e["id"], e.get("tags") or [], [])
+                                            for e in removed])
+            self._update_path_index(before, removed=[(e["id"], e.get("directory"))
+                                                     for e in removed])
+            self._update_trends(before, removed=[e["id"] for e in removed])
+            self._update_completions(before, data, removed=removed)
+            self._update_vectors(before, removed=[e["id"] for e in removed])
         
-        return False
+        return len(removed)
     
+    @phase_of("index")
     def search_entries(self, query: str) -> List[ErrorEntry]:
         """Search entries by command, error text, or notes."""
-        entries = self.get_all_entries()
         query_lower = query.lower()
         
-        return [
-            entry for entry in entries
-            if query_lower in entry.command.lower()
-            or query_lower in entry.error.lower()
-            or query_lower in entry.notes.lower()
-            or any(query_lower in tag.lower() for tag in entry.tags)
-        ]
+        reader = self._open_reader()
+        if reader is not None:
+            raw = raw_needle(query_lower)
+            matches = []
+            with reader:
+                for line in reader.lines():
+                    # Skip decoding records that cannot contain the query
+                    if not line or (raw is not None and raw not in line.lower()):
+                        continue
+                    record = decode_line(line)
+                    if record is None:
+                        continue
+                    entry = ErrorEntry.from_dict(record)
+                    if term_matches(entry, query_lower):
+                        matches.append(entry)
+            return matches
+        
+        return [entry for entry in self._get_index().entries
+                if term_matches(entry, query_lower)]
     
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get statistics about stored errors."""
-        entries = self.get_all_entries()
+    @phase_of("index")
+    def query_entries(self, query, limit: Optional[int] = None) -> List[ErrorEntry]:
+        """
+        Run a structured query (see `noteerr.query`), newest first.
         
-        if not entries:
-            return {
-                "total_errors": 0,
-                "most_common_command": None,
-                "most_recent": None,
-                "tags": {}
-            }
+        Args:
+            query: Query string or compiled QueryPlan
+            limit: Maximum number of results (None for all)
+            
+        Returns:
+            Matching entries, newest first. When a QueryPlan is passed, its
+            `strategy` records the access path that was used.
+        """
+        plan = query if isinstance(query, QueryPlan) else compile_query(query)
+        
+        reader = self._open_reader()
+        if reader is None:
+            return plan.run(self._get_index(), limit)
+        
+        with reader:
+            if plan.query.tags:
+                # Start from the entries carrying every tag filter
+                tags = self._tag_index(reader)
+                ids = intersect(union(tags.ids(tag) for tag in alternatives)
+                                for alternatives in plan.query.tags)
+                
+                def tagged():
+                    for entry_id in reversed(ids):
+                        record = reader.find(entry_id)
+                        if record is not None:
+                            yield ErrorEntry.from_dict(record)
+                strategy = " & ".join(f"tag index ({','.join(alternatives)})"
+                                      for alternatives in plan.query.tags)
+                return plan.run_stream(tagged(), limit, strategy=strategy, candidates=len(ids))
+            
+            needles = plan.raw_needles()
+            since, until = plan.query.since, plan.query.until
+            if needles or since or until:
+                # Check time bounds and required literals on the raw line,
+                # and decode only the records that pass. Entries are not
+                # necessarily in time order, so the whole file is scanned
+                def candidates():
+                    lines = reader.lines_since(since) if since else reader.lines(reverse=True)
+                    for line in lines:
+                        if not line:
+                            continue
+                        if since or until:
+                            timestamp = record_timestamp(line)
+                            if timestamp and until and timestamp >= until:
+                                continue
+                            if timestamp and since and timestamp < since:
+                                continue
+                        if needles:
+                            lowered = line.lower()
+                            if not all(n in lowered for n in needles):
+                                continue
+                        record = decode_line(line)
+                        if record is not None:
+                            yield ErrorEntry.from_dict(record)
+            else:
+                def candidates():
+                    for record in reader.records(reverse=True, chunk_size=1 << 16):
+                        yield ErrorEntry.from_dict(record)
+            return plan.run_stream(candidates(), limit)
+    
+    @phase_of("index")
+    def match_entries(self, matcher, limit: Optional[int] = None) -> List[ErrorEntry]:
+        """
+        Run a regex or fuzzy matcher (see `noteerr.textsearch`), newest first.
+        
+        The matcher's `strategy` records the access path that was used.
         
+        Args:
+            matcher: RegexMatcher or FuzzyMatcher
+            limit: Maximum number of results (None for all)
+            
+        Returns:
+            Matching entries, newest first
+        """
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                return matcher.run_lines(reader.lines(reverse=True), limit)
+        
+        index = self._get_index()
+        with self._lock:
+            # The trigram postings are built lazily on first use
+            return matcher.run(index, limit)
+    
+    @phase_of("index")
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get statistics about stored errors."""
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                return self._compute_statistics(
+                    ErrorEntry.from_dict(r) for r in reader.records())
+        return self._compute_statistics(self._get_index().entries)
+    
+    @staticmethod
+    def _compute_statistics(entries: Iterable[ErrorEntry]) -> Dict[str, Any]:
+        """Aggregate statistics in a single pass over `entries`."""
         # Count commands
         command_counts = {}
         tag_counts = {}
+        total = 0
+        most_recent = None
         
         for entry in entries:
+            total += 1
+            most_recent = entry
             cmd = entry.command.split()[0] if entry.command else "unknown"
             command_counts[cmd] = command_counts.get(cmd, 0) + 1
             
             for tag in entry.tags:
                 tag_counts[tag] = tag_counts.get(tag, 0) + 1
         
+        if not total:
+            return {
+                "total_errors": 0,
+                "most_common_command": None,
+                "most_recent": None,
+                "tags": {}
+            }
+        
         most_common = max(command_counts.items(), key=lambda x: x[1]) if command_counts else (None, 0)
         
         return {
-            "total_errors": len(entries),
+            "total_errors": total,
             "most_common_command": most_common[0],
             "most_common_count": most_common[1],
-            "most_recent": entries[-1],
+            "most_recent": most_recent,
             "tags": tag_counts
         }
     
+    @phase_of("dedup")
     def find_similar_entries(self, entry: ErrorEntry, threshold: float = 0.85) -> List[ErrorEntry]:
         """
         Find entries similar to the given entry.
@@ -172,23 +684,522 @@ class Storage:
         
         return similar
     
+    def _update_solutions(self, before: Optional[Tuple[int, int, int]], data: Dict[str, Any],
+                          added: Iterable[Dict[str, Any]] = (), rebuild: bool = False) -> None:
+        """
+        Rewrite the annotated-solutions index for the store after a write.
+        
+        New entries are filed into the existing index if it matched the store
+        before the write (see `_update_tag_index`); otherwise, or when notes
+        were edited or deleted, it is rebuilt from `data`.
+        
+        Args:
+            before: Signature of the data file before the write
+            data: The store as written
+            added: Records of new entries
+            rebuild: Notes changed in a way that can't be patched
+        """
+        solutions = None if rebuild else SolutionIndex.load(self.solutions_file, before)
+        if solutions is None:
+            solutions = SolutionIndex.build(data["entries"])
+        else:
+            for record in added:
+                solutions.add(record)
+        try:
+            solutions.save(self.solutions_file, self._signature)
+        except OSError:
+            pass  # Suggestions are best-effort
+    
+    def _tag_index(self, reader: RecordReader) -> TagIndex:
+        """
+        Tag postings for the store `reader` has mapped, rebuilt from its raw
+        record lines (and saved) if the cached ones describe another version.
+        """
+        tags = TagIndex.load(self.tags_file, reader.signature)
+        if tags is None:
+            tags = TagIndex.build_from_lines(reader.lines())
+            try:
+                tags.save(self.tags_file, reader.signature)
+            except OSError:
+                pass  # The cache is only an optimization
+        return tags
+    
+    def _path_index(self, reader: RecordReader) -> PathIndex:
+        """Directory postings for the store `reader` has mapped (see `_tag_index`)."""
+        dirs = PathIndex.load(self.dirs_file, reader.signature)
+        if dirs is None:
+            dirs = PathIndex.build_from_lines(reader.lines())
+            try:
+                dirs.save(self.dirs_file, reader.signature)
+            except OSError:
+                pass  # The cache is only an optimization
+        return dirs
+    
+    def _update_tag_index(self, before: Optional[Tuple[int, int, int]],
+                          changes: List[Tuple[int, List[str], List[str]]]) -> None:
+        """
+        Patch the cached tag postings after a write.
+        
+        Args:
+            before: Signature of the data file before the write; a cache
+                that didn't match it is left to be rebuilt on next use
+            changes: (entry ID, old tags, new tags) for each entry written
+        """
+        tags = TagIndex.load(self.tags_file, before)
+        if tags is None:
+            return
+        for entry_id, old, new in changes:
+            tags.remove(entry_id, old)
+            tags.add(entry_id, new)
+        try:
+            tags.save(self.tags_file, self._signature)
+        except OSError:
+            pass
+    
+    def _update_path_index(self, before: Optional[Tuple[int, int, int]],
+                           added: Iterable[Tuple[int, str]] = (),
+                           removed: Iterable[Tuple[int, str]] = ()) -> None:
+        """
+        Patch the cached directory postings after a write, if they matched
+        the store before it (see `_update_tag_index`).
+        
+        Args:
+            before: Signature of the data file before the write
+            added: (entry ID, directory) of new entries
+            removed: (entry ID, directory) of deleted entries
+        """
+        dirs = PathIndex.load(self.dirs_file, before)
+        if dirs is None:
+            return
+        for entry_id, directory in removed:
+            dirs.remove(entry_id, directory)
+        for entry_id, directory in added:
+            dirs.add(entry_id, directory)
+        try:
+            dirs.save(self.dirs_file, self._signature)
+        except OSError:
+            pass
+    
+    def _update_trends(self, before: Optional[Tuple[int, int, int]],
+                       added: Iterable[Dict[str, Any]] = (), removed: Iterable[int] = (),
+                       retagged: Iterable[Tuple[int, List[str]]] = ()) -> None:
+        """
+        Patch the cached trend columns after a write, if they matched the
+        store before it (see `_update_tag_index`).
+        
+        Args:
+            before: Signature of the data file before the write
+            added: Records of new entries
+            removed: IDs of deleted entries
+            retagged: (entry ID, new tags) for entries whose tags changed
+        """
+        trends = TrendCache.load(self.trends_file, before)
+        if trends is None:
+            return
+        trends.remove(removed)
+        trends.retag(retagged)
+        for record in added:
+            trends.add(record)
+        try:
+            trends.save(self.trends_file, self._signature)
+        except OSError:
+            pass
+    
+    def _update_completions(self, before: Optional[Tuple[int, int, int]], data: Dict[str, Any],
+                            added: Iterable[Dict[str, Any]] = (),
+                            removed: Iterable[Dict[str, Any]] = (),
+                            retagged: Iterable[Tuple[int, List[str], List[str]]] = ()) -> None:
+        """
+        Rewrite the shell completion file after a write.
+        
+        Project and tag counts are patched from the records written; a file
+        that didn't match the store before the write is rebuilt from `data`.
+        
+        Args:
+            before: Signature of the data file before the write
+            data: The store as written
+            added: Records of new entries
+            removed: Records of deleted entries
+            retagged: (entry ID, old tags, new tags) for entries whose tags changed
+        """
+        completions = CompletionCache.load(self.completions_file, before)
+        if completions is None:
+            completions = CompletionCache.build(data["entries"])
+        else:
+            for record in removed:
+                completions.remove(record)
+            for _, old, new in retagged:
+                completions.retag(old, new)
+            for record in added:
+                completions.add(record)
+            completions.set_recent(data["entries"])
+        try:
+            completions.save(self.completions_file, self._signature)
+        except OSError:
+            pass  # Completion is a convenience
+    
+    @phase_of("index")
+    def get_trends(self, by: str = "project", bucket: str = "day",
+                   since: Optional[str] = None) -> Rollup:
+        """
+        Count errors per group and hour or day.
+        
+        Args:
+            by: "project", "tag", "command" (program name) or "exit" (exit code)
+            bucket: "hour" or "day"
+            since: ISO timestamp to start from (default: the oldest error)
+            
+        Returns:
+            Counts per group and bucket up to now, busiest group first
+        """
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                trends = TrendCache.load(self.trends_file, reader.signature)
+                if trends is None:
+                    trends = TrendCache.build(reader.records())
+                    try:
+                        trends.save(self.trends_file, reader.signature)
+                    except OSError:
+                        pass  # The cache is only an optimization
+        else:
+            with self._lock:
+                data = self._read_data()
+                trends = TrendCache.build(data["entries"])
+        return trends.rollup(by, bucket, since)
+    
+    @phase_of("index")
+    def get_tag_counts(self) -> Dict[str, int]:
+        """Count the entries carrying each tag."""
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                return self._tag_index(reader).counts()
+        return {tag: len(ids) for tag, ids in self._get_index().by_tag.items()}
+    
+    @phase_of("write")
+    def retag(self, renames: Dict[str, Optional[str]]) -> int:
+        """
+        Rename, merge or remove tags across all entries with a single write.
+        
+        Args:
+            renames: Old tag -> new tag, or None to remove it. Several old
+                tags mapping to one new tag merge them.
+            
+        Returns:
+            Number of entries changed
+        """
+        with self._lock:
+            data = self._read_data()
+            before = self._signature
+            changes = []
+            entries = []
+            for record in data["entries"]:
+                old = record.get("tags") or []
+                if any(tag in renames for tag in old):
+                    new = retagged(old, renames)
+                    if new != old:
+                        record = {**record, "tags": new}
+                        changes.append((record["id"], old, new))
+                entries.append(record)
+            if not changes:
+                return 0
+            base, data = data, {**data, "entries": entries}
+            self._write_data(data, base)
+            self._update_solutions(before, data)
+            if self._index is not None:
+                for entry_id, _, new in changes:
+                    self._index.update(entry_id, tags=new)
+            self._update_tag_index(before, changes)
+            self._update_trends(before, retagged=[(entry_id, new) for entry_id, _, new in changes])
+            self._update_completions(before, data, retagged=changes)
+            self._update_vectors(before)
+        return len(changes)
+    
+    @phase_of("index")
+    def suggest_fix(self, command: str, error: str = "") -> Optional[Tuple[int, str]]:
+        """
+        Look up the note of the best matching annotated error.
+        
+        Matches on the error fingerprint first, then the exact command, then
+        the program and subcommand.
+        
+        Returns:
+            (entry ID, note), or None if nothing matches
+        """
+        solutions = SolutionIndex.load(self.solutions_file, self._file_signature())
+        if solutions is None:
+            with self._lock:
+                solutions = SolutionIndex.build(self._read_data()["entries"])
+                try:
+                    solutions.save(self.solutions_file, self._signature)
+                except OSError:
+                    pass
+        return solutions.lookup(command, error)
+    
+    def _sync_vectors(self) -> VectorStore:
+        """
+        The vector cache for the store as it is now, loaded from vectors.bin or,
+        if that was written for another version of the store, rebuilt (and saved).
+        """
+        reader = self._open_reader()
+        if reader is not None:
+            with reader:
+                signature = reader.signature
+                vectors = self._cached_vectors(signature)
+                if vectors is None:
+                    vectors = self._build_vectors(reader.records(), reader.next_id, signature)
+        else:
+            data = self._read_data()
+            signature = self._signature
+            vectors = self._cached_vectors(signature)
+            if vectors is None:
+                vectors = self._build_vectors(data["entries"], data["next_id"], signature)
+        self._vectors, self._vectors_signature = vectors, signature
+        return vectors
+    
+    def _build_vectors(self, records: Iterable[Dict[str, Any]], next_id: int,
+                       signature: Optional[Tuple[int, int, int]]) -> VectorStore:
+        """Embed every record and save the vectors for the data file with `signature`."""
+        vectors = VectorStore()
+        for record in records:
+            vectors.add(record["id"], record["error"])
+        vectors.next_id = max(vectors.next_id, next_id)
+        if signature is not None:
+            try:
+                vectors.save(self.vectors_file, signature)
+            except OSError:
+                pass  # The cache is only an optimization
+        return vectors
+    
+    def _cached_vectors(self, signature: Optional[Tuple[int, int, int]]) -> Optional[VectorStore]:
+        """The vectors held in memory or saved for the data file with `signature`, if any."""
+        if self._vectors is not None and signature is not None \
+                and self._vectors_signature == signature:
+            return self._vectors
+        return VectorStore.load(self.vectors_file, signature)
+    
+    def _update_vectors(self, before: Optional[Tuple[int, int, int]],
+                        added: Iterable[Tuple[int, str]] = (),
+                        removed: Iterable[int] = ()) -> None:
+        """
+        Patch the vector cache after a write, if it matched the store before
+        it (see `_update_tag_index`); otherwise it is rebuilt on next use.
+        
+        Args:
+            before: Signature of the data file before the write
+            added: (entry ID, error) for each entry added
+            removed: IDs of the entries deleted
+        """
+        vectors = self._cached_vectors(before)
+        if vectors is None:
+            self._vectors = self._vectors_signature = None
+            return
+        vectors.remove(removed)
+        for entry_id, error in added:
+            vectors.add(entry_id, error)
+        try:
+            vectors.save(self.vectors_file, self._signature)
+        except OSError:
+            pass
+        self._vectors, self._vectors_signature = vectors, self._signature
+    
+    @phase_of("index")
+    def rebuild_vectors(self) -> int:
+        """Discard the vector cache and embed every entry again; return the row count."""
+        with self._lock:
+            try:
+                self.vectors_file.unlink()
+            except FileNotFoundError:
+                pass
+            self._vectors = self._vectors_signature = None
+            return len(self._sync_vectors())
+    
+    @phase_of("index")
+    def similar_entries(self, text: str, limit: int = 5, min_score: float = 0.2,
+                        exclude_id: Optional[int] = None) -> List[Tuple[ErrorEntry, float]]:
+        """
+        Find past errors whose message is most similar to `text`.
+        
+        Args:
+            text: Error text to look up
+            limit: Maximum number of results
+            min_score: Minimum cosine similarity (0.0 to 1.0)
+            exclude_id: Entry ID to leave out (e.g. the entry just saved)
+            
+        Returns:
+            (entry, score) pairs, most similar first
+        """
+        with self._lock:
+            vectors = self._sync_vectors()
+            exclude = () if exclude_id is None else (exclude_id,)
+            hits = vectors.nearest(text, limit=limit, min_score=min_score, exclude=exclude)
+            results = [(self.get_entry_by_id(entry_id), score) for entry_id, score in hits]
+            # The cache matches the store it was read with; another process may
+            # have deleted an entry since
+            return [(entry, score) for entry, score in results if entry is not None]
+    
+    def record_outcomes(self, outcomes: Iterable[Tuple[str, bool, Optional[float]]]) -> None:
+        """
+        Log command outcomes for `get_flaky_commands`.
+        
+        Args:
+            outcomes: (command, failed, unix time or None for now) for each run
+        """
+        now = datetime.now().timestamp()
+        try:
+            append_outcomes(self.outcomes_file, ((self.redact(command), failed,
+                                                  now if timestamp is None else timestamp)
+                                                 for command, failed, timestamp in outcomes))
+        except OSError:
+            pass  # Outcome history is best-effort; never fail the command over it
+    
+    def record_outcome(self, command: str, failed: bool, timestamp: Optional[float] = None) -> None:
+        """Log one command outcome (see `record_outcomes`)."""
+        self.record_outcomes([(command, failed, timestamp)])
+    
+    @phase_of("index")
+    def get_flaky_commands(self, min_runs: int = 4) -> List[CommandStats]:
+        """
+        Rank commands by how intermittently they fail.
+        
+        Only the outcomes logged since the last call are read; the statistics
+        kept in `flaky_file` are brought up to date and saved again.
+        
+        Args:
+            min_runs: Outcomes a command needs in its window to be ranked
+            
+        Returns:
+            Commands that both passed and failed recently, flakiest first
+        """
+        stats = FlakyIndex.load(self.flaky_file) or FlakyIndex()
+        if stats.sync(self.outcomes_file):
+            try:
+                stats.save(self.flaky_file)
+            except OSError:
+                pass
+        return stats.ranked(min_runs)
+    
+    @property
+    def project_resolver(self) -> ProjectResolver:
+        if self._project_resolver is None:
+            self._project_resolver = ProjectResolver(self.project_rules_file, self.project_cache_file)
+        return self._project_resolver
+    
+    @property
+    def redactor(self) -> Redactor:
+        """The redaction rules in effect, reloaded when the rules file changes."""
+        try:
+            stamp = self.redact_rules_file.stat().st_mtime_ns
+        except OSError:
+            stamp = 0
+        if self._redactor is None or self._redactor[0] != stamp:
+            self._redactor = (stamp, Redactor.from_file(self.redact_rules_file))
+        return self._redactor[1]
+    
+    def redact(self, text: str) -> str:
+        """
+        Mask the secrets in `text` (tokens, keys, passwords in URLs and
+        assignments) with `[REDACTED:<rule>]`. Applied to every command and
+        error before it is stored.
+        """
+        return self.redactor.redact(text)
+    
+    def detect_project(self, directory: str) -> str:
+        """
+        Work out the project of `directory` from the path rules, the nearest
+        pyproject.toml/package.json or the git checkout it is in.
+        
+        Returns:
+            The project name, or "" if nothing identifies one
+        """
+        resolver = self.project_resolver
+        project = resolver.detect(directory).project
+        try:
+            resolver.save()
+        except OSError:
+            pass  # Only a cache
+        return project
+    
+    @phase_of("index")
     def get_entries_by_project(self, project: str) -> List[ErrorEntry]:
         """Get all entries for a specific project."""
         entries = self.get_all_entries()
         return [e for e in entries if e.project.lower() == project.lower()]
     
+    @phase_of("index")
     def get_all_projects(self) -> List[str]:
         """Get a list of all unique project names."""
-        entries = self.get_all_entries()
         projects = set()
-        for entry in entries:
+        for entry in self._get_index().entries:
             if entry.project:
                 projects.add(entry.project)
         return sorted(list(projects))
     
+    @phase_of("index")
+    def get_project_summaries(self) -> List[Dict[str, Any]]:
+        """
+        Summarize every project in one pass over the store.
+        
+        Returns:
+            One {"project", "errors", "latest"} dict per project name, sorted by
+            name; counts and latest timestamps match case-insensitively, like
+            `get_entries_by_project`
+        """
+        names = set()
+        counts: Dict[str, int] = {}
+        latest: Dict[str, str] = {}
+        for entry in self._get_index().entries:
+            if not entry.project:
+                continue
+            names.add(entry.project)
+            key = entry.project.lower()
+            counts[key] = counts.get(key, 0) + 1
+            if entry.timestamp > latest.get(key, ""):
+                latest[key] = entry.timestamp
+        return [{"project": name, "errors": counts[name.lower()], "latest": latest[name.lower()]}
+                for name in sorted(names)]
+    
+    @phase_of("write")
+    def repair_ids(self) -> Tuple[int, int]:
+        """
+        Give entries that share an ID fresh ones and move `next_id` past every ID.
+        
+        Returns:
+            (entries renumbered, next ID)
+        """
+        with self._lock:
+            data = self._read_data()
+            seen = set()
+            next_id = max([data["next_id"], *(record["id"] + 1 for record in data["entries"])])
+            renumbered = 0
+            entries = []
+            for record in data["entries"]:
+                if record["id"] in seen:
+                    record = {**record, "id": next_id}
+                    next_id += 1
+                    renumbered += 1
+                seen.add(record["id"])
+                entries.append(record)
+            data = {**data, "entries": entries, "next_id": next_id}
+            self._write_data(data)
+            self._update_solutions(None, data)
+            if renumbered:
+                self._update_completions(None, data)
+        return renumbered, next_id
+    
+    @phase_of("write")
     def clear_all(self) -> int:
         """Clear all entries and return count of deleted entries."""
-        data = self._read_data()
-        count = len(data["entries"])
-        self._write_data({"entries": [], "next_id": 1})
+        with self._lock:
+            data = self._read_data()
+            count = len(data["entries"])
+            self._write_data({"entries": [], "next_id": 1})
+            self._vectors = self._vectors_signature = None
+            for path in (self.vectors_file, self.solutions_file, self.tags_file, self.dirs_file,
+                         self.trends_file, self.completions_file):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
         return count
@@ -0,0 +1,137 @@
+"""
+Tag postings for one-shot commands, cached in `tags.bin` next to the data file.
+
+Each tag maps to the IDs of the entries carrying it, ascending, in an
+`array('q')`. Filtering by tag then touches only the matching records (found
+by ID in the memory-mapped store) instead of decoding every entry, and
+several tag filters combine by intersecting their postings.
+
+The file records the signature (mtime, size, inode) of the data file it
+describes. Storage patches it after each write it makes; an index that does
+not match the store (written by another program, or never built) is ignored
+and rebuilt from the raw record lines on next use.
+"""
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .recordfile import ID_RE, record_tags
+
+FORMAT_VERSION = 1
+
+_MAGIC = b"NOTEERRT"
+# magic, version, byte order, data file mtime, size and inode, tag count
+_HEADER = struct.Struct("<8sHcxqqqI")
+# tag name length in bytes, number of IDs
+_POSTING = struct.Struct("<Iq")
+
+_EMPTY = array("q")
+
+
+class TagIndex:
+    """Tag -> ascending entry IDs."""
+
+    MAGIC = _MAGIC
+
+    def __init__(self, postings: Optional[Dict[str, array]] = None):
+        self.postings: Dict[str, array] = postings or {}
+
+    @classmethod
+    def build(cls, records: Iterable[Dict]) -> 'TagIndex':
+        """Index raw entry dictionaries."""
+        index = cls()
+        for record in records:
+            index.add(record["id"], record.get("tags") or [])
+        return index
+
+    @classmethod
+    def build_from_lines(cls, lines: Iterable[bytes]) -> 'TagIndex':
+        """Index raw record lines, reading only their ID and tags."""
+        index = cls()
+        for line in lines:
+            match = ID_RE.match(line)
+            tags = record_tags(line) if match else None
+            if tags:
+                index.add(int(match.group(1)), tags)
+        return index
+
+    def ids(self, tag: str) -> Sequence[int]:
+        return self.postings.get(tag, _EMPTY)
+
+    def counts(self) -> Dict[str, int]:
+        return {tag: len(ids) for tag, ids in self.postings.items()}
+
+    def add(self, entry_id: int, tags: Iterable[str]) -> None:
+        for tag in set(tags):
+            ids = self.postings.get(tag)
+            if ids is None:
+                self.postings[tag] = array("q", [entry_id])
+            elif not ids or ids[-1] < entry_id:
+                ids.append(entry_id)
+            else:
+                i = bisect_left(ids, entry_id)
+                if i == len(ids) or ids[i] != entry_id:
+                    ids.insert(i, entry_id)
+
+    def remove(self, entry_id: int, tags: Iterable[str]) -> None:
+        for tag in set(tags):
+            ids = self.postings.get(tag)
+            if ids is None:
+                continue
+            i = bisect_left(ids, entry_id)
+            if i < len(ids) and ids[i] == entry_id:
+                del ids[i]
+            if not ids:
+                del self.postings[tag]
+
+    def save(self, path: Path, signature: Tuple[int, int, int]) -> None:
+        """Write the postings for the data file with `signature`, atomically."""
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(self.MAGIC, FORMAT_VERSION, sys.byteorder[0].encode("ascii"),
+                                 *signature, len(self.postings)))
+            for tag, ids in self.postings.items():
+                name = tag.encode("utf-8")
+                f.write(_POSTING.pack(len(name), len(ids)))
+                f.write(name)
+                ids.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, signature: Optional[Tuple[int, int, int]]) -> Optional['TagIndex']:
+        """Read postings saved by `save`, or None if missing, incompatible or not for `signature`."""
+        if signature is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return None
+                magic, version, byteorder, *saved, count = _HEADER.unpack(header)
+                if (magic != cls.MAGIC or version != FORMAT_VERSION or tuple(saved) != tuple(signature)
+                        or byteorder != sys.byteorder[0].encode("ascii")):
+                    return None
+                postings = {}
+                for _ in range(count):
+                    size, length = _POSTING.unpack(f.read(_POSTING.size))
+                    ids = array("q")
+                    tag = f.read(size).decode("utf-8")
+                    ids.fromfile(f, length)
+                    postings[tag] = ids
+        except (OSError, EOFError, ValueError, struct.error):
+            return None
+        return cls(postings)
+
+
+def retagged(tags: List[str], renames: Dict[str, Optional[str]]) -> List[str]:
+    """Apply `renames` (old tag -> new tag, or None to drop it) to a tag list, without repeats."""
+    result = []
+    for tag in tags:
+        tag = renames.get(tag, tag)
+        if tag is not None and tag not in result:
+            result.append(tag)
+    return result
@@ -0,0 +1,227 @@
+"""
+Regex and typo-tolerant (fuzzy) search over command and error text.
+
+Both modes narrow the entries to check with trigrams before running the
+expensive matcher:
+
+- regex: every literal run the pattern requires contributes trigrams; only
+  entries containing all of them can match.
+- fuzzy: an occurrence within edit distance k of the query shares at least
+  (distinct query trigrams - 3k) trigrams with it, since one edit touches at
+  most three trigrams.
+
+On a warm `StoreIndex` candidates come from its trigram postings; on the
+memory-mapped path the same trigrams are checked against raw record lines.
+"""
+import re
+from typing import Iterable, Iterator, List, Optional, Set
+
+from .index import StoreIndex, trigrams
+from .models import ErrorEntry
+from .query import QueryError, raw_needle
+from .recordfile import decode_line
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+_REPEATS = tuple(op for op in (getattr(sre_constants, name, None) for name in
+                               ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")) if op is not None)
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+
+
+def required_literals(pattern: str) -> List[str]:
+    """
+    Return literal strings (lowercased) that any match of `pattern` must contain.
+
+    Alternations, character classes and optional parts contribute nothing, so
+    the result is always a safe (possibly empty) necessary condition.
+    """
+    literals = []
+
+    def walk(items):
+        run = []
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                run.append(chr(av))
+                continue
+            if run:
+                literals.append("".join(run))
+                run = []
+            if op is sre_constants.SUBPATTERN:
+                walk(av[-1])
+            elif op in _REPEATS and av[0] >= 1:
+                walk(av[2])
+            elif _ATOMIC_GROUP is not None and op is _ATOMIC_GROUP:
+                walk(av)
+        if run:
+            literals.append("".join(run))
+
+    walk(sre_parse.parse(pattern))
+    return [literal.lower() for literal in literals]
+
+
+def fuzzy_find(pattern: str, text: str, max_distance: int) -> bool:
+    """
+    Check whether `text` contains a substring within `max_distance` edits of
+    `pattern`, using Myers' bit-parallel approximate matching (one pass over
+    `text`, independent of the pattern length).
+    """
+    m = len(pattern)
+    if m == 0 or max_distance >= m:
+        return True
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    peq = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    pv, mv, score = full, 0, m
+    for c in text:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+        if score <= max_distance:
+            return True
+    return False
+
+
+class _TextMatcher:
+    """
+    Shared execution for the text matchers.
+
+    Subclasses provide `matches`, `candidate_ids` and `raw_filter`; like
+    `QueryPlan`, `strategy` and `candidates` record the access path used.
+    """
+    mode = ""
+    strategy = "full scan"
+    candidates: Optional[int] = None
+
+    def run(self, index: StoreIndex, limit: Optional[int] = None) -> List[ErrorEntry]:
+        """Execute against the in-memory index; results are newest first."""
+        ids = self.candidate_ids(index)
+        if ids is None:
+            self.strategy, self.candidates = "full scan", len(index.entries)
+            candidates: Iterable[ErrorEntry] = list(reversed(index.entries))
+        else:
+            self.strategy, self.candidates = "trigram index", len(ids)
+            candidates = [index.by_id[i] for i in sorted(ids, reverse=True)]
+        return take_matches(candidates, self, limit)
+
+    def run_lines(self, lines: Iterable[bytes], limit: Optional[int] = None) -> List[ErrorEntry]:
+        """Execute over raw record lines streamed newest first, decoding only survivors."""
+        self.strategy, self.candidates = "stream", None
+
+        def decoded() -> Iterator[ErrorEntry]:
+            for line in lines:
+                if line and self.raw_filter(line.lower()):
+                    record = decode_line(line)
+                    if record is not None:
+                        yield ErrorEntry.from_dict(record)
+
+        return take_matches(decoded(), self, limit)
+
+    def describe(self) -> str:
+        access = self.strategy
+        if self.candidates is not None:
+            access += f", {self.candidates} candidate(s)"
+        return f"{access}; {self.mode}"
+
+
+class RegexMatcher(_TextMatcher):
+    """Case-insensitive regex over an entry's command and error."""
+
+    def __init__(self, pattern: str):
+        self.mode = f"regex /{pattern}/"
+        try:
+            self.regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise QueryError(f"Invalid regex: {e}") from None
+        self.literals = required_literals(pattern)
+        self.grams = set().union(*(trigrams(literal) for literal in self.literals))
+        self.needles = [n for n in (raw_needle(literal) for literal in self.literals) if n]
+
+    def matches(self, entry: ErrorEntry) -> bool:
+        return bool(self.regex.search(entry.command) or self.regex.search(entry.error))
+
+    def candidate_ids(self, index: StoreIndex) -> Optional[Set[int]]:
+        """IDs containing every required trigram, or None to scan everything."""
+        if not self.grams:
+            return None
+        postings = index.trigram_postings()
+        sets = sorted((postings.get(gram, set()) for gram in self.grams), key=len)
+        result = set(sets[0])
+        for ids in sets[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def raw_filter(self, lowered_line: bytes) -> bool:
+        return all(needle in lowered_line for needle in self.needles)
+
+
+class FuzzyMatcher(_TextMatcher):
+    """Typo-tolerant substring match over an entry's command and error."""
+
+    def __init__(self, text: str, max_distance: Optional[int] = None):
+        self.text = text.lower().strip()
+        if max_distance is None:
+            max_distance = max(1, min(3, len(self.text) // 5))
+        self.max_distance = max_distance
+        self.mode = f'fuzzy "{self.text}" (max distance {max_distance})'
+        self.grams = trigrams(self.text)
+        self.threshold = len(self.grams) - 3 * max_distance
+        # Trigrams JSON would escape can't be checked on raw lines;
+        # count them as present so the raw filter never drops a match
+        self._raw_grams = [n for n in (raw_needle(g) for g in self.grams) if n]
+        self._raw_threshold = self.threshold - (len(self.grams) - len(self._raw_grams))
+
+    def matches(self, entry: ErrorEntry) -> bool:
+        return (fuzzy_find(self.text, entry.command.lower(), self.max_distance)
+                or fuzzy_find(self.text, entry.error.lower(), self.max_distance))
+
+    def candidate_ids(self, index: StoreIndex) -> Optional[Set[int]]:
+        """IDs sharing enough trigrams with the query, or None to scan everything."""
+        if self.threshold <= 0:
+            return None
+        postings = index.trigram_postings()
+        counts = {}
+        for gram in self.grams:
+            for entry_id in postings.get(gram, ()):
+                counts[entry_id] = counts.get(entry_id, 0) + 1
+        return {entry_id for entry_id, count in counts.items() if count >= self.threshold}
+
+    def raw_filter(self, lowered_line: bytes) -> bool:
+        if self._raw_threshold <= 0:
+            return True
+        found = 0
+        for gram in self._raw_grams:
+            if gram in lowered_line:
+                found += 1
+                if found >= self._raw_threshold:
+                    return True
+        return False
+
+
+def take_matches(candidates: Iterable[ErrorEntry], matcher, limit: Optional[int]) -> List[ErrorEntry]:
+    """Verify candidates with `matcher` until `limit` matches are found."""
+    result = []
+    for entry in candidates:
+        if matcher.matches(entry):
+            result.append(entry)
+            if limit is not None and len(result) >= limit:
+                break
+    return result
@@ -0,0 +1,252 @@
+"""
+Columnar cache behind `stats --trend`, kept in `trends.bin` next to the data file.
+
+Each entry is one row: its ID, its timestamp in seconds and a small integer
+code for its project, command head (the program name) and exit code; each
+code indexes a table of names. Tags are many-to-one, so they get their own
+columns of (entry ID, timestamp, tag code) pairs. Counting errors per group
+and per hour or day is then a single grouped count over two integer columns:
+`numpy.bincount` when NumPy is installed, a Counter loop otherwise.
+
+Like the tag index, the file records the signature of the data file it
+describes. Storage patches it after each of its own writes (new rows are
+appended, deleted ones dropped, changed tags replaced); a cache that doesn't
+match the store is ignored and rebuilt on next use.
+"""
+import json
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .similarity import _get_numpy
+
+FORMAT_VERSION = 2
+DIMENSIONS = ("project", "tag", "command", "exit")
+BUCKETS = {"hour": 3600, "day": 86400}
+
+_MAGIC = b"NOTEERRR"
+# magic, version, byte order, data file mtime, size and inode, rows, tag pairs
+_HEADER = struct.Struct("<8sHcxqqqqq")
+# bytes of each name table (a JSON array: names may hold any character, NUL included)
+_NAMES = struct.Struct("<qqqq")
+_EPOCH = datetime(1970, 1, 1)
+_CODED = ("project", "command", "exit")
+
+
+def wall_seconds(timestamp: str) -> int:
+    """
+    Seconds from 1970-01-01 to an entry's timestamp, read as wall-clock time,
+    so hours and days are bucketed as the user saw them.
+    """
+    return int((datetime.fromisoformat(timestamp).replace(tzinfo=None) - _EPOCH).total_seconds())
+
+
+def command_head(command: str) -> str:
+    """The program a command runs: its first word that isn't a VAR=value assignment."""
+    for word in command.split():
+        if "=" in word and not word.startswith(("-", "/", ".")):
+            continue
+        return os.path.basename(word) or word
+    return ""
+
+
+@dataclass
+class Rollup:
+    """Error counts per group and time bucket."""
+    by: str
+    bucket: str
+    start: datetime
+    # (group name, counts per bucket oldest first), busiest group first
+    groups: List[Tuple[str, List[int]]]
+
+    @property
+    def buckets(self) -> int:
+        return len(self.groups[0][1]) if self.groups else 0
+
+
+class TrendCache:
+    """One row per entry, in columns."""
+
+    def __init__(self):
+        self.ids = array("q")
+        self.stamps = array("q")
+        self.codes: Dict[str, array] = {dim: array("i") for dim in _CODED}
+        self.tag_ids = array("q")
+        self.tag_stamps = array("q")
+        self.tag_codes = array("i")
+        self.names: Dict[str, List[str]] = {dim: [] for dim in DIMENSIONS}
+        self._lookup: Dict[str, Dict[str, int]] = {dim: {} for dim in DIMENSIONS}
+
+    @classmethod
+    def build(cls, records: Iterable[Dict]) -> 'TrendCache':
+        """Columns for raw entry dictionaries, oldest first."""
+        cache = cls()
+        for record in records:
+            cache.add(record)
+        return cache
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _code(self, dim: str, name: str) -> int:
+        code = self._lookup[dim].get(name)
+        if code is None:
+            code = self._lookup[dim][name] = len(self.names[dim])
+            self.names[dim].append(name)
+        return code
+
+    def add(self, record: Dict) -> None:
+        """Append the row of a new entry; IDs must keep ascending."""
+        try:
+            stamp = wall_seconds(record["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.ids.append(record["id"])
+        self.stamps.append(stamp)
+        self.codes["project"].append(self._code("project", record.get("project") or ""))
+        self.codes["command"].append(self._code("command", command_head(record.get("command") or "")))
+        self.codes["exit"].append(self._code("exit", str(record.get("exit_code", ""))))
+        self._add_tags(record["id"], stamp, record.get("tags") or [])
+
+    def _add_tags(self, entry_id: int, stamp: int, tags: Iterable[str]) -> None:
+        for tag in dict.fromkeys(tags):
+            self.tag_ids.append(entry_id)
+            self.tag_stamps.append(stamp)
+            self.tag_codes.append(self._code("tag", tag))
+
+    def _drop_tags(self, entry_ids: set) -> None:
+        keep = [i for i, entry_id in enumerate(self.tag_ids) if entry_id not in entry_ids]
+        if len(keep) == len(self.tag_ids):
+            return
+        for name in ("tag_ids", "tag_stamps", "tag_codes"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in keep]))
+
+    def remove(self, entry_ids: Iterable[int]) -> None:
+        """Drop the rows of deleted entries."""
+        doomed = set(entry_ids)
+        if not doomed:
+            return
+        keep = [i for i, entry_id in enumerate(self.ids) if entry_id not in doomed]
+        self.ids = array("q", [self.ids[i] for i in keep])
+        self.stamps = array("q", [self.stamps[i] for i in keep])
+        for dim, column in self.codes.items():
+            self.codes[dim] = array("i", [column[i] for i in keep])
+        self._drop_tags(doomed)
+
+    def retag(self, changes: Iterable[Tuple[int, List[str]]]) -> None:
+        """Replace the tags of entries, given (entry ID, new tags) pairs."""
+        changes = dict(changes)
+        if not changes:
+            return
+        self._drop_tags(set(changes))
+        for entry_id, tags in changes.items():
+            row = bisect_left(self.ids, entry_id)
+            if row < len(self.ids) and self.ids[row] == entry_id:
+                self._add_tags(entry_id, self.stamps[row], tags)
+
+    def rollup(self, by: str, bucket: str, since: Optional[str] = None,
+               until: Optional[str] = None) -> Rollup:
+        """
+        Count errors per `by` group and time bucket.
+
+        Args:
+            by: One of DIMENSIONS
+            bucket: "hour" or "day"
+            since: ISO timestamp of the first bucket (default: the oldest entry)
+            until: ISO timestamp of the last bucket (default: now)
+
+        Returns:
+            Counts for each group with errors in the range, busiest first
+        """
+        width = BUCKETS[bucket]
+        if by == "tag":
+            stamps, codes = self.tag_stamps, self.tag_codes
+        else:
+            stamps, codes = self.stamps, self.codes[by]
+        names = self.names[by]
+        last = (wall_seconds(until or datetime.now().isoformat())) // width
+        if since is not None:
+            first = wall_seconds(since) // width
+        else:
+            first = (min(stamps) if stamps else last * width) // width
+        size = max(last - first + 1, 1)
+
+        np = _get_numpy()
+        if np is not None and stamps:
+            slots = np.frombuffer(stamps, dtype=np.int64) // width - first
+            group = np.frombuffer(codes, dtype=np.int32)
+            inside = (slots >= 0) & (slots < size)
+            keys = group[inside].astype(np.int64) * size + slots[inside]
+            grid = np.bincount(keys, minlength=len(names) * size).reshape(len(names), size)
+            totals = grid.sum(axis=1)
+            order = np.argsort(-totals, kind="stable")
+            groups = [(names[code], grid[code].tolist()) for code in order if totals[code]]
+        else:
+            counts = Counter()
+            for stamp, code in zip(stamps, codes):
+                slot = stamp // width - first
+                if 0 <= slot < size:
+                    counts[code * size + slot] += 1
+            rows: Dict[int, List[int]] = {}
+            for key, count in counts.items():
+                code, slot = divmod(key, size)
+                rows.setdefault(code, [0] * size)[slot] = count
+            groups = sorted(((names[code], row) for code, row in rows.items()),
+                            key=lambda group: -sum(group[1]))
+        return Rollup(by, bucket, _EPOCH + timedelta(seconds=first * width), groups)
+
+    def save(self, path: Path, signature: Tuple[int, int, int]) -> None:
+        """Write the columns for the data file with `signature`, atomically."""
+        blobs = [json.dumps(self.names[dim]).encode("ascii") for dim in DIMENSIONS]
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, sys.byteorder[0].encode("ascii"),
+                                 *signature, len(self.ids), len(self.tag_ids)))
+            f.write(_NAMES.pack(*(len(blob) for blob in blobs)))
+            for blob in blobs:
+                f.write(blob)
+            for column in (self.ids, self.stamps, *(self.codes[dim] for dim in _CODED),
+                           self.tag_ids, self.tag_stamps, self.tag_codes):
+                column.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, signature: Optional[Tuple[int, int, int]]) -> Optional['TrendCache']:
+        """Read columns saved by `save`, or None if missing, incompatible or not for `signature`."""
+        if signature is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return None
+                magic, version, byteorder, *saved, rows, pairs = _HEADER.unpack(header)
+                if (magic != _MAGIC or version != FORMAT_VERSION or tuple(saved) != tuple(signature)
+                        or byteorder != sys.byteorder[0].encode("ascii")):
+                    return None
+                cache = cls()
+                sizes = _NAMES.unpack(f.read(_NAMES.size))
+                for dim, size in zip(DIMENSIONS, sizes):
+                    names = json.loads(f.read(size))
+                    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+                        return None
+                    cache.names[dim] = names
+                    cache._lookup[dim] = {name: code for code, name in enumerate(names)}
+                cache.ids.fromfile(f, rows)
+                cache.stamps.fromfile(f, rows)
+                for dim in _CODED:
+                    cache.codes[dim].fromfile(f, rows)
+                cache.tag_ids.fromfile(f, pairs)
+                cache.tag_stamps.fromfile(f, pairs)
+                cache.tag_codes.fromfile(f, pairs)
+        except (OSError, EOFError, ValueError, struct.error):
+            return None
+        return cache
@@ -46,8 +46,16 @@ def truncate_text(text: str, max_length: int = 100) -> str:
 
 def extract_first_line(text: str) -> str:
     """Extract the first non-empty line from text."""
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    return lines[0] if lines else text
+    # Scan line by line instead of splitting long outputs up front
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        line = (text[start:] if end < 0 else text[start:end]).strip()
+        if line:
+            return line
+        if end < 0:
+            return text
+        start = end + 1
 
 
 def run_command(command: str, cwd: Optional[str] = None) -> Tuple[int, str, str]:
@@ -92,6 +100,19 @@ def parse_tags(tag_string: str) -> list:
     return [tag.strip() for tag in tag_string.split(',') if tag.strip()]
 
 
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: list, width: int = 0) -> str:
+    """Draw counts as block characters (blank for zero), summing neighbours to fit `width`."""
+    if width and len(values) > width:
+        step = -(-len(values) // width)
+        values = [sum(values[i:i + step]) for i in range(0, len(values), step)]
+    peak = max(values, default=0)
+    levels = len(SPARK_CHARS)
+    return "".join(SPARK_CHARS[-(-v * levels // peak) - 1] if v else " " for v in values)
+
+
 def get_terminal_width() -> int:
     """Get the current terminal width."""
     try:
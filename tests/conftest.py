@@ -0,0 +1,18 @@
+"""Shared fixtures: every test gets its own store in a temporary directory."""
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from noteerr.storage import Storage  # noqa: E402
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """An empty store under tmp_path, with HOME pointed there too."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return Storage(tmp_path / ".noteerr" / "errors.json")
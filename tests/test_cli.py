@@ -0,0 +1,143 @@
+import importlib
+import re
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+
+@pytest.fixture
+def cli(storage, monkeypatch):
+    """The CLI module, importing it (and its module-level Storage) under the test HOME."""
+    module = importlib.import_module("noteerr.cli")
+    monkeypatch.setattr(module, "storage", storage)
+    return module.cli
+
+
+@pytest.mark.parametrize("args", [
+    ["list", "-n", "-1"],
+    ["list", "--limit", "0"],
+    ["search", "make", "-n", "0"],
+    ["list", "--offset", "-1"],
+    ["search", "make", "--page", "0"],
+])
+def test_out_of_range_paging_is_a_usage_error(cli, args):
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 2
+    assert "Invalid value" in result.output
+
+
+def test_list_pages(cli, storage):
+    for i in range(5):
+        storage.add_entry(command=f"make {i}", error="boom", exit_code=1, directory="/src")
+    result = CliRunner().invoke(cli, ["list", "-n", "2", "--page", "2", "--plain"])
+    assert result.exit_code == 0
+    assert [line.split("\t")[0] for line in result.output.splitlines()] == ["3", "2"]
+
+
+@pytest.mark.parametrize("script", ["bash-integration.sh", "zsh-integration.sh"])
+def test_shell_completion_lists_every_command(cli, script):
+    text = (Path(__file__).parents[1] / "scripts" / script).read_text()
+    listed = re.search(r'_noteerr_commands="([^"]*)"', text).group(1).split()
+    assert listed == sorted(cli.commands)
+
+
+@pytest.fixture
+def filled(storage):
+    """Eight errors in two projects, the first four from 2025."""
+    storage.add_entries([{
+        "timestamp": f"{2025 if i < 4 else 2026}-03-0{i + 1}T10:00:00",
+        "command": f"make {i}", "error": "disk full" if i % 2 else "timeout",
+        "exit_code": 1, "directory": "/src", "project": "api" if i < 6 else "web",
+        "tags": ["ci"] if i % 3 == 0 else [],
+    } for i in range(8)])
+    return storage
+
+
+@pytest.fixture
+def writes(storage, monkeypatch):
+    """Count the store writes a command makes."""
+    count = []
+    write = storage._write_data
+    monkeypatch.setattr(storage, "_write_data", lambda *a, **kw: (count.append(1), write(*a, **kw)))
+    return count
+
+
+def ids(storage):
+    return [entry.id for entry in storage.get_all_entries()]
+
+
+def test_delete_dry_run_changes_nothing(cli, filled, writes):
+    result = CliRunner().invoke(cli, ["delete", "--project", "api", "--before", "2026-01-01",
+                                      "--dry-run"])
+    assert result.exit_code == 0, result.output
+    assert "4 error(s) would be deleted" in result.output
+    assert ids(filled) == list(range(1, 9)) and not writes
+
+
+def test_delete_by_selectors_in_one_write(cli, filled, writes):
+    result = CliRunner().invoke(cli, ["delete", "--where", '"disk full"', "--project", "api",
+                                      "-y"])
+    assert result.exit_code == 0, result.output
+    assert "Deleted 3 error(s)" in result.output
+    assert ids(filled) == [1, 3, 5, 7, 8]
+    assert len(writes) == 1
+    # A snapshot to undo it
+    assert (filled.snapshots_dir / "before-delete").is_dir()
+
+
+def test_delete_asks_before_deleting_several(cli, filled, writes):
+    result = CliRunner().invoke(cli, ["delete", "--before", "2026-01-01"], input="n\n")
+    assert result.exit_code == 1 and "Delete 4 errors?" in result.output
+    assert ids(filled) == list(range(1, 9)) and not writes
+
+    result = CliRunner().invoke(cli, ["delete", "--before", "2026-01-01"], input="y\n")
+    assert result.exit_code == 0, result.output
+    assert ids(filled) == [5, 6, 7, 8] and len(writes) == 1
+
+
+def test_delete_ids(cli, filled, writes):
+    result = CliRunner().invoke(cli, ["delete", "2", "4", "99", "4", "-y"])
+    assert result.exit_code == 0, result.output
+    assert "1 of the given IDs not found" in result.output
+    assert ids(filled) == [1, 3, 5, 6, 7, 8] and len(writes) == 1
+
+    result = CliRunner().invoke(cli, ["delete", "1", "--project", "api", "-y"])
+    assert result.exit_code == 1 and "not both" in result.output
+    assert CliRunner().invoke(cli, ["delete"]).exit_code == 2
+
+
+def test_annotate_by_selectors_in_one_write(cli, filled, writes):
+    result = CliRunner().invoke(cli, ["annotate", "free some space", "--where", '"disk full"',
+                                      "--before", "2026-01-01", "--tags", "disk,ci", "-y"])
+    assert result.exit_code == 0, result.output
+    assert "Updated 2 error(s)" in result.output
+    assert len(writes) == 1
+    changed = {e.id: e for e in filled.get_all_entries() if e.notes}
+    assert sorted(changed) == [2, 4]
+    assert all(e.notes == "free some space" and e.tags == ["disk", "ci"] for e in changed.values())
+    # Tag filters see the new tags
+    assert [e.id for e in filled.query_entries("tag:disk")] == [4, 2]
+
+
+def test_annotate_asks_before_changing_several(cli, filled, writes):
+    result = CliRunner().invoke(cli, ["annotate", "--project", "web", "--tags", "flaky"],
+                                input="n\n")
+    assert result.exit_code == 1 and "Update 2 errors?" in result.output
+    assert not writes and not filled.query_entries("tag:flaky")
+
+    result = CliRunner().invoke(cli, ["annotate", "--project", "web", "--tags", "flaky"],
+                                input="y\n")
+    assert result.exit_code == 0, result.output
+    assert [e.id for e in filled.query_entries("tag:flaky")] == [8, 7] and len(writes) == 1
+
+
+@pytest.mark.parametrize("args, message", [
+    (["annotate", "1", "notes", "--project", "api"], "not both"),
+    (["annotate", "--project", "api"], "Give the notes or --tags"),
+    (["annotate", "x", "--project", "nobody"], "No errors match"),
+])
+def test_annotate_selector_mistakes(cli, filled, writes, args, message):
+    result = CliRunner().invoke(cli, args)
+    assert message in result.output
+    assert not writes
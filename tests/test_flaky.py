@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from noteerr import flaky
+from noteerr.flaky import WINDOW, CommandStats, FlakyIndex, _event, append_outcomes
+
+
+def stats_for(outcomes):
+    """CommandStats after `outcomes`, oldest first: 'x' a failure, '.' a pass."""
+    stats = CommandStats("make")
+    for t, outcome in enumerate(outcomes):
+        stats.record(outcome == "x", 1000.0 + t)
+    return stats
+
+
+@pytest.mark.parametrize("outcomes, flips", [
+    ("", 0), ("x", 0), (".", 0), ("xxxx", 0), ("....", 0),
+    ("x.", 1), ("..xx", 1), ("x.x.", 3), ("xx..x", 2), (".x" * 50, WINDOW - 1),
+    ("x" * 70 + "." * 10, 1), ("." * 30 + "x" * 60, 1), ("." * 10 + "x" * WINDOW, 0),
+])
+def test_flips_and_flakiness(outcomes, flips):
+    stats = stats_for(outcomes)
+    window = outcomes[-WINDOW:]
+    assert stats.outcomes() == window
+    assert stats.runs == len(window)
+    assert stats.flips == flips == sum(a != b for a, b in zip(window, window[1:]))
+    assert stats.flakiness == (flips / (len(window) - 1) if len(window) > 1 else 0.0)
+    assert stats.window_failures == window.count("x")
+    assert (stats.failures, stats.successes) == (outcomes.count("x"), outcomes.count("."))
+
+
+def outcomes_log(tmp_path, events):
+    log = tmp_path / "outcomes.log"
+    append_outcomes(log, events)
+    return log
+
+
+EVENTS = [("make test", i % 3 == 0, 1000 + i) for i in range(40)] + \
+         [("pytest -x  tests", i % 2 == 0, 2000 + i) for i in range(30)]
+
+
+def assert_same_stats(index, expected):
+    assert index.commands.keys() == expected.commands.keys()
+    for command, stats in expected.commands.items():
+        assert index.commands[command] == stats
+
+
+def test_sync_waits_for_a_partial_trailing_event(tmp_path):
+    log = outcomes_log(tmp_path, EVENTS[:10])
+    last = _event("cargo build", True, 3000)
+    with open(log, "ab") as f:
+        f.write(last[:5])  # still being appended
+
+    index = FlakyIndex()
+    assert index.sync(log) == 10
+    assert index.offset == log.stat().st_size - 5
+    with open(log, "ab") as f:
+        f.write(last[5:])
+    assert index.sync(log) == 1
+    assert index.commands["cargo build"].failures == 1
+    assert index.sync(log) == 0
+
+
+def test_sync_across_chunk_boundaries(tmp_path, monkeypatch):
+    log = outcomes_log(tmp_path, EVENTS)
+    expected = FlakyIndex()
+    for event in EVENTS:
+        expected.record(flaky.command_key(event[0]), *event[1:])
+
+    # Chunks smaller than an event, and not a multiple of one
+    monkeypatch.setattr(flaky, "_CHUNK", 7)
+    index = FlakyIndex()
+    assert index.sync(log) == len(EVENTS)
+    assert_same_stats(index, expected)
+    assert index.offset == log.stat().st_size
+
+
+def test_replaced_log_is_read_from_its_start(tmp_path):
+    log = outcomes_log(tmp_path, EVENTS)
+    index = FlakyIndex()
+    index.sync(log)
+    index.save(tmp_path / "flaky.bin")
+    before = FlakyIndex.load(tmp_path / "flaky.bin")
+    assert_same_stats(before, index)
+
+    # Rotated: a new, shorter file under the same name
+    new = tmp_path / "new.log"
+    append_outcomes(new, [("make test", False, 5000), ("npm ci", True, 5001)])
+    os.replace(new, log)
+    assert before.sync(log) == 2
+    assert before.log_inode == log.stat().st_ino and before.offset == log.stat().st_size
+    # Statistics from the old log are kept
+    assert before.commands["make test"].successes == index.commands["make test"].successes + 1
+    assert before.commands["npm ci"].failures == 1
+    assert before.commands["pytest -x tests"] == index.commands["pytest -x tests"]
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from noteerr.doctor import ERROR, run_checks
+from noteerr.migrations import (_V2_FIELDS, MIGRATIONS, MigrationError, NewerStoreError,
+                                migrate_file, upgrade_record)
+from noteerr.recordfile import SCHEMA_VERSION, RecordReader, has_checksum, record_intact
+from noteerr.storage import Storage
+
+V1_ENTRIES = [
+    {"id": 1, "timestamp": "2025-01-02T03:04:05", "command": "make", "error": "boom",
+     "exit_code": 2, "directory": "/src"},
+    {"id": 2, "timestamp": "2025-01-03T03:04:05", "command": "npm test", "error": "fail",
+     "exit_code": 1, "directory": "/web", "notes": None, "tags": None, "project": None},
+]
+
+
+def write_v1_store(path):
+    """A store as 1.x wrote it: pretty-printed, no schema, fields missing or null."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"entries": V1_ENTRIES, "next_id": 3}, indent=2))
+
+
+def assert_current_layout(path):
+    with RecordReader(path) as reader:
+        assert reader.is_record_layout
+        assert reader.schema == SCHEMA_VERSION
+        assert reader.next_id == 3
+
+
+def test_legacy_store_is_rewritten_on_first_open(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    path = tmp_path / ".noteerr" / "errors.json"
+    write_v1_store(path)
+    storage = Storage(path)
+    entries = storage.get_all_entries()
+    assert [e.command for e in entries] == ["make", "npm test"]
+    assert entries[1].tags == [] and entries[1].notes == ""
+    assert_current_layout(path)
+
+
+def test_pretty_printed_current_store_is_rewritten(storage):
+    storage.add_entry(command="make", error="boom", exit_code=2, directory="/src")
+    data = {"schema": SCHEMA_VERSION, "next_id": 3, "entries": V1_ENTRIES}
+    storage.data_file.write_text(json.dumps(data, indent=2))
+    assert [e.command for e in storage.get_recent_entries(limit=1)] == ["npm test"]
+    assert_current_layout(storage.data_file)
+
+
+def test_migrate_v1_to_current(tmp_path):
+    path = tmp_path / "errors.json"
+    write_v1_store(path)
+    assert migrate_file(path, chunk_size=64) == 2
+    assert_current_layout(path)
+    with RecordReader(path) as reader:
+        assert all(has_checksum(line) and record_intact(line)
+                   for line in reader.lines(checksums=True))
+        records = list(reader.records())
+    assert [list(r) for r in records] == [["id", *_V2_FIELDS]] * 2
+    assert records[0]["notes"] == "" and records[1]["tags"] == [] and records[1]["project"] == ""
+    assert records[0]["exit_code"] == 2
+    # Already current: left alone
+    assert migrate_file(path) is None
+
+
+def test_migration_steps_cover_every_version():
+    assert sorted(MIGRATIONS) == list(range(1, SCHEMA_VERSION))
+    record = upgrade_record({"id": 5, "command": "make", "extra": "kept"}, 1)
+    assert record["extra"] == "kept" and record["exit_code"] == 1
+
+
+def test_newer_store_is_refused(tmp_path):
+    path = tmp_path / "errors.json"
+    path.write_text('{"schema": 99, "next_id": 1, "entries": [\n]}\n')
+    with pytest.raises(MigrationError):
+        migrate_file(path)
+
+
+def test_storage_refuses_a_newer_store(storage):
+    newer = ('{"schema": 99, "next_id": 2, "entries": [\n'
+             '{"id": 1, "command": "make", "future": true}\n]}\n')
+    storage.data_file.parent.mkdir(parents=True, exist_ok=True)
+    storage.data_file.write_text(newer)
+
+    with pytest.raises(NewerStoreError, match="schema 99"):
+        storage.get_recent_entries(limit=5)
+    with pytest.raises(NewerStoreError):
+        storage.add_entry(command="ls", error="x", exit_code=2, directory="/")
+    # Not downgraded to this release's schema
+    assert storage.data_file.read_text() == newer
+
+    checks = {check.name: check for check in run_checks(storage, fix=True)}
+    assert checks["Data file"].status == ERROR
+    assert storage.data_file.read_text() == newer
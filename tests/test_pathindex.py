@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from noteerr.pathindex import PathIndex, in_directory
+
+DIRECTORIES = ["/", "/a", "/a/b", "/a/b/c", "/a-b", "/a.b", "/a0", "/ab", "/a/b-c", "/b"]
+
+
+def make_index(seed=1, count=200):
+    rng = random.Random(seed)
+    records = [{"id": i, "directory": rng.choice(DIRECTORIES)} for i in range(1, count + 1)]
+    return PathIndex.build(records), records
+
+
+@pytest.mark.parametrize("root, recursive, expected", [
+    ("/", False, ["/"]),
+    ("/", True, DIRECTORIES),
+    ("/a", False, ["/a"]),
+    ("/a", True, ["/a", "/a/b", "/a/b/c", "/a/b-c"]),
+    ("/a/", True, ["/a", "/a/b", "/a/b/c", "/a/b-c"]),
+    ("/a/", False, ["/a"]),
+    ("/a/b", True, ["/a/b", "/a/b/c"]),
+    ("/a-b", True, ["/a-b"]),
+    ("/a.b", True, ["/a.b"]),
+    ("/c", True, []),
+    ("/a/b/c/d", True, []),
+])
+def test_directories(root, recursive, expected):
+    index, records = make_index()
+    assert sorted(index.directories(root, recursive)) == sorted(expected)
+    # The same directories as comparing every entry's path
+    assert sorted({r["directory"] for r in records
+                   if in_directory(r["directory"], root, recursive)}) == sorted(expected)
+
+
+def test_directories_without_the_root_itself():
+    index = PathIndex.build([{"id": 1, "directory": "/srv/app/logs"}, {"id": 2, "directory": "/srv"}])
+    assert index.directories("/srv/app", recursive=True) == ["/srv/app/logs"]
+    assert index.directories("/srv/app") == []
+
+
+@pytest.mark.parametrize("root", ["/", "/a", "/a/b", "/b"])
+def test_recent_ids_are_merged_newest_first(root):
+    index, records = make_index(seed=len(root))
+    expected = [r["id"] for r in reversed(records) if in_directory(r["directory"], root, True)]
+    assert list(index.recent_ids(root, recursive=True)) == expected
+    expected = [r["id"] for r in reversed(records) if r["directory"] == root]
+    assert list(index.recent_ids(root)) == expected
+
+
+def test_keys_are_refreshed_after_changes():
+    index, _ = make_index()
+    assert "/a/new" not in index.directories("/a", recursive=True)
+    index.add(500, "/a/new/")
+    assert list(index.recent_ids("/a/new")) == [500]
+    assert "/a/new" in index.directories("/a", recursive=True)
+    index.remove(500, "/a/new")
+    assert "/a/new" not in index.directories("/a", recursive=True)
@@ -0,0 +1,57 @@
+import os
+
+from noteerr.projects import ProjectResolver
+
+
+def age(*paths):
+    """Backdate `paths` so a change made now is seen even on coarse clocks."""
+    for path in paths:
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+
+
+def test_cached_git_answer_sees_a_nearer_manifest(tmp_path):
+    repo = tmp_path / "myrepo"
+    sub = repo / "sub"
+    (repo / ".git").mkdir(parents=True)
+    sub.mkdir()
+    age(repo, sub)
+    resolver = ProjectResolver(tmp_path / "rules.tsv", tmp_path / "projects.cache")
+    assert resolver.detect(str(sub)).project == "myrepo"
+    resolver.save()
+
+    (repo / "pyproject.toml").write_text('[project]\nname = "realname"\n')
+    resolver = ProjectResolver(tmp_path / "rules.tsv", tmp_path / "projects.cache")
+    detection = resolver.detect(str(sub))
+    assert detection.project == "realname"
+    assert detection.source == str(repo / "pyproject.toml")
+
+
+def test_cached_answer_is_reused_until_something_changes(tmp_path, monkeypatch):
+    repo = tmp_path / "myrepo"
+    (repo / ".git").mkdir(parents=True)
+    (repo / "pyproject.toml").write_text('[project]\nname = "first"\n')
+    age(repo, repo / "pyproject.toml")
+    resolver = ProjectResolver(tmp_path / "rules.tsv", tmp_path / "projects.cache")
+    assert resolver.detect(str(repo)).project == "first"
+    resolver.save()
+
+    resolver = ProjectResolver(tmp_path / "rules.tsv", tmp_path / "projects.cache")
+    monkeypatch.setattr(resolver, "_detect", None)  # Answered from the cache
+    assert resolver.detect(str(repo)).project == "first"
+
+    (repo / "pyproject.toml").write_text('[project]\nname = "second"\n')
+    resolver = ProjectResolver(tmp_path / "rules.tsv", tmp_path / "projects.cache")
+    assert resolver.detect(str(repo)).project == "second"
+
+
+def test_nothing_found_is_rechecked_when_a_parent_gains_a_marker(tmp_path):
+    work = tmp_path / "work" / "deep"
+    work.mkdir(parents=True)
+    age(work, work.parent)
+    resolver = ProjectResolver(tmp_path / "rules.tsv", tmp_path / "projects.cache")
+    assert resolver.detect(str(work)).project == ""
+    resolver.save()
+
+    (work.parent / "package.json").write_text('{"name": "@org/site"}')
+    resolver = ProjectResolver(tmp_path / "rules.tsv", tmp_path / "projects.cache")
+    assert resolver.detect(str(work)).project == "site"
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from noteerr.index import StoreIndex
+from noteerr.query import QueryError, compile_query, parse_query, parse_time
+
+
+def make_index(count=100):
+    """Entries an hour apart; every third in `web`, every tenth tagged docker."""
+    return StoreIndex.from_records({
+        "id": i, "timestamp": (datetime(2026, 1, 1) + timedelta(hours=i)).isoformat(),
+        "command": "make", "error": "no space left on device" if i % 4 == 0 else "failed",
+        "exit_code": 137 if i % 2 == 0 else 1, "directory": "/src", "notes": "",
+        "tags": ["docker"] if i % 10 == 0 else [], "project": "web" if i % 3 == 0 else "api",
+    } for i in range(1, count + 1))
+
+
+def test_parse_filters_and_phrases():
+    query = parse_query('project:api,Web tag:docker exit:137,139 cmd:make "No space left" disk')
+    assert query.projects == [["api", "web"]]
+    assert query.tags == [["docker"]]
+    assert query.exit_codes == [[137, 139]]
+    assert query.commands == ["make"]
+    assert query.terms == ["no space left", "disk"]
+
+
+def test_plain_text_is_one_phrase():
+    assert parse_query("Permission denied").terms == ["permission denied"]
+    # A colon alone doesn't make a filter
+    assert parse_query("error: permission denied").terms == ["error: permission denied"]
+
+
+def test_parse_time():
+    now = datetime(2026, 1, 10, 12, 0)
+    assert parse_time("2d", now=now) == "2026-01-08T12:00:00"
+    assert parse_time("30m", now=now) == "2026-01-10T11:30:00"
+    assert parse_time("2026-01-31") == "2026-01-31T00:00:00"
+    with pytest.raises(QueryError):
+        parse_time("yesterday")
+
+
+def test_invalid_exit_code():
+    with pytest.raises(QueryError):
+        parse_query("exit:oops")
+
+
+@pytest.mark.parametrize("text, strategy, candidates", [
+    ("project:web", "project index (web)", 33),
+    ("project:api tag:docker", "project index (api) & tag index (docker)", 7),
+    ("since:2026-01-04T12:00 exit:137", "time range", 17),
+    ("exit:137", "full scan", 100),
+])
+def test_plan_starts_from_the_most_selective_index(text, strategy, candidates):
+    index = make_index()
+    plan = compile_query(text)
+    results = plan.run(index)
+    assert (plan.strategy, plan.candidates) == (strategy, candidates)
+    # Whatever the access path, it finds what checking every entry finds
+    assert results == [e for e in reversed(index.entries) if plan.matches(e)]
+    assert plan.describe().startswith(f"{strategy}, {candidates} candidate(s)")
+
+
+def test_plan_limit_and_order():
+    results = compile_query('"no space left"').run(make_index(), limit=3)
+    assert len(results) == 3
+    assert [e.timestamp for e in results] == sorted((e.timestamp for e in results), reverse=True)
+
+
+def test_stream_matches_the_index(storage):
+    for i in range(30):
+        storage.add_entry(command=f"make {i}", error="boom" if i % 2 else "no space left",
+                          exit_code=i % 3, directory="/src", tags=["ci"] if i % 5 == 0 else [])
+    storage._data = None  # Force the unindexed path over the raw records
+    streamed = storage.query_entries('tag:ci "no space left"')
+    indexed = compile_query('tag:ci "no space left"').run(storage._get_index())
+    assert [e.id for e in streamed] == [e.id for e in indexed] == [21, 11, 1]
+
+
+def test_bulk_remove_matches_a_rebuild():
+    index = make_index()
+    index.trigram_postings()
+    doomed = [i for i in range(1, 101) if i % 7 == 0 or i in (30, 60, 90)]
+    index.remove_many(doomed + [500])
+    index.remove(1)
+
+    rebuilt = StoreIndex(e for e in make_index().entries if e.id not in doomed and e.id != 1)
+    assert [e.id for e in index.entries] == [e.id for e in rebuilt.entries]
+    assert index.timestamps == rebuilt.timestamps
+    assert index.by_id.keys() == rebuilt.by_id.keys()
+    assert index.by_project == rebuilt.by_project
+    assert index.by_tag == rebuilt.by_tag
+    assert {gram: ids for gram, ids in index.trigram_postings().items() if ids} == \
+        rebuilt.trigram_postings()
+    assert [e.id for e in compile_query("tag:docker").run(index)] == [100, 80, 50, 40, 20, 10]
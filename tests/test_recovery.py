@@ -0,0 +1,68 @@
+from noteerr.recordfile import RecordReader
+from noteerr.recovery import recover_store
+from noteerr.storage import Storage
+
+
+def fill(storage, count=20):
+    for i in range(count):
+        storage.add_entry(command=f"make target{i}", error=f"error {i}", exit_code=1,
+                          directory="/src", tags=["ci"])
+
+
+def test_truncated_store_keeps_the_intact_records(storage):
+    fill(storage)
+    data = storage.data_file.read_bytes()
+    # Cut off in the middle of the 16th record
+    cut = data.index(b'{"id": 16,') + 20
+    storage.data_file.write_bytes(data[:cut])
+
+    recovery = recover_store(storage.data_file)
+    assert (recovery.kept, recovery.damaged) == (15, 1)
+    assert recovery.quarantine.read_bytes().endswith(data[data.index(b'{"id": 16,'):cut] + b"\n")
+    with RecordReader(storage.data_file) as reader:
+        assert [r["id"] for r in reader.records()] == list(range(1, 16))
+        # New entries never reuse an ID that may have been handed out
+        assert reader.next_id == 21
+
+
+def test_bit_flip_loses_only_that_record(storage):
+    fill(storage)
+    data = bytearray(storage.data_file.read_bytes())
+    # Inside the command of entry 7: still valid JSON, caught by the checksum
+    at = data.index(b"make target6")
+    data[at + 5] ^= 0x01
+    storage.data_file.write_bytes(bytes(data))
+
+    recovery = recover_store(storage.data_file)
+    assert (recovery.kept, recovery.damaged) == (19, 1)
+    entries = Storage(storage.data_file).get_all_entries()
+    assert [e.id for e in entries] == [i for i in range(1, 21) if i != 7]
+    assert {e.command for e in entries} == {f"make target{i}" for i in range(20) if i != 6}
+
+
+def test_damaged_store_is_recovered_on_load(storage, capsys):
+    fill(storage)
+    data = storage.data_file.read_bytes()
+    storage.data_file.write_bytes(data[:data.index(b'{"id": 11,') + 10])
+
+    entries = Storage(storage.data_file).get_all_entries()
+    assert [e.id for e in entries] == list(range(1, 11))
+    assert "recovered 10 entries" in capsys.readouterr().err
+    # The next save doesn't overwrite the history
+    Storage(storage.data_file).add_entry(command="ls", error="x", exit_code=2, directory="/")
+    assert len(Storage(storage.data_file).get_all_entries()) == 11
+
+
+def test_edited_record_is_quarantined_not_restamped(storage, capsys):
+    fill(storage)
+    data = storage.data_file.read_bytes()
+    # Still valid JSON: only the checksum tells
+    storage.data_file.write_bytes(data.replace(b"make target3", b"make TARGET3"))
+
+    assert 4 not in [e.id for e in Storage(storage.data_file).get_recent_entries()]
+    Storage(storage.data_file).add_entry(command="ls", error="x", exit_code=2, directory="/")
+    assert "recovered 19 entries" in capsys.readouterr().err
+    assert b"TARGET3" not in storage.data_file.read_bytes()
+    assert b"make TARGET3" in storage.data_file.with_name("errors.json.damaged").read_bytes()
+    entries = Storage(storage.data_file).get_all_entries()
+    assert [e.id for e in entries] == [i for i in range(1, 22) if i != 4]
@@ -0,0 +1,83 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from noteerr.server import QueryServer
+
+
+@pytest.fixture
+def server(storage):
+    server = QueryServer(("127.0.0.1", 0), storage, workers=2)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+JSON = {"Content-Type": "application/json"}
+
+
+def test_post_saves_an_entry(server, storage):
+    status, entry = request(server, "POST", "/entries", json.dumps({"command": "make"}), JSON)
+    assert status == 201
+    assert storage.get_entry_by_id(entry["id"]).command == "make"
+
+
+@pytest.mark.parametrize("body", ["[1, 2]", '"make"', "3"])
+def test_post_body_must_be_an_object(server, body):
+    assert request(server, "POST", "/entries", body, JSON)[0] == 400
+
+
+def test_post_needs_json_content_type(server, storage):
+    form = {"Content-Type": "text/plain"}
+    assert request(server, "POST", "/entries", '{"command": "make"}', form)[0] == 415
+    assert storage.get_all_entries() == []
+
+
+def test_requests_from_other_sites_are_refused(server, storage):
+    body = '{"command": "make"}'
+    assert request(server, "POST", "/entries", body,
+                   {**JSON, "Origin": "http://evil.example"})[0] == 403
+    # DNS rebinding: the browser still sends the attacker's host name
+    assert request(server, "GET", "/entries", headers={"Host": "evil.example:8731"})[0] == 403
+    assert request(server, "POST", "/entries", body,
+                   {**JSON, "Host": "evil.example:8731"})[0] == 403
+    assert storage.get_all_entries() == []
+    assert request(server, "GET", "/entries", headers={"Host": "localhost:8731"})[0] == 200
+
+
+@pytest.mark.parametrize("fields", [
+    {"command": "x", "tags": [1, 2]},
+    {"command": "x", "tags": {"a": 1}},
+    {"command": "x", "notes": 5},
+    {"command": "x", "project": ["a"]},
+    {"command": "x", "error": {"text": "boom"}},
+    {"command": "x", "directory": 7},
+    {"command": ["make", "build"]},
+    {"command": "x", "exit_code": [1]},
+    {"command": "x", "exit_code": True},
+    {"command": "x", "exit_code": "oops"},
+])
+def test_post_rejects_wrong_field_types(server, storage, fields):
+    assert request(server, "POST", "/entries", json.dumps(fields), JSON)[0] == 400
+    assert storage.get_all_entries() == []
+
+
+def test_post_accepts_comma_separated_tags_and_nulls(server, storage):
+    body = {"command": "make", "tags": "ci, build", "notes": None, "exit_code": "2"}
+    status, entry = request(server, "POST", "/entries", json.dumps(body), JSON)
+    assert status == 201
+    assert (entry["tags"], entry["notes"], entry["exit_code"]) == (["ci", "build"], "", 2)
@@ -0,0 +1,63 @@
+from noteerr.recordfile import file_signature
+from noteerr.similarity import VectorStore
+from noteerr.storage import Storage
+
+ERRORS = [
+    "ModuleNotFoundError: No module named 'requests'",
+    "ModuleNotFoundError: No module named 'numpy'",
+    "ModuleNotFoundError: No module named 'yaml'",
+    "ModuleNotFoundError: No module named 'click'",
+    "ModuleNotFoundError: No module named 'rich'",
+    "ModuleNotFoundError: No module named 'pytest'",
+    "ModuleNotFoundError: No module named 'pandas'",
+    "ModuleNotFoundError: No module named 'flask'",
+    "docker: Cannot connect to the Docker daemon",
+]
+
+
+def test_removing_rows_is_never_having_added_them():
+    full, kept = VectorStore(), VectorStore()
+    for entry_id, error in enumerate(ERRORS, 1):
+        full.add(entry_id, error)
+        if entry_id % 3:
+            kept.add(entry_id, error)
+    assert full.remove(range(3, len(ERRORS) + 1, 3)) == 3
+    query = "No module named 'requests'"
+    assert full.nearest(query, limit=10) == kept.nearest(query, limit=10)
+    assert list(full.df) == list(kept.df)
+
+
+def test_similar_skips_deleted_entries(storage):
+    for error in ERRORS:
+        storage.add_entry(command="python app.py", error=error, exit_code=1, directory="/app")
+    storage.similar_entries("No module named 'six'")  # Builds the vector cache
+    storage.delete_entries(range(1, 7))
+    matches = storage.similar_entries("No module named 'six'", limit=2, min_score=0.0)
+    assert [entry.id for entry, _ in matches] == [8, 7]
+    assert 1 not in VectorStore.load(storage.vectors_file, file_signature(storage.data_file)).ids
+
+
+def test_vectors_follow_writes_and_are_rebuilt_for_another_store(storage):
+    for error in ERRORS[:4]:
+        storage.add_entry(command="python app.py", error=error, exit_code=1, directory="/app")
+    storage.similar_entries("docker daemon")  # Builds the vector cache
+    storage.add_entry(command="docker ps", error=ERRORS[-1], exit_code=1, directory="/app")
+    storage.update_entries([1], notes="pip install requests")
+    # Each write patches the cache and stamps it with the new store
+    saved = VectorStore.load(storage.vectors_file, file_signature(storage.data_file))
+    assert list(saved.ids) == [1, 2, 3, 4, 5]
+
+    # Replaced behind noteerr's back: same IDs, other errors
+    other = storage.data_file.with_name("other.json")
+    replacement = Storage(other)
+    for error in ERRORS[-4:]:
+        replacement.add_entry(command="make", error=error, exit_code=2, directory="/src")
+    replacement.add_entry(command="make", error="Segmentation fault", exit_code=139,
+                          directory="/src")
+    other.replace(storage.data_file)
+    assert VectorStore.load(storage.vectors_file, file_signature(storage.data_file)) is None
+
+    fresh = Storage(storage.data_file)
+    matches = fresh.similar_entries("Segmentation fault (core dumped)", limit=1)
+    assert [(entry.id, entry.error) for entry, _ in matches] == [(5, "Segmentation fault")]
+    assert VectorStore.load(storage.vectors_file, file_signature(storage.data_file)) is not None
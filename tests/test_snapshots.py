@@ -0,0 +1,20 @@
+import pytest
+
+from noteerr.snapshots import SnapshotError, backup, list_backups, restore_backup
+
+
+def test_backups_never_overwrite_each_other(storage, tmp_path):
+    target = tmp_path / "backups"
+    storage.add_entry(command="make", error="boom", exit_code=2, directory="/src")
+    first = backup(storage, target)
+    storage.add_entry(command="ls", error="gone", exit_code=1, directory="/")
+    # Same second: the default name is numbered rather than reused
+    second = backup(storage, target)
+    assert second.name != first.name and first.manifest.exists()
+    assert len(list_backups(target)) == 2
+
+    backup(storage, target, name="nightly")
+    with pytest.raises(SnapshotError, match="already exists"):
+        backup(storage, target, name="nightly")
+
+    assert restore_backup(storage, target, first.name) == 1
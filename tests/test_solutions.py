@@ -0,0 +1,46 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from noteerr.snapshots import create_snapshot, restore_snapshot
+from noteerr.storage import Storage
+
+BASH_HOOKS = Path(__file__).resolve().parent.parent / "scripts" / "bash-integration.sh"
+
+
+def annotate(storage, command, note):
+    entry = storage.add_entry(command=command, error="boom", exit_code=1, directory="/src")
+    storage.update_entries([entry.id], notes=note)
+    return entry
+
+
+def test_suggestions_follow_the_store(storage):
+    annotate(storage, "make build", "run make deps first")
+    assert storage.suggest_fix("make build") == (1, "run make deps first")
+    first = storage.data_file.read_bytes()
+
+    annotate(storage, "npm test", "start the database")
+    # The store replaced behind noteerr's back, e.g. by copying an old file over it
+    storage.data_file.write_bytes(first)
+    assert Storage(storage.data_file).suggest_fix("npm test") is None
+
+
+def test_restore_rebuilds_suggestions(storage):
+    annotate(storage, "make build", "run make deps first")
+    create_snapshot(storage, "one")
+    annotate(storage, "npm test", "start the database")
+    restore_snapshot(storage, "one")
+    assert "npm test" not in storage.solutions_file.read_text()
+    assert Storage(storage.data_file).suggest_fix("npm test") is None
+
+
+@pytest.mark.skipif(shutil.which("bash") is None or shutil.which("awk") is None,
+                    reason="needs bash and awk")
+def test_bash_hook_reads_the_index(storage, tmp_path):
+    annotate(storage, "make build", "run make deps first")
+    script = f'source "{BASH_HOOKS}"; noteerr_suggest_fix "make build"; noteerr_suggest_fix "ls"'
+    result = subprocess.run(["bash", "-c", script], capture_output=True, text=True,
+                            env={"HOME": str(tmp_path), "PATH": "/usr/bin:/bin"})
+    assert result.stderr.strip().splitlines() == ["💡 noteerr #1: run make deps first"]
@@ -0,0 +1,57 @@
+import time
+from datetime import datetime
+
+from noteerr.recordfile import RecordReader
+from noteerr.spool import Ingester, coalesce, write_event
+from noteerr.storage import Storage
+
+
+def test_late_events_keep_their_capture_time(storage):
+    saved = storage.add_entry(command="make deploy", error="denied", exit_code=1, directory="/srv")
+    now = time.time()
+    # Spooled before the entry above was saved, but ingested after it
+    write_event(storage.spool_dir, "pytest -x", 1, "/srv", timestamp=now - 7200)
+    write_event(storage.spool_dir, "cargo build", 101, "/srv", timestamp=now - 600)
+    assert Ingester(storage).drain() == (2, 2)
+
+    late = storage.get_all_entries()[1]
+    assert late.command == "pytest -x"
+    assert late.timestamp == datetime.fromtimestamp(int(now - 7200)).isoformat()
+    # Streamed from the file and from the in-memory index alike
+    for store in (Storage(storage.data_file), storage):
+        found = {entry.command for entry in store.query_entries("since:1h")}
+        assert found == {saved.command, "cargo build"}
+        found = {entry.command for entry in store.query_entries("since:3h")}
+        assert found == {saved.command, "pytest -x", "cargo build"}
+        assert [e.command for e in store.query_entries("since:1h deploy")] == ["make deploy"]
+
+
+def test_repeats_merge_with_entries_behind_older_ones(storage):
+    storage.add_entry(command="make deploy", error="Command failed", exit_code=1, directory="/srv")
+    now = time.time()
+    write_event(storage.spool_dir, "pytest -x", 1, "/srv", timestamp=now - 7200)
+    assert Ingester(storage).drain() == (1, 1)
+
+    # A new ingester looks back past the older entry stored last
+    write_event(storage.spool_dir, "make deploy", 1, "/srv", timestamp=now + 5)
+    assert Ingester(storage).drain() == (1, 0)
+    assert len(storage.get_all_entries()) == 2
+
+
+def test_coalesce_keeps_the_latest_of_each_failure():
+    events = [{"command": command, "directory": "/", "exit_code": 1, "error": "x", "timestamp": t}
+              for t, command in enumerate(["make", "ls", "make", "make"])]
+    assert [(e["command"], e["timestamp"]) for e in coalesce(events)] == [("ls", 1), ("make", 3)]
+
+
+def test_lines_since_skips_only_chunks_entirely_before_it(storage):
+    old = {"timestamp": "2025-01-01T00:00:00", "error": "x", "exit_code": 1, "directory": "/"}
+    storage.add_entries([{**old, "command": f"old {i}"} for i in range(200)])
+    storage.add_entries([{**old, "command": "late", "timestamp": "2025-06-01T00:00:00"}])
+    storage.add_entries([{**old, "command": f"old {i}"} for i in range(200, 400)])
+
+    with RecordReader(storage.data_file) as reader:
+        lines = list(reader.lines_since("2025-03-01", chunk_size=512))
+        assert any(b'"late"' in line for line in lines)
+        # The chunks around it, not the whole store
+        assert len(lines) < 20
@@ -0,0 +1,36 @@
+import pytest
+
+from noteerr import storage as storage_module
+from noteerr.storage import Storage
+
+
+def snapshot(storage):
+    return [e.to_dict() for e in storage.get_all_entries()]
+
+
+@pytest.mark.parametrize("write", [
+    lambda s: s.add_entry(command="ls", error="x", exit_code=2, directory="/"),
+    lambda s: s.update_entries([1, 2], notes="fixed", tags=["new"]),
+    lambda s: s.delete_entries([2]),
+    lambda s: s.retag({"ci": "build"}),
+])
+def test_failed_write_leaves_the_cache_alone(storage, monkeypatch, write):
+    for i in range(3):
+        storage.add_entry(command=f"make {i}", error="boom", exit_code=1, directory="/src",
+                          tags=["ci"])
+    before = snapshot(storage)
+    storage.query_entries("tag:ci")  # Build the in-memory index
+
+    def dump_store(data, f):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(storage_module, "dump_store", dump_store)
+    with pytest.raises(OSError):
+        write(storage)
+    monkeypatch.undo()
+
+    assert snapshot(storage) == before
+    assert [e.id for e in storage.query_entries("tag:ci")] == [3, 2, 1]
+    # The next write doesn't carry the failed change to disk either
+    added = storage.add_entry(command="ls", error="x", exit_code=2, directory="/")
+    assert added.id == 4
+    assert snapshot(Storage(storage.data_file)) == before + [added.to_dict()]
@@ -0,0 +1,130 @@
+import random
+import re
+
+import pytest
+
+from noteerr.index import StoreIndex
+from noteerr.textsearch import FuzzyMatcher, RegexMatcher, fuzzy_find, required_literals
+
+
+def edit_distance_within(pattern, text, max_distance):
+    """Brute force: the fewest edits turning `pattern` into any substring of `text`."""
+    previous = [0] * (len(text) + 1)  # a match may start anywhere
+    for i, p in enumerate(pattern, 1):
+        current = [i]
+        for j, t in enumerate(text, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (p != t)))
+        previous = current
+    return min(previous) <= max_distance
+
+
+def random_text(rng, alphabet, low, high):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(low, high)))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fuzzy_find_agrees_with_brute_force(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        # Mostly short, some longer than a machine word
+        pattern = random_text(rng, "abc", 1, 70 if rng.random() < 0.1 else 8)
+        text = random_text(rng, "abc", 0, 40)
+        if rng.random() < 0.5 and len(text) > 2:
+            # Plant a lightly edited copy of the pattern
+            cut = rng.randint(0, len(pattern))
+            text += pattern[:cut] + rng.choice("abc") + pattern[cut + 1:]
+        for k in range(4):
+            assert fuzzy_find(pattern, text, k) == edit_distance_within(pattern, text, k), \
+                (pattern, text, k)
+
+
+def test_fuzzy_find_edge_cases():
+    assert fuzzy_find("", "", 0)
+    assert fuzzy_find("abc", "", 3)
+    assert not fuzzy_find("abc", "", 2)
+    assert fuzzy_find("timeout", "connection timed out", 2)
+    assert not fuzzy_find("timeout", "connection refused", 2)
+
+
+@pytest.mark.parametrize("pattern, literals", [
+    ("connection refused", ["connection refused"]),
+    ("colou?r", ["colo", "r"]),
+    (r"[Ee]rror: (\d+)", ["rror: "]),
+    ("(?:ab)*cd", ["cd"]),
+    ("(foo)+bar", ["foo", "bar"]),
+    ("Segmentation|core dumped", []),
+    ("exit (1|2)", ["exit "]),
+    ("No(?=de)de", ["no", "de"]),
+    ("TimeOut", ["timeout"]),
+])
+def test_required_literals(pattern, literals):
+    assert required_literals(pattern) == literals
+
+
+@pytest.mark.parametrize("pattern", [
+    "ab(c|d)a", "a?bc+", "[ab]c(ab)*b", "b{2,3}a", "(?:ab|ac)c", "a(b|c)?b",
+    "(a|b)(c|d)", "a.c", r"\bab", "(?:a+|b)c", "A[^b]C",
+])
+def test_required_literals_appear_in_every_match(pattern):
+    rng = random.Random(pattern)
+    regex = re.compile(pattern, re.IGNORECASE)
+    literals = required_literals(pattern)
+    matched = 0
+    for _ in range(2000):
+        text = random_text(rng, "abcdAB ", 0, 10)
+        if regex.search(text):
+            matched += 1
+            assert all(literal in text.lower() for literal in literals), (text, literals)
+    assert matched
+
+
+def make_entries(seed, count=300):
+    rng = random.Random(seed)
+    words = ["build", "timeout", "refused", "denied", "segfault", "module", "import"]
+    records = []
+    for i in range(1, count + 1):
+        command = " ".join(rng.choice(words) for _ in range(3))
+        # Typos in some of them
+        if rng.random() < 0.3:
+            at = rng.randrange(len(command))
+            command = command[:at] + rng.choice("xyz") + command[at + 1:]
+        records.append({"id": i, "timestamp": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}",
+                        "command": command, "error": rng.choice(words).upper(),
+                        "exit_code": 1, "directory": "/", "tags": []})
+    return records
+
+
+@pytest.mark.parametrize("query", ["timeout", "segfault module", "permission denied",
+                                   "import build", "refused"])
+def test_fuzzy_prefilters_never_drop_a_match(storage, query):
+    records = make_entries(len(query))
+    index = StoreIndex.from_records(records)
+    matcher = FuzzyMatcher(query)
+    expected = [r["id"] for r in reversed(records)
+                if edit_distance_within(matcher.text, r["command"].lower(), matcher.max_distance)
+                or edit_distance_within(matcher.text, r["error"].lower(), matcher.max_distance)]
+
+    # q-gram counting over the trigram postings
+    assert [e.id for e in matcher.run(index)] == expected
+    assert matcher.strategy == "trigram index" and matcher.candidates < len(records)
+    # The same count over raw record lines
+    storage.add_entries([{k: v for k, v in r.items() if k != "id"} for r in records])
+    storage._data = None
+    matcher = FuzzyMatcher(query)
+    assert [e.id for e in storage.match_entries(matcher)] == expected
+    assert matcher.strategy == "stream"
+
+
+@pytest.mark.parametrize("pattern", ["time(out|d out)", "seg[f]ault", "(?:build|import) mod",
+                                     r"DENIED$", "x?timeout"])
+def test_regex_prefilters_never_drop_a_match(storage, pattern):
+    records = make_entries(7)
+    regex = re.compile(pattern, re.IGNORECASE)
+    expected = [r["id"] for r in reversed(records)
+                if regex.search(r["command"]) or regex.search(r["error"])]
+    assert expected
+
+    assert [e.id for e in RegexMatcher(pattern).run(StoreIndex.from_records(records))] == expected
+    storage.add_entries([{k: v for k, v in r.items() if k != "id"} for r in records])
+    storage._data = None
+    assert [e.id for e in storage.match_entries(RegexMatcher(pattern))] == expected
@@ -0,0 +1,67 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from noteerr import trends
+from noteerr.trends import DIMENSIONS, TrendCache
+
+
+def make_records(count=400, seed=3):
+    rng = random.Random(seed)
+    start = datetime(2026, 3, 1)
+    return [{
+        "id": i, "timestamp": (start + timedelta(minutes=rng.randint(0, 7 * 24 * 60))).isoformat(),
+        "command": rng.choice(["make all", "CC=clang make", "pytest -x", "/usr/bin/npm ci", ""]),
+        "exit_code": rng.choice([1, 2, 137]), "project": rng.choice(["api", "web", ""]),
+        "tags": rng.sample(["ci", "docker", "flaky", "net"], rng.randint(0, 3)),
+    } for i in range(1, count + 1)]
+
+
+def rollups(cache):
+    result = []
+    for by in DIMENSIONS:
+        for bucket in ("hour", "day"):
+            for since, until in ((None, "2026-03-09T00:00:00"),
+                                 ("2026-03-03T00:00:00", "2026-03-05T12:00:00")):
+                result.append(cache.rollup(by, bucket, since, until))
+    return result
+
+
+def test_numpy_and_pure_python_rollups_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    cache = TrendCache.build(make_records())
+    with_numpy = rollups(cache)
+    monkeypatch.setattr(trends, "_get_numpy", lambda: None)
+    assert rollups(cache) == with_numpy
+    assert sum(sum(counts) for _, counts in with_numpy[0].groups) == 400
+
+
+def test_patching_matches_a_rebuild(tmp_path):
+    records = make_records()
+    cache = TrendCache.build(records[:300])
+    doomed = set(range(5, 300, 7))
+    retagged = {10: ["net"], 11: [], 299: ["ci", "new", "ci"], 5: ["gone"]}
+    cache.remove(doomed)
+    cache.retag(retagged.items())
+    for record in records[300:]:
+        cache.add(record)
+    # Through a save and load, as Storage patches it
+    cache.save(tmp_path / "trends.bin", (1, 2, 3))
+    cache = TrendCache.load(tmp_path / "trends.bin", (1, 2, 3))
+
+    expected = [{**record, "tags": retagged.get(record["id"], record["tags"])}
+                for record in records if record["id"] not in doomed]
+    assert rollups(cache) == rollups(TrendCache.build(expected))
+
+
+def test_names_may_hold_any_character(tmp_path):
+    odd = ["a\0b", "\0", "tab\there", "\ud800", "ünï"]
+    records = [{"id": i + 1, "timestamp": "2026-03-01T10:00:00", "command": f"{name} run",
+                "exit_code": 1, "project": name, "tags": [name]} for i, name in enumerate(odd)]
+    TrendCache.build(records).save(tmp_path / "trends.bin", (1, 2, 3))
+    cache = TrendCache.load(tmp_path / "trends.bin", (1, 2, 3))
+    for by in ("project", "tag"):
+        rollup = cache.rollup(by, "day", "2026-03-01T00:00:00", "2026-03-01T23:00:00")
+        assert sorted(name for name, _ in rollup.groups) == sorted(odd)
+    assert TrendCache.load(tmp_path / "trends.bin", (1, 2, 4)) is None